@@ -1,4 +1,6 @@
+from accounts.services import UserService
 from django.contrib.auth.models import User
+from django.db import models
 from rest_framework import serializers, exceptions
 
 class UserSerializer(serializers.ModelSerializer):
@@ -7,6 +9,24 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('username', 'email')
 
 
+class CachedUsersListSerializer(serializers.ListSerializer):
+    """
+    Use as Meta.list_serializer_class of a serializer that renders users by
+    source='cached_user'. Users of the whole list are loaded from cache at once
+    instead of one cache get per object.
+    Set Meta.cached_user_fields of the serializer if the user fields are not
+    ('user',), e.g. ('from_user',)
+    """
+
+    def to_representation(self, data):
+        objects = list(data.all() if isinstance(data, models.Manager) else data)
+        field_names = getattr(self.child.Meta, 'cached_user_fields', ('user',))
+        UserService.load_users_through_cache(objects, field_names)
+        return super(CachedUsersListSerializer, self).to_representation(objects)
+
+
+# Serializers below are rendered for every tweet, comment, like and friendship,
+# pass users from UserService (e.g. source='cached_user'), not from DB
 class UserSerializerForTweet(serializers.ModelSerializer):
     class Meta:
         model = User
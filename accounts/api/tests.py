@@ -11,6 +11,7 @@ class AccountApiTests(TestCase):
     def setUp(self):
         # This function will call at the beginning of every test function
         # Below steps wrong effect real database, test database is used
+        self.clear_cache()
         self.client = APIClient()
         self.user = self.create_user(
             username='admin',
@@ -75,6 +76,51 @@ class AccountApiTests(TestCase):
         response = self.client.get(LOGIN_STATUS_URL)
         self.assertEqual(response.data['has_logged_in'], False)
 
+    def test_token_authentication(self):
+        response = self.client.post(LOGIN_URL, {
+            'username': self.user.username,
+            'password': 'correct password',
+        })
+        token = response.data['token']
+
+        # A new client without session cookie
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token {}'.format(token))
+        response = client.get(LOGIN_STATUS_URL)
+        self.assertEqual(response.data['has_logged_in'], True)
+        self.assertEqual(response.data['user']['username'], self.user.username)
+        # No session or user query once the user is cached
+        with self.assertNumQueries(0):
+            response = client.get(LOGIN_STATUS_URL)
+        self.assertEqual(response.data['has_logged_in'], True)
+
+        # Error: tampered token
+        bad_client = APIClient()
+        bad_client.credentials(HTTP_AUTHORIZATION='Token {}x'.format(token))
+        response = bad_client.get(LOGIN_STATUS_URL)
+        self.assertEqual(response.status_code, 403)
+
+        # Logout revokes the token
+        response = client.post(LOGOUT_URL)
+        self.assertEqual(response.status_code, 200)
+        response = client.get(LOGIN_STATUS_URL)
+        self.assertEqual(response.status_code, 403)
+
+        # Other tokens of the user still work
+        response = self.client.post(LOGIN_URL, {
+            'username': self.user.username,
+            'password': 'correct password',
+        })
+        client.credentials(HTTP_AUTHORIZATION='Token {}'.format(response.data['token']))
+        response = client.get(LOGIN_STATUS_URL)
+        self.assertEqual(response.data['has_logged_in'], True)
+
+        # Changing the password invalidates the tokens
+        self.user.set_password('new password')
+        self.user.save()
+        response = client.get(LOGIN_STATUS_URL)
+        self.assertEqual(response.status_code, 403)
+
     def test_signup(self):
         data = {
             'username': 'someone',
@@ -117,6 +163,7 @@ class AccountApiTests(TestCase):
         response = self.client.post(SIGNUP_URL, data)
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.data['user']['username'], 'someone')
+        self.assertIn('token', response.data)
 
         # Check user is logged in
         response = self.client.get(LOGIN_STATUS_URL)
@@ -1,4 +1,5 @@
 from accounts.api.serializers import UserSerializer
+from accounts.authentication import SignedTokenAuthentication
 from django.contrib.auth.models import User
 from rest_framework import permissions
 from rest_framework import viewsets
@@ -11,6 +12,7 @@ from django.contrib.auth import (
     logout as django_logout,
 )
 from accounts.api.serializers import SignupSerializer, LoginSerializer
+from accounts.services import AuthTokenService
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -55,6 +57,9 @@ class AccountViewSet(viewsets.ViewSet):
         return Response({
             'success': True,
             'user': UserSerializer(user).data,
+            # Optional, clients can send it in Authorization header instead
+            # of using the session
+            'token': AuthTokenService.create_token(user),
         }, status=201)
 
     @action(methods=['POST'], detail=False)
@@ -94,6 +99,7 @@ class AccountViewSet(viewsets.ViewSet):
         return Response({
             "success": True,
             "user": UserSerializer(instance=user).data,
+            "token": AuthTokenService.create_token(user),
         })
 
     # Methods: this action can only use GET
@@ -117,5 +123,8 @@ class AccountViewSet(viewsets.ViewSet):
         """
         Logout current user
         """
+        # Logged in by token, revoke it
+        if isinstance(request.successful_authenticator, SignedTokenAuthentication):
+            AuthTokenService.revoke_token(request.auth)
         django_logout(request)
         return Response({"success": True})
\ No newline at end of file
@@ -0,0 +1,44 @@
+from accounts.services import AuthTokenService, UserService
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    get_authorization_header,
+)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Clients send the token returned by login / signup in the header:
+        Authorization: Token <token>
+
+    SessionAuthentication reads the session row and then the user row on every
+    request. The token is verified by its signature, and the user is read
+    from cache, so an authenticated request does not need to hit the DB.
+    """
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        # Not using token, let other authentication classes try
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        payload = AuthTokenService.verify_token(token)
+        if payload is None:
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        user = UserService.get_user_through_cache(payload['user_id'])
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        if not AuthTokenService.is_valid_for_user(payload, user):
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        # request.auth is the payload, used to revoke the token in logout
+        return user, payload
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,9 @@
+from accounts.services import UserService
+from django.db import transaction
+
+
+def invalidate_user_cache(sender, instance, **kwargs):
+    # After the commit, otherwise a request can cache the old row again before
+    # it. user_id is read right away, instance.id is None after delete
+    user_id = instance.id
+    transaction.on_commit(lambda: UserService.invalidate_user(user_id))
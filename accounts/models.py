@@ -0,0 +1,8 @@
+from accounts.listeners import invalidate_user_cache
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+
+# Users are cached by accounts.services.UserService, drop the cached user
+# whenever it is changed or deleted
+post_save.connect(invalidate_user_cache, sender=User)
+post_delete.connect(invalidate_user_cache, sender=User)
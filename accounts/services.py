@@ -0,0 +1,158 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, get_random_string
+from twitter.cache import REVOKED_AUTH_TOKEN_PATTERN, USER_PATTERN
+from utils.multi_level_cache import MultiLevelCache
+from utils.read_replicas import read_from_primary
+
+cache = caches['default']
+user_cache = MultiLevelCache('user')
+
+
+class UserService(object):
+
+    @classmethod
+    def get_user_through_cache(cls, user_id):
+        # Return None if the user does not exist
+        key = USER_PATTERN.format(user_id=user_id)
+        return user_cache.get_or_set(
+            key,
+            lambda: User.objects.filter(id=user_id).first(),
+        )
+
+    @classmethod
+    def get_users_through_cache(cls, user_ids):
+        """
+        Return {user_id: user}, one cache get_many for all users and one
+        query for the users not in cache. Users not exist are not in the dict
+        """
+        keys = {
+            user_id: USER_PATTERN.format(user_id=user_id)
+            for user_id in set(user_ids)
+        }
+        cached_users = user_cache.get_many(keys.values())
+        users = {}
+        missing_user_ids = []
+        for user_id, key in keys.items():
+            if key in cached_users:
+                users[user_id] = cached_users[key]
+            else:
+                missing_user_ids.append(user_id)
+        if missing_user_ids:
+            with read_from_primary():
+                missing_users = list(User.objects.filter(id__in=missing_user_ids))
+            user_cache.set_many({keys[user.id]: user for user in missing_users})
+            users.update({user.id: user for user in missing_users})
+        return users
+
+    @classmethod
+    def get_related_user_through_cache(cls, instance, field_name='user'):
+        # instance.<field_name> of a model like Tweet or Friendship
+        field = instance._meta.get_field(field_name)
+        # Already loaded by load_users_through_cache() or select_related
+        if field.is_cached(instance):
+            return getattr(instance, field_name)
+        user_id = getattr(instance, field.attname)
+        if user_id is None:
+            return None
+        return cls.get_user_through_cache(user_id)
+
+    @classmethod
+    def load_users_through_cache(cls, instances, field_names=('user',)):
+        """
+        Load users of a list of objects with one get_users_through_cache,
+        instead of one cache get per object when rendering the list
+        """
+        user_ids = [
+            getattr(instance, field_name + '_id')
+            for instance in instances
+            for field_name in field_names
+        ]
+        user_ids = [user_id for user_id in user_ids if user_id is not None]
+        if not user_ids:
+            return instances
+        users = cls.get_users_through_cache(user_ids)
+        for instance in instances:
+            for field_name in field_names:
+                user = users.get(getattr(instance, field_name + '_id'))
+                # Keep user_id of a deleted user
+                if user is not None:
+                    setattr(instance, field_name, user)
+        return instances
+
+    @classmethod
+    def invalidate_user(cls, user_id):
+        # Other processes may read the user from their local cache for
+        # LOCAL_CACHE_TIMEOUT seconds
+        user_cache.delete(USER_PATTERN.format(user_id=user_id))
+
+
+class AuthTokenService(object):
+    """
+    Signed tokens used by accounts.authentication.SignedTokenAuthentication.
+    A token is the signed {user_id, token_id, issued_at, auth_hash}, it is
+    verified with SECRET_KEY only, no session row is needed.
+    """
+    salt = 'accounts.auth_token'
+
+    @classmethod
+    def get_auth_hash(cls, user):
+        # Changes with the password, like the session hash checked by
+        # django.contrib.auth. The payload is only signed, a prefix is enough
+        return user.get_session_auth_hash()[:16]
+
+    @classmethod
+    def create_token(cls, user):
+        # token_id identifies the token when it is revoked
+        return signing.dumps(
+            {
+                'user_id': user.id,
+                'token_id': get_random_string(16),
+                'issued_at': int(time.time()),
+                'auth_hash': cls.get_auth_hash(user),
+            },
+            salt=cls.salt,
+            compress=True,
+        )
+
+    @classmethod
+    def verify_token(cls, token):
+        """
+        Return the payload of the token, None if it is tampered, expired or revoked
+        """
+        try:
+            payload = signing.loads(
+                token,
+                salt=cls.salt,
+                max_age=settings.AUTH_TOKEN_MAX_AGE,
+            )
+        except signing.BadSignature:
+            # SignatureExpired is a BadSignature too
+            return None
+        if cls.is_revoked(payload['token_id']):
+            return None
+        return payload
+
+    @classmethod
+    def is_valid_for_user(cls, payload, user):
+        # Tokens created before a password change are not valid anymore
+        return constant_time_compare(
+            payload.get('auth_hash', ''),
+            cls.get_auth_hash(user),
+        )
+
+    @classmethod
+    def revoke_token(cls, payload):
+        # Only keep it in the denylist until the token expires by itself
+        expires_in = payload['issued_at'] + settings.AUTH_TOKEN_MAX_AGE - time.time()
+        key = REVOKED_AUTH_TOKEN_PATTERN.format(token_id=payload['token_id'])
+        cache.set(key, True, max(int(expires_in) + 1, 1))
+
+    @classmethod
+    def is_revoked(cls, token_id):
+        key = REVOKED_AUTH_TOKEN_PATTERN.format(token_id=token_id)
+        return cache.get(key) is not None
@@ -0,0 +1,109 @@
+import threading
+
+from accounts.services import UserService, user_cache
+from django.core.cache import caches
+from friendships.api.serializers import FollowerSerializer
+from friendships.models import Friendship
+from testing.testcases import TestCase
+from twitter.cache import USER_PATTERN
+from utils.multi_level_cache import FILL_LOCK_PREFIX
+
+
+class UserServiceTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.user1 = self.create_user('user1')
+        self.user2 = self.create_user('user2')
+
+    def test_get_user_through_cache(self):
+        with self.assertNumQueries(1):
+            user = UserService.get_user_through_cache(self.user1.id)
+        self.assertEqual(user.username, 'user1')
+        with self.assertNumQueries(0):
+            user = UserService.get_user_through_cache(self.user1.id)
+        self.assertEqual(user.username, 'user1')
+
+        # post_save invalidates the cached user
+        self.user1.username = 'new_user1'
+        self.user1.save()
+        user = UserService.get_user_through_cache(self.user1.id)
+        self.assertEqual(user.username, 'new_user1')
+
+        # post_delete invalidates the cached user
+        user_id = self.user1.id
+        self.user1.delete()
+        self.assertEqual(UserService.get_user_through_cache(user_id), None)
+
+    def test_get_user_through_local_cache(self):
+        UserService.get_user_through_cache(self.user1.id)
+        stats = user_cache.get_stats()
+        # Read from the local cache of the process, even if memcached lost it
+        caches['default'].clear()
+        with self.assertNumQueries(0):
+            user = UserService.get_user_through_cache(self.user1.id)
+        self.assertEqual(user.username, 'user1')
+        self.assertEqual(user_cache.get_stats()['local_hits'], stats['local_hits'] + 1)
+
+        # Every read gets its own copy
+        user.username = 'changed'
+        user = UserService.get_user_through_cache(self.user1.id)
+        self.assertEqual(user.username, 'user1')
+
+        # Deleted from the local cache as well
+        UserService.invalidate_user(self.user1.id)
+        with self.assertNumQueries(1):
+            UserService.get_user_through_cache(self.user1.id)
+
+    def test_get_user_through_cache_single_flight(self):
+        key = USER_PATTERN.format(user_id=self.user1.id)
+        # Another process is loading the user
+        caches['default'].add(FILL_LOCK_PREFIX + key, 1)
+        timer = threading.Timer(0.05, caches['default'].set, [key, self.user1])
+        timer.start()
+        stats = user_cache.get_stats()
+        # Wait for the value instead of reading DB
+        with self.assertNumQueries(0):
+            user = UserService.get_user_through_cache(self.user1.id)
+        timer.join()
+        self.assertEqual(user.username, 'user1')
+        self.assertEqual(user_cache.get_stats()['fill_waits'], stats['fill_waits'] + 1)
+
+        # The lock is released without a value, load it from DB
+        user_id = self.user2.id
+        key = USER_PATTERN.format(user_id=user_id)
+        caches['default'].add(FILL_LOCK_PREFIX + key, 1)
+        timer = threading.Timer(0.05, caches['default'].delete, [FILL_LOCK_PREFIX + key])
+        timer.start()
+        with self.assertNumQueries(1):
+            user = UserService.get_user_through_cache(user_id)
+        timer.join()
+        self.assertEqual(user.username, 'user2')
+
+    def test_get_users_through_cache(self):
+        UserService.get_user_through_cache(self.user1.id)
+        # Only user2 is read from DB
+        with self.assertNumQueries(1):
+            users = UserService.get_users_through_cache(
+                [self.user1.id, self.user2.id, self.user2.id, 0],
+            )
+        self.assertEqual(set(users.keys()), {self.user1.id, self.user2.id})
+        self.assertEqual(users[self.user2.id].username, 'user2')
+        with self.assertNumQueries(0):
+            users = UserService.get_users_through_cache([self.user1.id, self.user2.id])
+        self.assertEqual(users[self.user1.id].username, 'user1')
+
+    def test_serialize_list_with_cached_users(self):
+        for i in range(3):
+            follower = self.create_user('follower{}'.format(i))
+            Friendship.objects.create(from_user=follower, to_user=self.user1)
+        # 1 query for friendships, 1 query for all followers not in cache
+        with self.assertNumQueries(2):
+            friendships = Friendship.objects.filter(to_user=self.user1)
+            data = FollowerSerializer(friendships, many=True).data
+        self.assertEqual(len(data), 3)
+        # Followers are cached
+        with self.assertNumQueries(1):
+            friendships = Friendship.objects.filter(to_user=self.user1)
+            data = FollowerSerializer(friendships, many=True).data
+        self.assertEqual(data[0]['user']['username'], 'follower2')
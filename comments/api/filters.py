@@ -0,0 +1,13 @@
+import django_filters
+from comments.models import Comment
+
+
+class CommentFilter(django_filters.FilterSet):
+    # With filterset_fields = ('tweet_id',), django_filters uses a
+    # ModelChoiceFilter, which reads the tweet from DB to validate it.
+    # Filter by the column directly
+    tweet_id = django_filters.NumberFilter()
+
+    class Meta:
+        model = Comment
+        fields = ('tweet_id',)
@@ -1,5 +1,6 @@
 from accounts.api.serializers import UserSerializerForComment
 from comments.models import Comment
+from likes.api.serializers import HasLikedListSerializer
 from likes.services import LikeService
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -7,12 +8,12 @@ from tweets.models import Tweet
 
 class CommentSerializer(serializers.ModelSerializer):
     # Need to declare user serializer here to show full user info, otherwise return an int type id
-    user = UserSerializerForComment()
-    likes_count = serializers.SerializerMethodField()
+    user = UserSerializerForComment(source='cached_user')
     has_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
+        list_serializer_class = HasLikedListSerializer
         fields = (
             'id',
             'tweet_id',
@@ -23,11 +24,8 @@ class CommentSerializer(serializers.ModelSerializer):
             'has_liked',
         )
 
-    def get_likes_count(self, obj):
-        return obj.like_set.count()
-
     def get_has_liked(self, obj):
-        return LikeService.has_liked(self.context['request'].user, obj)
+        return LikeService.has_liked_in_context(self.context, obj)
 
 
 class CommentSerializerForCreate(serializers.ModelSerializer):
@@ -1,7 +1,12 @@
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from testing.testcases import TestCase
 from rest_framework.test import APIClient
 from django.utils import timezone
 from comments.models import Comment
+from utils.paginations import BidirectionalEndlessPagination
+from utils.read_replicas import RECENT_WRITE_COOKIE
 
 
 COMMENT_URL = '/api/comments/'
@@ -14,6 +19,7 @@ NEWSFEED_LIST_API = '/api/newsfeeds/'
 class CommentApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.user1 = self.create_user('user1')
         self.user1_client = APIClient()
         self.user1_client.force_authenticate(self.user1)
@@ -120,7 +126,7 @@ class CommentApiTests(TestCase):
             'tweet_id': self.tweet.id,
         })
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data['comments']), 0)
+        self.assertEqual(len(response.data['results']), 0)
 
         # Order by time
         self.create_comment(self.user1, self.tweet, '1')
@@ -129,16 +135,70 @@ class CommentApiTests(TestCase):
         response = self.anonymous_client.get(COMMENT_URL, {
             'tweet_id': self.tweet.id,
         })
-        self.assertEqual(len(response.data['comments']), 2)
-        self.assertEqual(response.data['comments'][0]['content'], '1')
-        self.assertEqual(response.data['comments'][1]['content'], '2')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['content'], '1')
+        self.assertEqual(response.data['results'][1]['content'], '2')
 
         # Passing both user_id and tweet_id, only tweet_id is effective in filter
         response = self.anonymous_client.get(COMMENT_URL, {
             'tweet_id': self.tweet.id,
             'user_id': self.user1.id,
         })
-        self.assertEqual(len(response.data['comments']), 2)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_list_pagination(self):
+        page_size = BidirectionalEndlessPagination.page_size
+        comments = []
+        for i in range(page_size * 2 + 1):
+            user = self.create_user('commenter{}'.format(i))
+            comment = self.create_comment(user, self.tweet, str(i))
+            self.create_like(self.user2, comment)
+            comments.append(comment)
+
+        def get_page(params):
+            params = dict(params, tweet_id=self.tweet.id)
+            response = self.user2_client.get(COMMENT_URL, params)
+            self.assertEqual(response.status_code, 200)
+            return response.data
+
+        # First page has the oldest comments
+        data = get_page({})
+        self.assertEqual(data['has_next_page'], True)
+        self.assertEqual(
+            [item['id'] for item in data['results']],
+            [comment.id for comment in comments[:page_size]],
+        )
+        self.assertEqual(data['results'][0]['has_liked'], True)
+        self.assertEqual(data['results'][0]['likes_count'], 1)
+
+        # Forwards
+        data = get_page({'created_at__gt': data['results'][-1]['created_at']})
+        self.assertEqual(data['has_next_page'], True)
+        self.assertEqual(
+            [item['id'] for item in data['results']],
+            [comment.id for comment in comments[page_size:page_size * 2]],
+        )
+        data = get_page({'created_at__gt': data['results'][-1]['created_at']})
+        self.assertEqual(data['has_next_page'], False)
+        self.assertEqual(data['results'][0]['id'], comments[-1].id)
+
+        # Backwards, still in created_at asc order
+        data = get_page({'created_at__lt': comments[-1].created_at})
+        self.assertEqual(data['has_next_page'], True)
+        self.assertEqual(
+            [item['id'] for item in data['results']],
+            [comment.id for comment in comments[page_size:page_size * 2]],
+        )
+        data = get_page({'created_at__lt': comments[1].created_at})
+        self.assertEqual(data['has_next_page'], False)
+        self.assertEqual(data['results'][0]['id'], comments[0].id)
+
+        # Comments, has_liked and users not in cache, at any page size
+        self.clear_cache()
+        with self.assertNumQueries(3):
+            get_page({})
+        with self.assertNumQueries(2):
+            get_page({})
 
     def test_comments_count(self):
         # test tweet detail api
@@ -152,11 +212,62 @@ class CommentApiTests(TestCase):
         self.create_comment(self.user1, tweet)
         response = self.user2_client.get(TWEET_LIST_API, {'user_id': self.user1.id})
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data['tweets'][0]['comments_count'], 1)
+        self.assertEqual(response.data['results'][0]['comments_count'], 1)
 
         # test newsfeeds list api
         self.create_comment(self.user2, tweet)
         self.create_newsfeed(self.user2, tweet)
         response = self.user2_client.get(NEWSFEED_LIST_API)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data['newsfeeds'][0]['tweet']['comments_count'], 2)
\ No newline at end of file
+        self.assertEqual(response.data['results'][0]['tweet']['comments_count'], 2)
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class CommentReadReplicaTests(TestCase):
+    # 'replica' is an empty database, like a replica behind the primary
+
+    def setUp(self):
+        self.clear_cache()
+        self.user1, self.user1_client = self.create_user_and_client('user1')
+        self.user2, self.user2_client = self.create_user_and_client('user2')
+        self.tweet = self.create_tweet(self.user1)
+
+    def get_comments(self, client):
+        with CaptureQueriesContext(connections['replica']) as captured:
+            response = client.get(COMMENT_URL, {'tweet_id': self.tweet.id})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], len(captured) > 0
+
+    def test_read_your_writes(self):
+        response = self.user1_client.post(COMMENT_URL, {
+            'tweet_id': self.tweet.id,
+            'content': 'first',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(RECENT_WRITE_COOKIE, response.cookies)
+
+        # user1 just wrote, reads from the primary
+        comments, read_replica = self.get_comments(self.user1_client)
+        self.assertEqual(len(comments), 1)
+        self.assertEqual(read_replica, False)
+        # Other users read from the replica, it does not have the comment yet
+        comments, read_replica = self.get_comments(self.user2_client)
+        self.assertEqual(comments, [])
+        self.assertEqual(read_replica, True)
+
+        # Clients without cookies stick to the primary by the cache
+        del self.user1_client.cookies[RECENT_WRITE_COOKIE]
+        comments, read_replica = self.get_comments(self.user1_client)
+        self.assertEqual(read_replica, False)
+
+        # Sticky time is over
+        self.clear_cache()
+        comments, read_replica = self.get_comments(self.user1_client)
+        self.assertEqual(comments, [])
+        self.assertEqual(read_replica, True)
+
+    def test_cache_is_filled_from_primary(self):
+        # Tweet is not in the replica, but it is loaded to cache from the primary
+        response = self.user2_client.get(TWEET_DETAIL_API.format(self.tweet.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.tweet.id)
+        self.assertEqual(response.data['user']['username'], 'user1')
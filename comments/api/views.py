@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
+from comments.api.filters import CommentFilter
 from comments.api.permissions import IsObjectOwner
 from comments.models import Comment
 from comments.api.serializers import (
@@ -10,15 +11,18 @@ from comments.api.serializers import (
     CommentSerializerForUpdate,
 )
 from utils.decorators import required_params
+from utils.paginations import BidirectionalEndlessPagination
+from utils.read_replicas import ReadReplicaViewSetMixin
 from inbox.services import NotificationService
 
 
-class CommentViewSet(viewsets.GenericViewSet):
+class CommentViewSet(ReadReplicaViewSetMixin, viewsets.GenericViewSet):
     # Only implement list, create, update, destroy
     # Not support retrieve
     serializer_class = CommentSerializerForCreate
     queryset = Comment.objects.all()
-    filterset_fields = ('tweet_id',)
+    filterset_class = CommentFilter
+    pagination_class = BidirectionalEndlessPagination
 
     # Pre-defined functions
     # POST /api/comments/ -> create()
@@ -57,21 +61,19 @@ class CommentViewSet(viewsets.GenericViewSet):
 
         # More advanced, using django_filters
         queryset = self.get_queryset()
-        # Call filter_backends, which is defined in filterset_fields
+        # Call filter_backends, which is defined in filterset_class
         # comments = self.filter_queryset(queryset).order_by('created_at')
-        # Use prefetch_related to reduce auth_user request in DB
-        comments = self.filter_queryset(queryset)\
-            .prefetch_related('user')\
-            .order_by('created_at')
+        # Viral tweets have thousands of comments, read one page by index
+        # (tweet, created_at). Users are loaded from cache by CommentSerializer's
+        # list serializer, likes_count is a column and has_liked of the page is
+        # one query, so a page costs the same number of queries at any size
+        page = self.paginate_queryset(self.filter_queryset(queryset))
         serializer = CommentSerializer(
-            comments,
+            page,
             context={'request': request},
             many=True,
         )
-        return Response(
-            {'comments': serializer.data},
-            status=status.HTTP_200_OK,
-        )
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         # Another way to pass info to serializer: create a dict
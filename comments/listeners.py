@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models import F
+from tweets.models import Tweet
+from tweets.services import TweetService
+
+
+def _update_comments_count(instance, amount):
+    if instance.tweet_id is None:
+        return
+    Tweet.objects.filter(id=instance.tweet_id).update(
+        comments_count=F('comments_count') + amount,
+    )
+    # Cache changes run after the commit, see tweets/listeners.py
+    tweet_id = instance.tweet_id
+    transaction.on_commit(lambda: TweetService.invalidate_tweet(tweet_id))
+
+
+def incr_comments_count(sender, instance, created, **kwargs):
+    if not created:
+        return
+    _update_comments_count(instance, 1)
+
+
+def decr_comments_count(sender, instance, **kwargs):
+    _update_comments_count(instance, -1)
@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.models import OuterRef
+from utils.queries import count_subquery
+
+BATCH_SIZE = 1000
+
+
+def backfill_likes_count(apps, schema_editor):
+    # likes_count of existing comments starts at 0, count them in DB, one
+    # UPDATE per batch of ids so the table is not locked at once
+    Comment = apps.get_model('comments', 'Comment')
+    Like = apps.get_model('likes', 'Like')
+    comments = Comment.objects.using(schema_editor.connection.alias)
+    last_id = 0
+    while True:
+        ids = list(
+            comments.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        comments.filter(id__in=ids).update(
+            likes_count=count_subquery(
+                Like.objects.filter(
+                    content_type__app_label='comments',
+                    content_type__model='comment',
+                    object_id=OuterRef('id'),
+                ),
+                'object_id',
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0003_counters_not_null'),
+        ('likes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_likes_count, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
+from accounts.services import UserService
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from comments.listeners import decr_comments_count, incr_comments_count
 from likes.models import Like
 from tweets.models import Tweet
 
@@ -12,10 +15,16 @@ class Comment(models.Model):
     content = models.TextField(max_length=140)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counter, kept in sync by likes/listeners.py
+    likes_count = models.IntegerField(default=0)
 
     class Meta:
         index_together = (('tweet', 'created_at'),)
 
+    @property
+    def cached_user(self):
+        return UserService.get_related_user_through_cache(self)
+
     @property
     def like_set(self):
         return Like.objects.filter(
@@ -30,3 +39,7 @@ class Comment(models.Model):
             self.content,
             self.tweet_id,
         )
+
+
+post_save.connect(incr_comments_count, sender=Comment)
+post_delete.connect(decr_comments_count, sender=Comment)
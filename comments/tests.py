@@ -4,6 +4,7 @@ from testing.testcases import TestCase
 class CommentModelTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.user1 = self.create_user('user1')
         self.tweet = self.create_tweet(self.user1)
         self.comment = self.create_comment(self.user1, self.tweet)
@@ -20,4 +21,14 @@ class CommentModelTests(TestCase):
 
         user2 = self.create_user('user2')
         self.create_like(user2, self.comment)
-        self.assertEqual(self.comment.like_set.count(), 2)
\ No newline at end of file
+        self.assertEqual(self.comment.like_set.count(), 2)
+
+    def test_likes_count(self):
+        user2 = self.create_user('user2')
+        self.create_like(self.user1, self.comment)
+        self.create_like(user2, self.comment)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.likes_count, 2)
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 0)
+        self.assertEqual(self.tweet.comments_count, 1)
@@ -1,5 +1,9 @@
-from accounts.api.serializers import UserSerializerForFriendship
+from accounts.api.serializers import (
+    CachedUsersListSerializer,
+    UserSerializerForFriendship,
+)
 from friendships.models import Friendship
+from friendships.services import FriendshipService
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
@@ -8,23 +12,58 @@ from django.contrib.auth.models import User
 # Can use source=xxx to identify the method/field of access model instance
 # source='from_user' equals friendships.from_user
 # https://www.django-rest-framework.org/api-guide/serializers/#specifying-fields-explicitly
-class FollowerSerializer(serializers.ModelSerializer):
+class BaseFriendshipSerializer(serializers.ModelSerializer):
+    # Whether the current user follows the user of this row
+    has_followed = serializers.SerializerMethodField()
+
+    def get_user_id(self, obj):
+        raise NotImplementedError
+
+    def _get_following_user_id_set(self):
+        # The child serializer is shared by all rows of a list, read the
+        # cached set once instead of once per row
+        if hasattr(self, '_following_user_id_set'):
+            return self._following_user_id_set
+        request = self.context.get('request')
+        if request is None or request.user.is_anonymous:
+            self._following_user_id_set = set()
+        else:
+            self._following_user_id_set = FriendshipService.get_following_user_id_set(
+                request.user.id,
+            )
+        return self._following_user_id_set
+
+    def get_has_followed(self, obj):
+        return self.get_user_id(obj) in self._get_following_user_id_set()
+
+
+class FollowerSerializer(BaseFriendshipSerializer):
     # Need to declare user serializer here to show full user info, otherwise return an int type id
-    user = UserSerializerForFriendship(source='from_user')
+    user = UserSerializerForFriendship(source='cached_from_user')
     created_at = serializers.DateTimeField()
 
     class Meta:
         model = Friendship
-        fields = ('user', 'created_at')
+        list_serializer_class = CachedUsersListSerializer
+        cached_user_fields = ('from_user',)
+        fields = ('user', 'created_at', 'has_followed')
+
+    def get_user_id(self, obj):
+        return obj.from_user_id
 
 
-class FollowingSerializer(serializers.ModelSerializer):
-    user = UserSerializerForFriendship(source='to_user')
+class FollowingSerializer(BaseFriendshipSerializer):
+    user = UserSerializerForFriendship(source='cached_to_user')
     created_at = serializers.DateTimeField()
 
     class Meta:
         model = Friendship
-        fields = ('user', 'created_at')
+        list_serializer_class = CachedUsersListSerializer
+        cached_user_fields = ('to_user',)
+        fields = ('user', 'created_at', 'has_followed')
+
+    def get_user_id(self, obj):
+        return obj.to_user_id
 
 
 class FriendshipSerializerForCreate(serializers.ModelSerializer):
@@ -1,18 +1,24 @@
 from http.client import responses
 
+from django.test import override_settings
 from friendships.models import Friendship
+from jobs.models import Job
+from newsfeeds.services import NewsFeedService
 from rest_framework.test import APIClient
 from testing.testcases import TestCase
+from utils.paginations import EndlessPagination
 
 FOLLOW_URL = '/api/friendships/{}/follow/'
 UNFOLLOW_URL = '/api/friendships/{}/unfollow/'
 FOLLOWERS_URL = '/api/friendships/{}/followers/'
 FOLLOWINGS_URL = '/api/friendships/{}/followings/'
+RELATIONSHIPS_URL = '/api/friendships/relationships/'
 
 
 class FriendshipApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.user1 = self.create_user('user1', 'user1@twitter.com')
         self.user1_client = APIClient()
         self.user1_client.force_authenticate(self.user1)
@@ -93,23 +99,23 @@ class FriendshipApiTests(TestCase):
         # Success: Use Get
         response = self.anonymous_client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data['followings']), 3)
+        self.assertEqual(len(response.data['results']), 3)
         # Check list ordering
-        ts0 = response.data['followings'][0]['created_at']
-        ts1 = response.data['followings'][1]['created_at']
-        ts2 = response.data['followings'][2]['created_at']
+        ts0 = response.data['results'][0]['created_at']
+        ts1 = response.data['results'][1]['created_at']
+        ts2 = response.data['results'][2]['created_at']
         self.assertEqual(ts0 > ts1, True)
         self.assertEqual(ts1 > ts2, True)
         self.assertEqual(
-            response.data['followings'][0]['user']['username'],
+            response.data['results'][0]['user']['username'],
             'user2_following2',
         )
         self.assertEqual(
-            response.data['followings'][1]['user']['username'],
+            response.data['results'][1]['user']['username'],
             'user2_following1',
         )
         self.assertEqual(
-            response.data['followings'][2]['user']['username'],
+            response.data['results'][2]['user']['username'],
             'user2_following0',
         )
 
@@ -122,19 +128,151 @@ class FriendshipApiTests(TestCase):
         # Success: Use Get
         response = self.anonymous_client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data['followers']), 2)
+        self.assertEqual(len(response.data['results']), 2)
         # Check list ordering
-        ts0 = response.data['followers'][0]['created_at']
-        ts1 = response.data['followers'][1]['created_at']
+        ts0 = response.data['results'][0]['created_at']
+        ts1 = response.data['results'][1]['created_at']
         self.assertEqual(ts0 > ts1, True)
         self.assertEqual(
-            response.data['followers'][0]['user']['username'],
+            response.data['results'][0]['user']['username'],
             'user2_follower1',
         )
         self.assertEqual(
-            response.data['followers'][1]['user']['username'],
+            response.data['results'][1]['user']['username'],
             'user2_follower0',
         )
 
+    def test_followers_pagination(self):
+        page_size = EndlessPagination.page_size
+        celebrity = self.create_user('celebrity')
+        friendships = []
+        for i in range(page_size * 2):
+            follower = self.create_user('celebrity_follower{}'.format(i))
+            friendships.append(
+                Friendship.objects.create(from_user=follower, to_user=celebrity),
+            )
+            # user1 follows the followers with even index
+            if i % 2 == 0:
+                Friendship.objects.create(from_user=self.user1, to_user=follower)
+        friendships = friendships[::-1]
+        url = FOLLOWERS_URL.format(celebrity.id)
 
+        response = self.user1_client.get(url)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [item['user']['id'] for item in response.data['results']],
+            [friendship.from_user_id for friendship in friendships[:page_size]],
+        )
+        self.assertEqual(
+            [item['has_followed'] for item in response.data['results']],
+            [i % 2 == 1 for i in range(page_size)],
+        )
+
+        response = self.user1_client.get(url, {
+            'created_at__lt': response.data['results'][-1]['created_at'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [item['user']['id'] for item in response.data['results']],
+            [friendship.from_user_id for friendship in friendships[page_size:]],
+        )
+
+        # The same list api
+        response = self.user1_client.get('/api/friendships/', {
+            'user_id': celebrity.id,
+            'type': 'followers',
+        })
+        self.assertEqual(len(response.data['results']), page_size)
+
+        # Friendships, users not in cache and followings of user1, the
+        # same for a page of 2 and a full page
+        self.clear_cache()
+        with self.assertNumQueries(3):
+            self.user1_client.get(FOLLOWERS_URL.format(self.user2.id))
+        self.clear_cache()
+        with self.assertNumQueries(3):
+            self.user1_client.get(url)
+
+        # Error: user id is not an integer
+        response = self.anonymous_client.get(FOLLOWINGS_URL.format('abc'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_and_unfollow_update_newsfeeds(self):
+        tweet = self.create_tweet(self.user2)
+        self.user1_client.post(FOLLOW_URL.format(self.user2.id))
+        self.assertEqual(
+            NewsFeedService.get_newsfeeds(self.user1.id).filter(tweet=tweet).exists(),
+            True,
+        )
+        self.user1_client.post(UNFOLLOW_URL.format(self.user2.id))
+        self.assertEqual(NewsFeedService.get_newsfeeds(self.user1.id).count(), 0)
+
+    @override_settings(JOB_BACKEND='jobs.backends.DatabaseBackend')
+    def test_follow_does_not_update_newsfeeds_in_request(self):
+        self.create_tweet(self.user2)
+        response = self.user1_client.post(FOLLOW_URL.format(self.user2.id))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(NewsFeedService.get_newsfeeds(self.user1.id).count(), 0)
+        self.assertEqual(Job.objects.count(), 1)
+        # Duplicated follow and unfollow of a user not followed do not queue jobs
+        self.user1_client.post(FOLLOW_URL.format(self.user2.id))
+        self.user2_client.post(UNFOLLOW_URL.format(self.user1.id))
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_has_followed(self):
+        follower = self.user2.follower_friendship_set.first().from_user
+        self.user1_client.post(FOLLOW_URL.format(follower.id))
+        response = self.user1_client.get(FOLLOWERS_URL.format(self.user2.id))
+        has_followed = {
+            item['user']['id']: item['has_followed']
+            for item in response.data['results']
+        }
+        self.assertEqual(len(has_followed), 2)
+        self.assertEqual(has_followed[follower.id], True)
+        self.assertEqual(sum(has_followed.values()), 1)
+
+        # Anonymous user does not follow anyone
+        response = self.anonymous_client.get(FOLLOWERS_URL.format(self.user2.id))
+        self.assertEqual(
+            [item['has_followed'] for item in response.data['results']],
+            [False, False],
+        )
+
+    def test_relationships(self):
+        followings = [
+            friendship.to_user
+            for friendship in self.user2.following_friendship_set.all()
+        ]
+        user_ids = ','.join(
+            str(user_id)
+            for user_id in [followings[0].id, self.user1.id, followings[1].id]
+        )
+
+        # Need logged in
+        response = self.anonymous_client.get(RELATIONSHIPS_URL, {'user_ids': user_ids})
+        self.assertEqual(response.status_code, 403)
+        # Missing or invalid user_ids
+        response = self.user2_client.get(RELATIONSHIPS_URL)
+        self.assertEqual(response.status_code, 400)
+        response = self.user2_client.get(RELATIONSHIPS_URL, {'user_ids': '1,a'})
+        self.assertEqual(response.status_code, 400)
+        response = self.user2_client.get(RELATIONSHIPS_URL, {
+            'user_ids': ','.join(str(i) for i in range(101)),
+        })
+        self.assertEqual(response.status_code, 400)
+
+        # Followings of user2 are read by one query, then from cache
+        with self.assertNumQueries(1):
+            response = self.user2_client.get(RELATIONSHIPS_URL, {'user_ids': user_ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['relationships'], [
+            {'user_id': followings[0].id, 'has_followed': True},
+            {'user_id': self.user1.id, 'has_followed': False},
+            {'user_id': followings[1].id, 'has_followed': True},
+        ])
+        with self.assertNumQueries(0):
+            self.user2_client.get(RELATIONSHIPS_URL, {'user_ids': user_ids})
 
+        self.user2_client.post(FOLLOW_URL.format(self.user1.id))
+        response = self.user2_client.get(RELATIONSHIPS_URL, {'user_ids': user_ids})
+        self.assertEqual(response.data['relationships'][1]['has_followed'], True)
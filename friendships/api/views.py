@@ -2,6 +2,7 @@ from pickle import FALSE
 
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from friendships.models import Friendship
@@ -11,32 +12,52 @@ from friendships.api.serializers import (
     FriendshipSerializerForCreate,
 )
 from django.contrib.auth.models import User
+from friendships.services import FriendshipService
+from newsfeeds.services import NewsFeedService
+from utils.decorators import required_params
+from utils.paginations import EndlessPagination
+from utils.read_replicas import ReadReplicaViewSetMixin
 
+# Max number of user ids checked by one relationships request
+MAX_RELATIONSHIP_USER_IDS = 100
 
-class FriendshipViewSet(viewsets.GenericViewSet):
+
+class FriendshipViewSet(ReadReplicaViewSetMixin, viewsets.GenericViewSet):
     # POST /api/friendship/1/follow is to follow user with user_id=1
     # queryset should be User.objects.all() here
     # so that detail=True actions can check if pk (primary key) is existing
     serializer_class = FriendshipSerializerForCreate
     queryset = User.objects.all()
+    # A celebrity has millions of followers, read one page by index
+    # (to_user_id, created_at) or (from_user_id, created_at)
+    pagination_class = EndlessPagination
+    read_replica_actions = ('list', 'followers', 'followings')
 
     @action(methods=['GET'], detail=True, permission_classes=[AllowAny])
     def followers(self, request, pk):
-        friendships = Friendship.objects.filter(to_user_id=pk)
-        serializer = FollowerSerializer(friendships, many=True)
-        return Response(
-            {'followers' : serializer.data},
-            status=status.HTTP_200_OK
+        if not str(pk).isdigit():
+            raise NotFound()
+        page = self.paginate_queryset(Friendship.objects.filter(to_user_id=pk))
+        # Users of the page are loaded from cache in one batch by
+        # CachedUsersListSerializer, has_followed uses one cached set
+        serializer = FollowerSerializer(
+            page,
+            context={'request': request},
+            many=True,
         )
+        return self.get_paginated_response(serializer.data)
 
     @action(methods=['GET'], detail=True, permission_classes=[AllowAny])
     def followings(self, request, pk):
-        friendships = Friendship.objects.filter(from_user_id=pk)
-        serializer = FollowingSerializer(friendships, many=True)
-        return Response(
-            {'followings' : serializer.data},
-            status=status.HTTP_200_OK
+        if not str(pk).isdigit():
+            raise NotFound()
+        page = self.paginate_queryset(Friendship.objects.filter(from_user_id=pk))
+        serializer = FollowingSerializer(
+            page,
+            context={'request': request},
+            many=True,
         )
+        return self.get_paginated_response(serializer.data)
 
     @action(methods=['POST'], detail=True, permission_classes=[IsAuthenticated])
     def follow(self, request, pk):
@@ -60,8 +81,10 @@ class FriendshipViewSet(viewsets.GenericViewSet):
                 'errors': serializer.errors,
             }, status=status.HTTP_400_BAD_REQUEST)
         instance = serializer.save()
+        # Show followee's latest tweets in newsfeeds, done asynchronously
+        NewsFeedService.backfill_newsfeeds(instance.from_user_id, instance.to_user_id)
         return Response(
-            FollowingSerializer(instance).data,
+            FollowingSerializer(instance, context={'request': request}).data,
             status=status.HTTP_201_CREATED
         )
 
@@ -83,8 +106,51 @@ class FriendshipViewSet(viewsets.GenericViewSet):
             from_user=request.user,
             to_user=pk,
         ).delete()
+        if deleted:
+            # Remove unfollowed user's tweets from newsfeeds, done asynchronously
+            NewsFeedService.purge_newsfeeds(request.user.id, unfollow_user.id)
+            # Tweets not pushed while unfollow_user was in pull mode
+            NewsFeedService.leave_pull_mode(unfollow_user.id)
         return Response({'success': True, 'deleted': deleted})
 
+    @action(methods=['GET'], detail=False, permission_classes=[IsAuthenticated])
+    @required_params(params=['user_ids'])
+    def relationships(self, request):
+        """
+        GET /api/friendships/relationships/?user_ids=1,2,3
+        Check whether current user follows each user, by one cached set
+        instead of one query per user
+        """
+        try:
+            user_ids = [
+                int(user_id)
+                for user_id in request.query_params['user_ids'].split(',')
+            ]
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'user_ids should be integers separated by comma',
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > MAX_RELATIONSHIP_USER_IDS:
+            return Response({
+                'success': False,
+                'message': 'At most {} user_ids in one request'.format(
+                    MAX_RELATIONSHIP_USER_IDS,
+                ),
+            }, status=status.HTTP_400_BAD_REQUEST)
+        following_user_id_set = FriendshipService.get_following_user_id_set(
+            request.user.id,
+        )
+        return Response({
+            'relationships': [
+                {
+                    'user_id': user_id,
+                    'has_followed': user_id in following_user_id_set,
+                }
+                for user_id in user_ids
+            ],
+        }, status=status.HTTP_200_OK)
+
     # More restful way to access followings / followers:
     # /api/friendships/?user_id=4&type=followings
     # /api/friendships/?user_id=4&type=followers
@@ -92,23 +158,13 @@ class FriendshipViewSet(viewsets.GenericViewSet):
         if 'user_id' not in request.query_params:
             return Response('Missing user_id', status=400)
 
-        type = request.query_params['type']
+        type = request.query_params.get('type')
         user_id = request.query_params['user_id']
 
+        # Same as GET /api/friendships/<user_id>/followers/ or followings/
         if type == 'followers':
-            friendships = Friendship.objects.filter(to_user_id=user_id).order_by('-created_at')
-            serializer = FollowerSerializer(friendships, many=True)
-            return Response(
-                {'followers': serializer.data},
-                status=status.HTTP_200_OK
-            )
+            return self.followers(request, user_id)
         elif type == 'followings':
-            friendships = Friendship.objects.filter(from_user_id=user_id).order_by('-created_at')
-            serializer = FollowingSerializer(friendships, many=True)
-            return Response(
-                {'followings': serializer.data},
-                status=status.HTTP_200_OK
-            )
+            return self.followings(request, user_id)
         else:
             return Response(f'Invalid type: {type}', status=400)
-
@@ -0,0 +1,46 @@
+from django.db import transaction
+
+# Import FriendshipService in listeners, friendships.services imports
+# friendships.models which connects these listeners
+
+# Cache changes run after the commit, otherwise a reader can load the
+# followings or followers from DB without this change and cache them.
+# Values are read from instance right away, not when the callback runs
+
+
+def invalidate_following_cache(sender, instance, **kwargs):
+    from friendships.services import FriendshipService
+    from_user_id = instance.from_user_id
+    transaction.on_commit(
+        lambda: FriendshipService.invalidate_following_cache(from_user_id),
+    )
+
+
+def invalidate_followers_count_cache(sender, instance, **kwargs):
+    if instance.to_user_id is None:
+        return
+    from friendships.services import FriendshipService
+    to_user_id = instance.to_user_id
+    transaction.on_commit(
+        lambda: FriendshipService.invalidate_followers_count_cache(to_user_id),
+    )
+
+
+def add_follower_id_to_cache(sender, instance, created, **kwargs):
+    if not created or instance.from_user_id is None:
+        return
+    from friendships.services import FriendshipService
+    to_user_id, from_user_id = instance.to_user_id, instance.from_user_id
+    transaction.on_commit(
+        lambda: FriendshipService.append_follower_id_to_cache(to_user_id, from_user_id),
+    )
+
+
+def remove_follower_id_from_cache(sender, instance, **kwargs):
+    if instance.from_user_id is None:
+        return
+    from friendships.services import FriendshipService
+    to_user_id, from_user_id = instance.to_user_id, instance.from_user_id
+    transaction.on_commit(
+        lambda: FriendshipService.append_follower_id_to_cache(to_user_id, -from_user_id),
+    )
@@ -1,5 +1,13 @@
+from accounts.services import UserService
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from friendships.listeners import (
+    add_follower_id_to_cache,
+    invalidate_followers_count_cache,
+    invalidate_following_cache,
+    remove_follower_id_from_cache,
+)
 
 
 class Friendship(models.Model):
@@ -28,6 +36,23 @@ class Friendship(models.Model):
         unique_together = (('from_user_id', 'to_user_id'),)
         ordering = ('-created_at',)
 
+    @property
+    def cached_from_user(self):
+        return UserService.get_related_user_through_cache(self, 'from_user')
+
+    @property
+    def cached_to_user(self):
+        return UserService.get_related_user_through_cache(self, 'to_user')
+
     def __str__(self):
         return '{} followed {}'.format(self.from_user_id, self.to_user_id)
 
+
+# Follow and unfollow change the cached following user ids
+post_save.connect(invalidate_following_cache, sender=Friendship)
+post_delete.connect(invalidate_following_cache, sender=Friendship)
+post_save.connect(invalidate_followers_count_cache, sender=Friendship)
+post_delete.connect(invalidate_followers_count_cache, sender=Friendship)
+# Cached follower ids are updated in place instead of dropped
+post_save.connect(add_follower_id_to_cache, sender=Friendship)
+post_delete.connect(remove_follower_id_from_cache, sender=Friendship)
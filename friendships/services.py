@@ -1,4 +1,25 @@
+from array import array
+
+from django.conf import settings
+from django.db.models import Count
 from friendships.models import Friendship
+from twitter.cache import (
+    FOLLOWERS_COUNT_PATTERN,
+    FOLLOWINGS_PATTERN,
+    USER_FOLLOWER_IDS_PATTERN,
+)
+from utils.multi_level_cache import MultiLevelCache
+from utils.read_replicas import read_from_primary
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
+
+following_cache = MultiLevelCache('followings')
+followers_count_cache = MultiLevelCache('followers_count')
+
+# Follower ids are cached in redis as packed array('q'), 8 bytes per id.
+# The first item is always 0, so a value created by APPEND after the key
+# expired (without the ids loaded from DB) can be told apart
+FOLLOWER_IDS_HEADER = array('q', [0]).tobytes()
 
 
 class FriendshipService(object):
@@ -39,3 +60,169 @@ class FriendshipService(object):
         # Another simpler way is to return user_id instead of user
         # friendships = Friendship.objects.filter(to_user=user)
         # follower_ids = [friendship.from_user_id for friendship in friendships]
+
+    @classmethod
+    def has_followed(cls, from_user_id, to_user_id):
+        return Friendship.objects.filter(
+            from_user_id=from_user_id,
+            to_user_id=to_user_id,
+        ).exists()
+
+    @classmethod
+    def get_follower_ids(cls, to_user_id):
+        # Only ids are needed for fanout, use values_list to avoid building User objects
+        # Return a queryset, caller can use .iterator() to stream large follower lists
+        return Friendship.objects.filter(
+            to_user_id=to_user_id,
+        ).values_list('from_user_id', flat=True)
+
+    @classmethod
+    def get_follower_ids_through_cache(cls, to_user_id):
+        """
+        Return follower ids as array('q'). Loaded from DB once and kept up to
+        date by follow / unfollow, so repeated fanouts of an author do not
+        scan Friendship table
+        """
+        conn = RedisClient.get_connection()
+        key = USER_FOLLOWER_IDS_PATTERN.format(user_id=to_user_id)
+        data = conn.get(key)
+        if data is not None and data.startswith(FOLLOWER_IDS_HEADER):
+            return cls._unpack_follower_ids(data)
+
+        # Cache miss, stream the ids instead of loading all rows at once
+        token = RedisHelper.acquire_rebuild_lock(key)
+        follower_ids = array('q', [0])
+        with read_from_primary():
+            follower_ids.extend(cls.get_follower_ids(to_user_id).iterator(
+                chunk_size=settings.NEWSFEED_FANOUT_BATCH_SIZE,
+            ))
+        if token is not None:
+            # nx: do not overwrite the value of another worker which may have
+            # ids appended after it
+            conn.set(
+                key,
+                follower_ids.tobytes(),
+                ex=settings.REDIS_KEY_EXPIRE_TIME,
+                nx=True,
+            )
+            RedisHelper.release_rebuild_lock(key, token)
+        return follower_ids[1:]
+
+    @classmethod
+    def _unpack_follower_ids(cls, data):
+        items = array('q')
+        items.frombytes(data)
+        items = items[1:]
+        if min(items, default=0) > 0:
+            return items
+        # Negative item -id is appended when id unfollows
+        follower_ids = {}
+        for item in items:
+            if item > 0:
+                follower_ids[item] = True
+            else:
+                follower_ids.pop(-item, None)
+        return array('q', follower_ids)
+
+    @classmethod
+    def append_follower_id_to_cache(cls, to_user_id, item):
+        """
+        Append follower id (or -id for unfollow) to the cached follower ids.
+        APPEND is atomic, concurrent follows of the same user do not overwrite
+        each other like get + set
+        """
+        conn = RedisClient.get_connection()
+        key = USER_FOLLOWER_IDS_PATTERN.format(user_id=to_user_id)
+        length = conn.append(key, array('q', [item]).tobytes())
+        # Not cached before, will be loaded from DB on next read. A load in
+        # progress may have read DB before this follow / unfollow
+        if length == len(FOLLOWER_IDS_HEADER):
+            conn.delete(key)
+            RedisHelper.cancel_rebuild(key)
+
+    @classmethod
+    def get_following_user_ids(cls, from_user_id):
+        return Friendship.objects.filter(
+            from_user_id=from_user_id,
+        ).values_list('to_user_id', flat=True)
+
+    @classmethod
+    def get_following_user_id_set(cls, from_user_id):
+        """
+        Ids of users followed by from_user_id, cached as a set.
+        Used to check whether a user is followed for a list of users in memory
+        """
+        key = FOLLOWINGS_PATTERN.format(user_id=from_user_id)
+        return following_cache.get_or_set(
+            key,
+            lambda: set(cls.get_following_user_ids(from_user_id)),
+        )
+
+    @classmethod
+    def invalidate_following_cache(cls, from_user_id):
+        following_cache.delete(FOLLOWINGS_PATTERN.format(user_id=from_user_id))
+
+    @classmethod
+    def get_followers_count(cls, to_user_id):
+        # Use index (to_user_id, created_at), cached until follow / unfollow
+        key = FOLLOWERS_COUNT_PATTERN.format(user_id=to_user_id)
+        return followers_count_cache.get_or_set(
+            key,
+            lambda: Friendship.objects.filter(to_user_id=to_user_id).count(),
+        )
+
+    @classmethod
+    def get_followers_counts(cls, user_ids):
+        """
+        Return {user_id: followers count} read from cache, the users not cached
+        are counted by one GROUP BY query
+        """
+        keys = {
+            user_id: FOLLOWERS_COUNT_PATTERN.format(user_id=user_id)
+            for user_id in user_ids
+        }
+        cached = followers_count_cache.get_many(list(keys.values()))
+        counts = {
+            user_id: cached[key]
+            for user_id, key in keys.items()
+            if key in cached
+        }
+        missing_ids = [user_id for user_id in user_ids if user_id not in counts]
+        if not missing_ids:
+            return counts
+
+        with read_from_primary():
+            rows = (
+                Friendship.objects.filter(to_user_id__in=missing_ids)
+                # Clear Meta.ordering, otherwise created_at is added to GROUP BY
+                .order_by()
+                .values('to_user_id')
+                .annotate(followers_count=Count('id'))
+                .values_list('to_user_id', 'followers_count')
+            )
+            missing_counts = dict.fromkeys(missing_ids, 0)
+            missing_counts.update(rows)
+        followers_count_cache.set_many({
+            keys[user_id]: count
+            for user_id, count in missing_counts.items()
+        })
+        counts.update(missing_counts)
+        return counts
+
+    @classmethod
+    def invalidate_followers_count_cache(cls, to_user_id):
+        followers_count_cache.delete(FOLLOWERS_COUNT_PATTERN.format(user_id=to_user_id))
+
+    @classmethod
+    def filter_user_ids_by_followers_count(cls, user_ids, min_followers_count):
+        """
+        Return ids in user_ids that have at least min_followers_count followers
+        """
+        if not user_ids:
+            return []
+        counts = cls.get_followers_counts(user_ids)
+        return [
+            user_id
+            for user_id in user_ids
+            if counts[user_id] >= min_followers_count
+        ]
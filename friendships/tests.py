@@ -0,0 +1,119 @@
+from array import array
+
+from friendships.models import Friendship
+from friendships.services import FriendshipService
+from twitter.cache import USER_FOLLOWER_IDS_PATTERN
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
+from testing.testcases import TestCase
+
+
+class FriendshipServiceTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.user1 = self.create_user('user1')
+        self.user2 = self.create_user('user2')
+
+    def test_get_following_user_id_set(self):
+        user3 = self.create_user('user3')
+        Friendship.objects.create(from_user=self.user1, to_user=self.user2)
+        with self.assertNumQueries(1):
+            user_id_set = FriendshipService.get_following_user_id_set(self.user1.id)
+        self.assertEqual(user_id_set, {self.user2.id})
+        with self.assertNumQueries(0):
+            FriendshipService.get_following_user_id_set(self.user1.id)
+
+        # Follow invalidates the cached set
+        Friendship.objects.create(from_user=self.user1, to_user=user3)
+        user_id_set = FriendshipService.get_following_user_id_set(self.user1.id)
+        self.assertEqual(user_id_set, {self.user2.id, user3.id})
+
+        # Unfollow invalidates the cached set
+        Friendship.objects.filter(from_user=self.user1, to_user=self.user2).delete()
+        user_id_set = FriendshipService.get_following_user_id_set(self.user1.id)
+        self.assertEqual(user_id_set, {user3.id})
+
+        # Other users are not affected
+        self.assertEqual(FriendshipService.get_following_user_id_set(self.user2.id), set())
+
+    def test_get_follower_ids_through_cache(self):
+        followers = [self.create_user('follower{}'.format(i)) for i in range(3)]
+        for follower in followers[:2]:
+            Friendship.objects.create(from_user=follower, to_user=self.user1)
+        with self.assertNumQueries(1):
+            follower_ids = FriendshipService.get_follower_ids_through_cache(self.user1.id)
+        self.assertEqual(set(follower_ids), {followers[0].id, followers[1].id})
+
+        # Follow and unfollow update cached ids without reading DB
+        Friendship.objects.create(from_user=followers[2], to_user=self.user1)
+        Friendship.objects.filter(from_user=followers[0], to_user=self.user1).delete()
+        with self.assertNumQueries(0):
+            follower_ids = FriendshipService.get_follower_ids_through_cache(self.user1.id)
+        self.assertEqual(set(follower_ids), {followers[1].id, followers[2].id})
+
+        # Follow again after unfollow
+        Friendship.objects.create(from_user=followers[0], to_user=self.user1)
+        with self.assertNumQueries(0):
+            follower_ids = FriendshipService.get_follower_ids_through_cache(self.user1.id)
+        self.assertEqual(len(follower_ids), 3)
+        self.assertEqual(set(follower_ids), {follower.id for follower in followers})
+
+    def test_follow_without_cached_follower_ids(self):
+        follower = self.create_user('follower')
+        Friendship.objects.create(from_user=follower, to_user=self.user1)
+        key = USER_FOLLOWER_IDS_PATTERN.format(user_id=self.user1.id)
+        # Cached ids are not created by follow, otherwise only has this follower
+        self.assertEqual(RedisClient.get_connection().exists(key), 0)
+        Friendship.objects.create(from_user=self.user2, to_user=self.user1)
+        follower_ids = FriendshipService.get_follower_ids_through_cache(self.user1.id)
+        self.assertEqual(set(follower_ids), {follower.id, self.user2.id})
+        self.assertEqual(RedisClient.get_connection().exists(key), 1)
+
+    def test_get_followers_counts(self):
+        user3 = self.create_user('user3')
+        Friendship.objects.create(from_user=self.user2, to_user=self.user1)
+        Friendship.objects.create(from_user=user3, to_user=self.user1)
+        user_ids = [self.user1.id, self.user2.id]
+        # One GROUP BY for the users not cached, users without followers are 0
+        with self.assertNumQueries(1):
+            counts = FriendshipService.get_followers_counts(user_ids)
+        self.assertEqual(counts, {self.user1.id: 2, self.user2.id: 0})
+        with self.assertNumQueries(0):
+            FriendshipService.get_followers_counts(user_ids)
+            self.assertEqual(FriendshipService.get_followers_count(self.user1.id), 2)
+
+        # Follow and unfollow invalidate the cached count
+        Friendship.objects.create(from_user=self.user1, to_user=self.user2)
+        self.assertEqual(FriendshipService.get_followers_count(self.user2.id), 1)
+        Friendship.objects.filter(from_user=user3).delete()
+        self.assertEqual(
+            FriendshipService.get_followers_counts(user_ids),
+            {self.user1.id: 1, self.user2.id: 1},
+        )
+        self.assertEqual(
+            FriendshipService.filter_user_ids_by_followers_count(user_ids, 1),
+            user_ids,
+        )
+
+    def test_follow_while_loading_follower_ids(self):
+        conn = RedisClient.get_connection()
+        key = USER_FOLLOWER_IDS_PATTERN.format(user_id=self.user1.id)
+        Friendship.objects.create(from_user=self.user2, to_user=self.user1)
+
+        # Another worker is loading the ids, read from DB without caching
+        token = RedisHelper.acquire_rebuild_lock(key)
+        follower_ids = FriendshipService.get_follower_ids_through_cache(self.user1.id)
+        self.assertEqual(list(follower_ids), [self.user2.id])
+        self.assertEqual(conn.exists(key), 0)
+
+        # A follow before that worker writes the ids cancels its load, the ids
+        # read before the follow are not kept
+        follower = self.create_user('follower')
+        Friendship.objects.create(from_user=follower, to_user=self.user1)
+        conn.set(key, array('q', [0, self.user2.id]).tobytes())
+        self.assertFalse(RedisHelper.release_rebuild_lock(key, token))
+        self.assertEqual(conn.exists(key), 0)
+        follower_ids = FriendshipService.get_follower_ids_through_cache(self.user1.id)
+        self.assertEqual(set(follower_ids), {self.user2.id, follower.id})
+        self.assertEqual(conn.exists(key), 1)
@@ -10,6 +10,7 @@ NOTIFICATION_URL = '/api/notifications/'
 class NotificationTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.user1, self.user1_client = self.create_user_and_client('user1')
         self.user2, self.user2_client = self.create_user_and_client('user2')
         self.user2_tweet = self.create_tweet(self.user2)
@@ -34,6 +35,7 @@ class NotificationTests(TestCase):
 class NotificationApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.user1, self.user1_client = self.create_user_and_client('user1')
         self.user2, self.user2_client = self.create_user_and_client('user2')
         self.user1_tweet = self.create_tweet(self.user1)
@@ -58,6 +60,26 @@ class NotificationApiTests(TestCase):
         self.assertEqual(response.data['unread_count'], 2)
         response = self.user2_client.get(url)
         self.assertEqual(response.data['unread_count'], 0)
+        # Served from the counter in cache
+        with self.assertNumQueries(0):
+            response = self.user1_client.get(url)
+        self.assertEqual(response.data['unread_count'], 2)
+
+    def test_unread_count_not_modified(self):
+        url = '/api/notifications/unread-count/'
+        response = self.user1_client.get(url)
+        etag = response['ETag']
+        response = self.user1_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.user2_client.post(LIKE_URL, {
+            'content_type': 'tweet',
+            'object_id': self.user1_tweet.id,
+        })
+        response = self.user1_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['unread_count'], 1)
+        self.assertNotEqual(response['ETag'], etag)
 
     def test_mark_all_as_read(self):
         self.user2_client.post(LIKE_URL, {
@@ -165,4 +187,10 @@ class NotificationApiTests(TestCase):
         response = self.user1_client.put(url, {'verb': 'newverb', 'unread': False})
         self.assertEqual(response.status_code, 200)
         notification.refresh_from_db()
-        self.assertNotEqual(notification.verb, 'newverb')
\ No newline at end of file
+        self.assertNotEqual(notification.verb, 'newverb')
+        response = self.user1_client.get(unread_url)
+        self.assertEqual(response.data['unread_count'], 1)
+        # Marking a read notification as read again does not change the count
+        response = self.user1_client.put(url, {'unread': False})
+        response = self.user1_client.get(unread_url)
+        self.assertEqual(response.data['unread_count'], 1)
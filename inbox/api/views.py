@@ -7,15 +7,26 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from notifications.models import Notification
-from utils.decorators import required_params
+from inbox.services import NotificationService
+from utils.decorators import conditional_response, required_params
+from utils.read_replicas import ReadReplicaViewSetMixin
+
+
+def unread_count_etag(view, request, *args, **kwargs):
+    return '{}:{}'.format(
+        request.user.id,
+        NotificationService.get_unread_count(request.user.id),
+    )
 
 
 class NotificationViewSet(
+    ReadReplicaViewSetMixin,
     viewsets.GenericViewSet,
     viewsets.mixins.ListModelMixin,
 ):
     serializer_class = NotificationSerializer
     permission_classes = (IsAuthenticated,)
+    read_replica_actions = ('list', 'unread_count')
     filterset_fields = ('unread',)
 
     def get_queryset(self):
@@ -24,16 +35,20 @@ class NotificationViewSet(
         return Notification.objects.filter(recipient=self.request.user)
 
     @action(methods=['GET'], detail=False, url_path='unread-count')
+    @conditional_response(etag_func=unread_count_etag)
     def unread_count(self, request, *args, **kwargs):
         # Use url_path to change path to avoid underscore
         # From GET /api/notifications/unread_count/
         # To GET /api/notifications/unread-count/
-        count = self.get_queryset().filter(unread=True).count()
+        count = NotificationService.get_unread_count(request.user.id)
         return Response({'unread_count': count}, status=status.HTTP_200_OK)
 
     @action(methods=['POST'], detail=False, url_path='mark-all-as-read')
     def mark_all_as_read(self, request, *args, **kwargs):
         updated_count = self.get_queryset().filter(unread=True).update(unread=False)
+        # Decrease by the number of rows really updated rather than reset to 0,
+        # notifications sent in the meantime are still counted
+        NotificationService.decr_unread_count(request.user.id, updated_count)
         return Response({'marked_count': updated_count}, status=status.HTTP_200_OK)
 
     @required_params(method='POST', params=['unread'])
@@ -61,7 +76,12 @@ class NotificationViewSet(
                 'message': "Please check input",
                 'errors': serializer.errors,
             }, status=status.HTTP_400_BAD_REQUEST)
+        was_unread = serializer.instance.unread
         notification = serializer.save()
+        if was_unread and not notification.unread:
+            NotificationService.decr_unread_count(request.user.id)
+        elif not was_unread and notification.unread:
+            NotificationService.incr_unread_count(request.user.id)
         return Response(
             NotificationSerializer(notification).data,
             status=status.HTTP_200_OK,
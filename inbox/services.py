@@ -1,11 +1,66 @@
 from comments.models import Comment
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from notifications.models import Notification
 from notifications.signals import notify
 from tweets.models import Tweet
+from twitter.cache import UNREAD_NOTIFICATIONS_COUNT_PATTERN
+from utils.read_replicas import read_from_primary
+from utils.redis_helper import RedisHelper
+
+cache = caches['default']
 
 
 class NotificationService(object):
 
+    @classmethod
+    def get_unread_count(cls, user_id):
+        # The unread-count endpoint is polled by every client, keep a counter in
+        # cache instead of counting the notifications table on each request
+        key = UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id=user_id)
+        count = cache.get(key)
+        if count is not None and count >= 0:
+            return count
+        # memcached stops decr at 0 but other backends do not, a negative
+        # counter means it went wrong, count again
+        if count is not None:
+            cache.delete(key)
+        # Self heal from DB under the rebuild lock. A notification sent between
+        # the count and add() finds no counter to incr, it cancels the rebuild
+        # and the counter is dropped instead of staying one behind
+        token = RedisHelper.acquire_rebuild_lock(key)
+        with read_from_primary():
+            count = Notification.objects.filter(recipient_id=user_id, unread=True).count()
+        if token is None:
+            # Another request is counting, do not cache
+            return count
+        # add() so a counter created by another request in the meantime is not
+        # overwritten
+        cache.add(key, count)
+        if not RedisHelper.release_rebuild_lock(key, token):
+            cache.delete(key)
+        return count
+
+    @classmethod
+    def incr_unread_count(cls, user_id, delta=1):
+        key = UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id=user_id)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # Not cached, loaded from DB in next get_unread_count. A count in
+            # progress may have missed it
+            RedisHelper.cancel_rebuild(key)
+
+    @classmethod
+    def decr_unread_count(cls, user_id, delta=1):
+        if delta <= 0:
+            return
+        key = UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id=user_id)
+        try:
+            cache.decr(key, delta)
+        except ValueError:
+            RedisHelper.cancel_rebuild(key)
+
     @classmethod
     def send_like_notification(cls, like):
         target = like.content_object
@@ -18,6 +73,7 @@ class NotificationService(object):
                 verb='liked your tweet',
                 target=target,
             )
+            cls.incr_unread_count(target.user_id)
         if like.content_type == ContentType.objects.get_for_model(Comment):
             notify.send(
                 like.user,
@@ -25,6 +81,7 @@ class NotificationService(object):
                 verb='liked your comment',
                 target=target,
             )
+            cls.incr_unread_count(target.user_id)
 
     @classmethod
     def send_comment_notification(cls, comment):
@@ -36,3 +93,4 @@ class NotificationService(object):
             verb='commented on your tweet',
             target=comment.tweet,
         )
+        cls.incr_unread_count(comment.tweet.user_id)
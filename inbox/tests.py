@@ -1,11 +1,13 @@
 from testing.testcases import TestCase
-from inbox.services import NotificationService
+from inbox.services import NotificationService, cache
 from notifications.models import Notification
+from unittest import mock
 
 
 class NotificationServiceTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.user1 = self.create_user('user1')
         self.user2 = self.create_user('user2')
         self.user1_tweet = self.create_tweet(self.user1)
@@ -31,3 +33,40 @@ class NotificationServiceTests(TestCase):
         like = self.create_like(self.user2, self.user1_tweet)
         NotificationService.send_like_notification(like)
         self.assertEqual(Notification.objects.count(), 1)
+
+    def test_unread_count(self):
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 0)
+        # Read from cache
+        with self.assertNumQueries(0):
+            self.assertEqual(NotificationService.get_unread_count(self.user1.id), 0)
+
+        like = self.create_like(self.user2, self.user1_tweet)
+        NotificationService.send_like_notification(like)
+        comment = self.create_comment(self.user2, self.user1_tweet)
+        NotificationService.send_comment_notification(comment)
+        with self.assertNumQueries(0):
+            self.assertEqual(NotificationService.get_unread_count(self.user1.id), 2)
+
+        NotificationService.decr_unread_count(self.user1.id)
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 1)
+
+        # Counter is missing, count from DB
+        self.clear_cache()
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 2)
+        # A counter below 0 is counted again
+        NotificationService.decr_unread_count(self.user1.id, 3)
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 2)
+
+    def test_notification_sent_while_counting(self):
+        like = self.create_like(self.user2, self.user1_tweet)
+        add = cache.add
+
+        def notify_and_add(*args, **kwargs):
+            # Sent after the count, before the counter is cached
+            NotificationService.send_like_notification(like)
+            return add(*args, **kwargs)
+
+        with mock.patch.object(cache, 'add', side_effect=notify_and_add):
+            self.assertEqual(NotificationService.get_unread_count(self.user1.id), 0)
+        # The stale count is not kept
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 1)
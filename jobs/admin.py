@@ -0,0 +1,16 @@
+from django.contrib import admin
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    date_hierarchy = 'created_at'
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'attempts',
+        'created_at',
+        'updated_at',
+    )
+    list_filter = ('status',)
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    name = 'jobs'
+
+    def ready(self):
+        # Import <app>/tasks.py of every installed app, so that all @job functions
+        # are registered before a worker starts to consume the queue
+        autodiscover_modules('tasks')
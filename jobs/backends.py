@@ -0,0 +1,63 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from jobs.models import Job
+from jobs.services import JobService
+
+logger = logging.getLogger(__name__)
+
+
+class BaseBackend(object):
+
+    def enqueue(self, name, args, kwargs):
+        raise NotImplementedError
+
+
+class SyncBackend(BaseBackend):
+    """
+    Run the job immediately in current thread, used for testing
+    """
+
+    def enqueue(self, name, args, kwargs):
+        JobService.run_job_function(name, args, kwargs)
+
+
+class ThreadPoolBackend(BaseBackend):
+    """
+    Run the job in a thread pool inside current process.
+    Nothing is persisted, jobs in the pool are lost if the process exits.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.JOB_THREAD_POOL_SIZE,
+        )
+
+    def enqueue(self, name, args, kwargs):
+        # Wait for the commit, otherwise the thread may not see the rows
+        # created by current request, e.g. the new tweet
+        transaction.on_commit(
+            lambda: self.executor.submit(self._run, name, args, kwargs)
+        )
+
+    def _run(self, name, args, kwargs):
+        try:
+            JobService.run_job_function(name, args, kwargs)
+        except Exception:
+            logger.exception('Job %s failed', name)
+        finally:
+            # Each thread opens its own DB connections, close them after the job
+            connections.close_all()
+
+
+class DatabaseBackend(BaseBackend):
+    """
+    Store the job in jobs_job table, consumed by `python manage.py run_jobs`.
+    The job is inserted in the same transaction as the caller, so it is
+    only visible to workers after the caller commits.
+    """
+
+    def enqueue(self, name, args, kwargs):
+        Job.objects.create(name=name, args=args, kwargs=kwargs)
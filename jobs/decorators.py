@@ -0,0 +1,34 @@
+from functools import update_wrapper
+from jobs.services import JobService
+
+
+class JobFunction(object):
+    """
+    Wrapper returned by @job
+    - job_function(*args) runs the function right now in current thread
+    - job_function.delay(*args) hands the call over to settings.JOB_BACKEND
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = '{}.{}'.format(func.__module__, func.__name__)
+        update_wrapper(self, func)
+        JobService.register(self.name, func)
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        # Arguments are stored as json by DatabaseBackend, so pass ids instead of objects
+        JobService.enqueue(self.name, args, kwargs)
+
+
+def job(func):
+    """
+    Usage:
+        @job
+        def fanout_newsfeeds_task(tweet_id):
+            ...
+        fanout_newsfeeds_task.delay(tweet.id)
+    """
+    return JobFunction(func)
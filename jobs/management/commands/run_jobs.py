@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from jobs.services import JobService
+
+
+class Command(BaseCommand):
+    help = 'Consume jobs queued by jobs.backends.DatabaseBackend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when there is no pending job',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run pending jobs once and exit',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start consuming jobs')
+        try:
+            while True:
+                # Long running process, drop connections that are broken or too old
+                close_old_connections()
+                processed = JobService.run_pending_jobs(options['batch_size'])
+                if options['once']:
+                    break
+                if processed == 0:
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Stop consuming jobs')
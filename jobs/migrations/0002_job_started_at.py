@@ -0,0 +1,22 @@
+# Generated by Django 3.1.3 on 2026-10-18 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='started_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together={('status', 'created_at'), ('status', 'started_at')},
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import models
+
+
+class Job(models.Model):
+    """
+    One queued call of a registered job function, used by DatabaseBackend
+    and consumed by `python manage.py run_jobs`
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    # Registered name of the job function, e.g. newsfeeds.tasks.fanout_newsfeeds_task
+    name = models.CharField(max_length=255)
+    # Only store json serializable arguments like ids, never model instances
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+    )
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    # Set when a worker claims the job, a running job older than
+    # JOB_LEASE_SECONDS is considered lost (worker crashed or killed)
+    started_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Worker pick up pending jobs in created order and re-queue running
+        # jobs by started_at
+        index_together = (
+            ('status', 'created_at'),
+            ('status', 'started_at'),
+        )
+        ordering = ('created_at',)
+
+    def __str__(self):
+        return '{} {}({}, {}) {}'.format(
+            self.created_at,
+            self.name,
+            self.args,
+            self.kwargs,
+            self.status,
+        )
@@ -0,0 +1,151 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class JobService(object):
+    # name -> function, filled by @job in jobs.decorators
+    registry = {}
+    # backend path -> backend instance, so the thread pool is created once per process
+    _backends = {}
+
+    @classmethod
+    def register(cls, name, func):
+        cls.registry[name] = func
+
+    @classmethod
+    def get_backend(cls):
+        path = settings.JOB_BACKEND
+        if path not in cls._backends:
+            cls._backends[path] = import_string(path)()
+        return cls._backends[path]
+
+    @classmethod
+    def enqueue(cls, name, args=None, kwargs=None):
+        if name not in cls.registry:
+            raise KeyError('Job {} is not registered'.format(name))
+        cls.get_backend().enqueue(name, list(args or []), dict(kwargs or {}))
+
+    @classmethod
+    def run_job_function(cls, name, args, kwargs):
+        return cls.registry[name](*args, **kwargs)
+
+    @classmethod
+    def claim_pending_jobs(cls, batch_size):
+        """
+        Mark a batch of pending jobs as running and return them.
+        skip_locked let several workers consume the same table without picking
+        the same job twice
+        """
+        with transaction.atomic():
+            jobs = list(
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status=Job.STATUS_PENDING)
+                .order_by('created_at')[:batch_size]
+            )
+            if not jobs:
+                return []
+            started_at = timezone.now()
+            Job.objects.filter(id__in=[job.id for job in jobs]).update(
+                status=Job.STATUS_RUNNING,
+                attempts=F('attempts') + 1,
+                started_at=started_at,
+            )
+        for job in jobs:
+            job.started_at = started_at
+        return jobs
+
+    @classmethod
+    def _get_owned_job(cls, job):
+        # The row of job while it is still claimed by this worker, not
+        # re-queued by requeue_expired_jobs() and claimed by another one
+        return Job.objects.filter(
+            id=job.id,
+            status=Job.STATUS_RUNNING,
+            started_at=job.started_at,
+        )
+
+    @classmethod
+    def start_job(cls, job):
+        """
+        Renew the lease of a claimed job right before running it, the lease of
+        a batch starts with the job instead of the claim. Return False if the
+        job waited in the batch longer than the lease and was re-queued
+        """
+        started_at = timezone.now()
+        if not cls._get_owned_job(job).update(started_at=started_at):
+            return False
+        job.started_at = started_at
+        return True
+
+    @classmethod
+    def requeue_expired_jobs(cls):
+        """
+        Running jobs claimed more than JOB_LEASE_SECONDS ago belong to a worker
+        that crashed or was killed, put them back to pending, or mark them failed
+        when they reached JOB_MAX_ATTEMPTS. Return number of jobs re-queued.
+        The lease starts when each job starts (see start_job()), a single job
+        must finish within it, otherwise it may run twice
+        """
+        expired_before = timezone.now() - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        expired = Job.objects.filter(
+            status=Job.STATUS_RUNNING,
+            started_at__lt=expired_before,
+        )
+        last_error = 'Lease expired, worker did not finish the job'
+        expired.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+            status=Job.STATUS_FAILED,
+            last_error=last_error,
+        )
+        count = expired.filter(attempts__lt=settings.JOB_MAX_ATTEMPTS).update(
+            status=Job.STATUS_PENDING,
+            last_error=last_error,
+        )
+        if count:
+            logger.warning('Re-queued %s jobs with expired lease', count)
+        return count
+
+    @classmethod
+    def run_job(cls, job):
+        if not cls.start_job(job):
+            logger.warning('Job %s (id=%s) lost its lease before running', job.name, job.id)
+            return False
+        try:
+            cls.run_job_function(job.name, job.args, job.kwargs)
+        except Exception:
+            # job.attempts is loaded before claim_pending_jobs() increased it
+            attempts = job.attempts + 1
+            if attempts >= settings.JOB_MAX_ATTEMPTS:
+                status = Job.STATUS_FAILED
+            else:
+                status = Job.STATUS_PENDING
+            logger.exception('Job %s (id=%s) failed', job.name, job.id)
+            # Only if still owned, a re-queued job belongs to another worker
+            cls._get_owned_job(job).update(
+                status=status,
+                last_error=traceback.format_exc(),
+            )
+            return False
+        # Finished jobs are not kept, so the queue table stays small
+        cls._get_owned_job(job).delete()
+        return True
+
+    @classmethod
+    def run_pending_jobs(cls, batch_size=100):
+        """
+        Run one batch of pending jobs, return number of jobs processed
+        """
+        cls.requeue_expired_jobs()
+        jobs = cls.claim_pending_jobs(batch_size)
+        for job in jobs:
+            cls.run_job(job)
+        return len(jobs)
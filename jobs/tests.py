@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import override_settings
+from django.utils import timezone
+from jobs.decorators import job
+from jobs.models import Job
+from jobs.services import JobService
+from testing.testcases import TestCase
+
+
+CALLS = []
+
+
+@job
+def record_call_task(value, extra=None):
+    CALLS.append((value, extra))
+
+
+@job
+def always_fail_task():
+    raise ValueError('failed on purpose')
+
+
+@job
+def reclaimed_task():
+    # Re-queued and claimed by another worker while running
+    Job.objects.update(started_at=timezone.now() + timedelta(seconds=1))
+
+
+class JobServiceTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        CALLS.clear()
+
+    def test_sync_backend(self):
+        # Testing settings use SyncBackend, job runs right away
+        record_call_task.delay(1, extra='a')
+        self.assertEqual(CALLS, [(1, 'a')])
+        self.assertEqual(Job.objects.count(), 0)
+
+    @override_settings(JOB_BACKEND='jobs.backends.DatabaseBackend')
+    def test_database_backend(self):
+        record_call_task.delay(1)
+        record_call_task.delay(2, extra='b')
+        # Not executed until a worker consumes the queue
+        self.assertEqual(CALLS, [])
+        self.assertEqual(Job.objects.filter(status=Job.STATUS_PENDING).count(), 2)
+
+        processed = JobService.run_pending_jobs()
+        self.assertEqual(processed, 2)
+        self.assertEqual(CALLS, [(1, None), (2, 'b')])
+        # Finished jobs are removed from the queue
+        self.assertEqual(Job.objects.count(), 0)
+        self.assertEqual(JobService.run_pending_jobs(), 0)
+
+    @override_settings(
+        JOB_BACKEND='jobs.backends.DatabaseBackend',
+        JOB_MAX_ATTEMPTS=2,
+    )
+    def test_retry_failed_job(self):
+        always_fail_task.delay()
+        JobService.run_pending_jobs()
+        job_instance = Job.objects.get()
+        self.assertEqual(job_instance.status, Job.STATUS_PENDING)
+        self.assertEqual(job_instance.attempts, 1)
+        self.assertIn('failed on purpose', job_instance.last_error)
+
+        # Reach JOB_MAX_ATTEMPTS, not picked up anymore
+        JobService.run_pending_jobs()
+        job_instance.refresh_from_db()
+        self.assertEqual(job_instance.status, Job.STATUS_FAILED)
+        self.assertEqual(job_instance.attempts, 2)
+        self.assertEqual(JobService.run_pending_jobs(), 0)
+
+    @override_settings(
+        JOB_BACKEND='jobs.backends.DatabaseBackend',
+        JOB_MAX_ATTEMPTS=2,
+    )
+    def test_requeue_expired_jobs(self):
+        record_call_task.delay(1)
+        # Claimed by a worker which dies before running it
+        JobService.claim_pending_jobs(batch_size=10)
+        job_instance = Job.objects.get()
+        self.assertEqual(job_instance.status, Job.STATUS_RUNNING)
+        self.assertIsNotNone(job_instance.started_at)
+
+        # Lease not expired yet
+        self.assertEqual(JobService.requeue_expired_jobs(), 0)
+        self.assertEqual(JobService.run_pending_jobs(), 0)
+
+        expired_at = timezone.now() - timedelta(seconds=settings.JOB_LEASE_SECONDS + 1)
+        Job.objects.update(started_at=expired_at)
+        self.assertEqual(JobService.run_pending_jobs(), 1)
+        self.assertEqual(CALLS, [(1, None)])
+        self.assertEqual(Job.objects.count(), 0)
+
+        # Lost again after reaching JOB_MAX_ATTEMPTS, not retried anymore
+        record_call_task.delay(2)
+        JobService.claim_pending_jobs(batch_size=10)
+        Job.objects.update(started_at=expired_at, attempts=2)
+        self.assertEqual(JobService.requeue_expired_jobs(), 0)
+        job_instance = Job.objects.get()
+        self.assertEqual(job_instance.status, Job.STATUS_FAILED)
+        self.assertIn('Lease expired', job_instance.last_error)
+
+    @override_settings(JOB_BACKEND='jobs.backends.DatabaseBackend')
+    def test_job_lost_lease_in_batch(self):
+        record_call_task.delay(1)
+        record_call_task.delay(2)
+        # Worker 1 claims both, the second one waits in its batch longer
+        # than the lease
+        jobs = JobService.claim_pending_jobs(batch_size=10)
+        expired_at = timezone.now() - timedelta(seconds=settings.JOB_LEASE_SECONDS + 1)
+        Job.objects.update(started_at=expired_at)
+        for job in jobs:
+            job.started_at = expired_at
+        self.assertTrue(JobService.run_job(jobs[0]))
+
+        # Worker 2 re-queues and runs the waiting job
+        self.assertEqual(JobService.run_pending_jobs(), 1)
+        self.assertEqual(CALLS, [(1, None), (2, None)])
+        self.assertEqual(Job.objects.count(), 0)
+
+        # Worker 1 does not run it again
+        self.assertFalse(JobService.run_job(jobs[1]))
+        self.assertEqual(CALLS, [(1, None), (2, None)])
+
+    @override_settings(JOB_BACKEND='jobs.backends.DatabaseBackend')
+    def test_finished_job_re_queued_meanwhile(self):
+        reclaimed_task.delay()
+        JobService.run_pending_jobs()
+        # The row claimed again by another worker is not deleted
+        job_instance = Job.objects.get()
+        self.assertEqual(job_instance.status, Job.STATUS_RUNNING)
+
+    def test_enqueue_unregistered_job(self):
+        with self.assertRaises(KeyError):
+            JobService.enqueue('jobs.tests.not_exist_task')
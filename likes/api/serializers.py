@@ -1,17 +1,36 @@
-from accounts.api.serializers import UserSerializerForLike
+from accounts.api.serializers import CachedUsersListSerializer, UserSerializerForLike
 from comments.models import Comment
 from django.contrib.contenttypes.models import ContentType
+from django.db import models
 from likes.models import Like
+from likes.services import LikeService
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from tweets.models import Tweet
 
 
+class HasLikedListSerializer(CachedUsersListSerializer):
+    """
+    Use as Meta.list_serializer_class of a serializer with has_liked field.
+    has_liked of the whole list is looked up in one query before rendering
+    instead of one query per object
+    """
+
+    def get_like_targets(self, objects):
+        return objects
+
+    def to_representation(self, data):
+        objects = list(data.all() if isinstance(data, models.Manager) else data)
+        LikeService.prefetch_has_liked(self.context, self.get_like_targets(objects))
+        return super(HasLikedListSerializer, self).to_representation(objects)
+
+
 class LikeSerializer(serializers.ModelSerializer):
-    user = UserSerializerForLike()
+    user = UserSerializerForLike(source='cached_user')
 
     class Meta:
         model = Like
+        list_serializer_class = CachedUsersListSerializer
         fields = ('user', 'created_at')
 
 
@@ -0,0 +1,39 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+
+
+def _update_likes_count(instance, amount):
+    # Liked object is a Tweet or a Comment, both have likes_count.
+    # get_for_id is cached, no query after the first time
+    model_class = ContentType.objects.get_for_id(instance.content_type_id).model_class()
+    # Use F() to update in DB directly, UPDATE ... SET likes_count = likes_count + 1
+    # Concurrent likes will not overwrite each other like obj.likes_count += 1; obj.save()
+    model_class.objects.filter(id=instance.object_id).update(
+        likes_count=F('likes_count') + amount,
+    )
+    # Import here, likes.models is imported by tweets.models and comments.models
+    from comments.models import Comment
+    from tweets.models import Tweet
+    from tweets.services import TweetService
+    # Cache changes run after the commit, see tweets/listeners.py
+    if model_class is Tweet:
+        tweet_id = instance.object_id
+        transaction.on_commit(lambda: TweetService.invalidate_tweet(tweet_id))
+    elif model_class is Comment:
+        # likes_count of comments is rendered in tweet detail
+        tweet_id = Comment.objects.filter(
+            id=instance.object_id,
+        ).values_list('tweet_id', flat=True).first()
+        if tweet_id is not None:
+            transaction.on_commit(lambda: TweetService.bump_tweet_version(tweet_id))
+
+
+def incr_likes_count(sender, instance, created, **kwargs):
+    if not created:
+        return
+    _update_likes_count(instance, 1)
+
+
+def decr_likes_count(sender, instance, **kwargs):
+    _update_likes_count(instance, -1)
@@ -1,7 +1,10 @@
+from accounts.services import UserService
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from likes.listeners import decr_likes_count, incr_likes_count
 
 
 class Like(models.Model):
@@ -32,6 +35,10 @@ class Like(models.Model):
             ('user', 'content_type', 'created_at'),
         )
 
+    @property
+    def cached_user(self):
+        return UserService.get_related_user_through_cache(self)
+
     def __str__(self):
         return '{} - {} liked {} {}'.format(
             self.created_at,
@@ -39,3 +46,7 @@ class Like(models.Model):
             self.content_type,
             self.object_id,
         )
+
+
+post_save.connect(incr_likes_count, sender=Like)
+post_delete.connect(decr_likes_count, sender=Like)
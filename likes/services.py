@@ -1,8 +1,12 @@
 from likes.models import Like
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import OuterRef
+from utils.queries import count_subquery
 
 
 class LikeService(object):
+    # Key in serializer context, {(content_type_id, object_id): has_liked}
+    HAS_LIKED_CONTEXT_KEY = 'has_liked'
 
     @classmethod
     def has_liked(cls, user, target):
@@ -13,3 +17,57 @@ class LikeService(object):
             object_id=target.id,
             user=user,
         ).exists()
+
+    @classmethod
+    def likes_count_subquery(cls, model_class):
+        # Number of likes of each row of model_class, used by annotate()
+        return count_subquery(
+            Like.objects.filter(
+                content_type=ContentType.objects.get_for_model(model_class),
+                object_id=OuterRef('id'),
+            ),
+            'object_id',
+        )
+
+    @classmethod
+    def get_liked_object_ids(cls, user, content_type, object_ids):
+        """
+        Return the set of ids in object_ids liked by user, one query for all.
+        Use index (user, content_type, object_id) of unique_together
+        """
+        if user.is_anonymous or not object_ids:
+            return set()
+        return set(Like.objects.filter(
+            user=user,
+            content_type=content_type,
+            object_id__in=object_ids,
+        ).values_list('object_id', flat=True))
+
+    @classmethod
+    def prefetch_has_liked(cls, context, targets):
+        """
+        Look up has_liked of a page of targets (tweets or comments) and save it
+        in serializer context, one query per model
+        """
+        user = context['request'].user
+        has_liked = context.setdefault(cls.HAS_LIKED_CONTEXT_KEY, {})
+        targets_by_model = {}
+        for target in targets:
+            targets_by_model.setdefault(target.__class__, []).append(target)
+        for model_class, model_targets in targets_by_model.items():
+            content_type = ContentType.objects.get_for_model(model_class)
+            object_ids = [target.id for target in model_targets]
+            liked_ids = cls.get_liked_object_ids(user, content_type, object_ids)
+            for object_id in object_ids:
+                has_liked[(content_type.id, object_id)] = object_id in liked_ids
+
+    @classmethod
+    def has_liked_in_context(cls, context, target):
+        user = context['request'].user
+        content_type = ContentType.objects.get_for_model(target.__class__)
+        has_liked = context.get(cls.HAS_LIKED_CONTEXT_KEY, {})
+        key = (content_type.id, target.id)
+        if key in has_liked:
+            return has_liked[key]
+        # Not prefetched, e.g. rendering a single object
+        return cls.has_liked(user, target)
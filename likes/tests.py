@@ -0,0 +1,61 @@
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.contenttypes.models import ContentType
+from likes.services import LikeService
+from rest_framework.test import APIRequestFactory
+from testing.testcases import TestCase
+from tweets.models import Tweet
+
+
+class LikeServiceTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.user1 = self.create_user('user1')
+        self.user2 = self.create_user('user2')
+        self.tweets = [self.create_tweet(self.user1) for i in range(3)]
+        self.comment = self.create_comment(self.user1, self.tweets[0])
+
+    def test_get_liked_object_ids(self):
+        content_type = ContentType.objects.get_for_model(Tweet)
+        tweet_ids = [tweet.id for tweet in self.tweets]
+        self.assertEqual(
+            LikeService.get_liked_object_ids(self.user2, content_type, tweet_ids),
+            set(),
+        )
+        self.create_like(self.user2, self.tweets[0])
+        self.create_like(self.user2, self.tweets[2])
+        self.create_like(self.user1, self.tweets[1])
+        # Comment with the same id is not counted as a tweet
+        self.create_like(self.user2, self.comment)
+        with self.assertNumQueries(1):
+            liked_ids = LikeService.get_liked_object_ids(
+                self.user2,
+                content_type,
+                tweet_ids,
+            )
+        self.assertEqual(liked_ids, {self.tweets[0].id, self.tweets[2].id})
+        self.assertEqual(
+            LikeService.get_liked_object_ids(AnonymousUser(), content_type, tweet_ids),
+            set(),
+        )
+
+    def test_prefetch_has_liked(self):
+        self.create_like(self.user2, self.tweets[1])
+        self.create_like(self.user2, self.comment)
+        request = APIRequestFactory().get('/')
+        request.user = self.user2
+        context = {'request': request}
+        # One query for tweets, one for comments
+        with self.assertNumQueries(2):
+            LikeService.prefetch_has_liked(context, self.tweets + [self.comment])
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [LikeService.has_liked_in_context(context, tweet) for tweet in self.tweets],
+                [False, True, False],
+            )
+            self.assertTrue(LikeService.has_liked_in_context(context, self.comment))
+
+        # Fallback to one query for objects not prefetched
+        tweet = self.create_tweet(self.user1)
+        with self.assertNumQueries(1):
+            self.assertFalse(LikeService.has_liked_in_context(context, tweet))
@@ -1,11 +1,4 @@
-from django.contrib import admin
-from newsfeeds.models import NewsFeed
-
-@admin.register(NewsFeed)
-class NewsFeedAdmin(admin.ModelAdmin):
-    date_hierarchy = 'created_at'
-    list_display = (
-        'user',
-        'tweet',
-        'created_at',
-    )
+# NewsFeed is not registered in admin. Its rows are spread over the shards in
+# NEWSFEED_DATABASES (see newsfeeds/routers.py), a ModelAdmin only lists one
+# database, and would read the default database which has no newsfeeds.
+# Read them with NewsFeedService.get_newsfeeds(user_id) in `manage.py shell`
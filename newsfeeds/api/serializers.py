@@ -1,6 +1,16 @@
 from rest_framework import serializers
 from newsfeeds.models import NewsFeed
-from tweets.api.serializers import TweetSerializer
+from tweets.api.serializers import TweetListSerializer, TweetSerializer
+
+
+class NewsFeedListSerializer(TweetListSerializer):
+
+    def get_tweets(self, newsfeeds):
+        return [newsfeed.tweet for newsfeed in newsfeeds if newsfeed.tweet is not None]
+
+    def get_like_targets(self, newsfeeds):
+        # has_liked is rendered on the tweet of each newsfeed
+        return self.get_tweets(newsfeeds)
 
 
 class NewsFeedSerializer(serializers.ModelSerializer):
@@ -8,4 +18,8 @@ class NewsFeedSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = NewsFeed
-        fields = ('id', 'created_at', 'tweet')
\ No newline at end of file
+        list_serializer_class = NewsFeedListSerializer
+        # Owner of newsfeeds is not rendered, users of tweets are loaded
+        # by NewsFeedService.load_tweets
+        cached_user_fields = ()
+        fields = ('id', 'created_at', 'tweet')
@@ -1,17 +1,28 @@
-from newsfeeds.models import NewsFeed
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from friendships.models import Friendship
+from newsfeeds.routers import get_newsfeed_database
+from newsfeeds.services import NewsFeedService
 from rest_framework.test import APIClient
 from testing.testcases import TestCase
+from utils.paginations import EndlessPagination
 
 
 NEWSFEEDS_URL = '/api/newsfeeds/'
 POST_TWEETS_URL = '/api/tweets/'
 FOLLOW_URL = '/api/friendships/{}/follow/'
+UNFOLLOW_URL = '/api/friendships/{}/unfollow/'
+LIKE_URL = '/api/likes/'
 
 
 class NewsFeedApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.user1 = self.create_user('user1')
         self.user1_client = APIClient()
         self.user1_client.force_authenticate(self.user1)
@@ -30,11 +41,11 @@ class NewsFeedApiTests(TestCase):
         # Check empty for user1
         response = self.user1_client.get(NEWSFEEDS_URL)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data['newsfeeds']), 0)
+        self.assertEqual(len(response.data['results']), 0)
         # Check user can see their own post
         self.user1_client.post(POST_TWEETS_URL, {'content': 'Hello World'})
         response = self.user1_client.get(NEWSFEEDS_URL)
-        self.assertEqual(len(response.data['newsfeeds']), 1)
+        self.assertEqual(len(response.data['results']), 1)
         # Check user1 can see others post after followed
         self.user1_client.post(FOLLOW_URL.format(self.user2.id))
         response = self.user2_client.post(POST_TWEETS_URL, {
@@ -42,5 +53,255 @@ class NewsFeedApiTests(TestCase):
         })
         posted_tweet_id = response.data['id']
         response = self.user1_client.get(NEWSFEEDS_URL)
-        self.assertEqual(len(response.data['newsfeeds']), 2)
-        self.assertEqual(response.data['newsfeeds'][0]['tweet']['id'], posted_tweet_id)
\ No newline at end of file
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['tweet']['id'], posted_tweet_id)
+
+    def test_list_not_modified(self):
+        self.user1_client.post(FOLLOW_URL.format(self.user2.id))
+        self.user2_client.post(POST_TWEETS_URL, {'content': 'Hello World'})
+        response = self.user1_client.get(NEWSFEEDS_URL)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        # Only the ETag covers the tweets in the page
+        self.assertNotIn('Last-Modified', response)
+
+        # Not modified, no serialization and no query for newsfeeds or tweets
+        with self.assertNumQueries(0):
+            response = self.user1_client.get(NEWSFEEDS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # Another page has another ETag
+        response = self.user1_client.get(
+            NEWSFEEDS_URL,
+            {'created_at__lt': '2000-01-01T00:00:00Z'},
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+        # Other users cannot use the ETag
+        response = self.user2_client.get(NEWSFEEDS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # Like of a tweet in the page changes the ETag
+        tweet_id = response.data['results'][0]['tweet']['id']
+        self.user2_client.post(LIKE_URL, {'content_type': 'tweet', 'object_id': tweet_id})
+        response = self.user1_client.get(NEWSFEEDS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['tweet']['likes_count'], 1)
+        etag = response['ETag']
+
+        # New newsfeed changes the ETag
+        self.user2_client.post(POST_TWEETS_URL, {'content': 'Hello Twitter'})
+        response = self.user1_client.get(NEWSFEEDS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        etag = response['ETag']
+
+        # Purged newsfeeds change the ETag
+        self.user1_client.post(UNFOLLOW_URL.format(self.user2.id))
+        response = self.user1_client.get(NEWSFEEDS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 0)
+
+    @override_settings(NEWSFEED_PULL_MODE_FOLLOWERS_THRESHOLD=1)
+    def test_list_with_pull_mode(self):
+        # user2 has 1 follower and is in pull mode
+        self.user1_client.post(FOLLOW_URL.format(self.user2.id))
+        self.user1_client.post(POST_TWEETS_URL, {'content': 'Hello World'})
+        response = self.user2_client.post(POST_TWEETS_URL, {
+            'content': 'Hello Twitter',
+        })
+        posted_tweet_id = response.data['id']
+        self.assertEqual(NewsFeedService.get_newsfeeds(self.user1.id).count(), 1)
+
+        response = self.user1_client.get(NEWSFEEDS_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['tweet']['id'], posted_tweet_id)
+
+    @override_settings(NEWSFEED_PULL_MODE_FOLLOWERS_THRESHOLD=2)
+    def test_list_after_leaving_pull_mode(self):
+        user3 = self.create_user('user3')
+        user3_client = APIClient()
+        user3_client.force_authenticate(user3)
+        # user2 has 2 followers and is in pull mode, the tweet is not pushed
+        self.user1_client.post(FOLLOW_URL.format(self.user2.id))
+        user3_client.post(FOLLOW_URL.format(self.user2.id))
+        response = self.user2_client.post(POST_TWEETS_URL, {'content': 'Hello Twitter'})
+        posted_tweet_id = response.data['id']
+        self.assertEqual(NewsFeedService.get_newsfeeds(self.user1.id).count(), 0)
+
+        # user2 drops below the threshold, the tweet is pushed to the rest
+        # of the followers instead of disappearing from their newsfeeds
+        user3_client.post(UNFOLLOW_URL.format(self.user2.id))
+        self.assertEqual(NewsFeedService.get_newsfeeds(self.user1.id).count(), 1)
+        response = self.user1_client.get(NEWSFEEDS_URL)
+        self.assertEqual(
+            [newsfeed['tweet']['id'] for newsfeed in response.data['results']],
+            [posted_tweet_id],
+        )
+        self.assertEqual(NewsFeedService.get_newsfeeds(user3.id).count(), 0)
+
+    def test_pagination(self):
+        page_size = EndlessPagination.page_size
+        followed_user = self.create_user('followed')
+        Friendship.objects.create(from_user=self.user1, to_user=followed_user)
+        newsfeeds = []
+        for i in range(page_size * 2):
+            tweet = self.create_tweet(followed_user)
+            newsfeeds.append(self.create_newsfeed(self.user1, tweet))
+        newsfeeds = newsfeeds[::-1]
+
+        # First page
+        response = self.user1_client.get(NEWSFEEDS_URL)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(len(response.data['results']), page_size)
+        self.assertEqual(response.data['results'][0]['id'], newsfeeds[0].id)
+        self.assertEqual(
+            response.data['results'][page_size - 1]['id'],
+            newsfeeds[page_size - 1].id,
+        )
+
+        # Next page
+        response = self.user1_client.get(NEWSFEEDS_URL, {
+            'created_at__lt': newsfeeds[page_size - 1].created_at,
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        results = response.data['results']
+        self.assertEqual(len(results), page_size)
+        self.assertEqual(results[0]['id'], newsfeeds[page_size].id)
+        self.assertEqual(results[page_size - 1]['id'], newsfeeds[-1].id)
+
+        # Pull newer: nothing new
+        response = self.user1_client.get(NEWSFEEDS_URL, {
+            'created_at__gt': newsfeeds[0].created_at,
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(len(response.data['results']), 0)
+
+        # Pull newer: one new tweet
+        tweet = self.create_tweet(followed_user)
+        NewsFeedService.fanout_to_followers(tweet)
+        response = self.user1_client.get(NEWSFEEDS_URL, {
+            'created_at__gt': newsfeeds[0].created_at,
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['tweet']['id'], tweet.id)
+
+        # Error: invalid cursor
+        response = self.user1_client.get(NEWSFEEDS_URL, {'created_at__lt': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(REDIS_LIST_LENGTH_LIMIT=25)
+    def test_pagination_beyond_cached_newsfeeds(self):
+        page_size = EndlessPagination.page_size
+        newsfeeds = []
+        for i in range(page_size * 2):
+            tweet = self.create_tweet(self.user2)
+            newsfeeds.append(self.create_newsfeed(self.user1, tweet))
+        newsfeeds = newsfeeds[::-1]
+
+        # Served by the cached list, only the latest 25 are cached
+        response = self.user1_client.get(NEWSFEEDS_URL)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [newsfeed.id for newsfeed in newsfeeds[:page_size]],
+        )
+
+        # Older than the cached list, read from DB
+        response = self.user1_client.get(NEWSFEEDS_URL, {
+            'created_at__lt': newsfeeds[page_size - 1].created_at,
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [newsfeed.id for newsfeed in newsfeeds[page_size:]],
+        )
+
+    @override_settings(NEWSFEED_PULL_MODE_FOLLOWERS_THRESHOLD=1)
+    def test_pagination_with_pull_mode(self):
+        page_size = EndlessPagination.page_size
+        # user2 is in pull mode, user3 is in push mode
+        user3 = self.create_user('user3')
+        Friendship.objects.create(from_user=self.user1, to_user=self.user2)
+        Friendship.objects.create(from_user=self.user1, to_user=user3)
+        Friendship.objects.create(from_user=self.user2, to_user=user3)
+        tweet_ids = []
+        for i in range(page_size):
+            for user in [self.user2, user3]:
+                tweet = self.create_tweet(user)
+                NewsFeedService.fanout_to_followers(tweet)
+                tweet_ids.append(tweet.id)
+        tweet_ids = tweet_ids[::-1]
+
+        response = self.user1_client.get(NEWSFEEDS_URL)
+        self.assertEqual(response.data['has_next_page'], True)
+        results = response.data['results']
+        self.assertEqual(
+            [item['tweet']['id'] for item in results],
+            tweet_ids[:page_size],
+        )
+        response = self.user1_client.get(NEWSFEEDS_URL, {
+            'created_at__lt': results[-1]['created_at'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [item['tweet']['id'] for item in response.data['results']],
+            tweet_ids[page_size:],
+        )
+
+    def test_list_query_count(self):
+        Friendship.objects.create(from_user=self.user1, to_user=self.user2)
+
+        def post_tweets(count):
+            for i in range(count):
+                tweet = self.create_tweet(self.user2)
+                NewsFeedService.fanout_to_followers(tweet)
+                self.create_comment(self.user1, tweet)
+                self.create_like(self.user1, tweet)
+                self.create_like(self.user2, tweet)
+
+        def count_list_queries(cold_cache=True):
+            if cold_cache:
+                self.clear_cache()
+            with ExitStack() as stack:
+                captured = {
+                    database: stack.enter_context(
+                        CaptureQueriesContext(connections[database]),
+                    )
+                    for database in connections
+                }
+                response = self.user1_client.get(NEWSFEEDS_URL)
+            self.assertEqual(response.status_code, 200)
+            # Newsfeeds are read from user1's shard only
+            user1_database = get_newsfeed_database(self.user1.id)
+            for database in settings.NEWSFEED_DATABASES:
+                if database != user1_database:
+                    self.assertEqual(len(captured[database]), 0)
+            queries_count = sum(len(context) for context in captured.values())
+            return len(response.data['results']), queries_count
+
+        post_tweets(2)
+        # Newsfeeds, tweets and users not in cache are read by one query each
+        results_count, queries_count = count_list_queries()
+        self.assertEqual(results_count, 2)
+
+        post_tweets(6)
+        results_count, more_queries_count = count_list_queries()
+        self.assertEqual(results_count, 8)
+        self.assertEqual(more_queries_count, queries_count)
+
+        # Warm up, newsfeeds, tweets and users are all in cache
+        self.user1_client.get(NEWSFEEDS_URL)
+        results_count, cached_queries_count = count_list_queries(cold_cache=False)
+        self.assertEqual(results_count, 8)
+        # Only has_liked is read from DB
+        self.assertEqual(cached_queries_count, 1)
+
+        response = self.user1_client.get(NEWSFEEDS_URL)
+        tweet_data = response.data['results'][0]['tweet']
+        self.assertEqual(tweet_data['user']['id'], self.user2.id)
+        self.assertEqual(tweet_data['likes_count'], 2)
+        self.assertEqual(tweet_data['comments_count'], 1)
+        self.assertEqual(tweet_data['has_liked'], True)
@@ -2,23 +2,105 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from newsfeeds.models import NewsFeed
 from newsfeeds.api.serializers import NewsFeedSerializer
+from newsfeeds.services import NewsFeedService
+from tweets.services import TweetService
+from utils.decorators import conditional_response
+from utils.paginations import EndlessPagination
+from utils.read_replicas import ReadReplicaViewSetMixin
 
 
-class NewsFeedViewSet(viewsets.GenericViewSet):
+def get_pull_mode_following_ids(request):
+    # Used by the validator and the view, computed once per request
+    if not hasattr(request, 'pull_mode_following_ids'):
+        request.pull_mode_following_ids = NewsFeedService.get_pull_mode_following_ids(
+            request.user.id,
+        )
+    return request.pull_mode_following_ids
+
+
+def get_cached_newsfeeds_page(view, request):
+    """
+    Page of newsfeeds read from the cached list, None if the page is older
+    than the cached newsfeeds. Used by the validator and the view, computed
+    once per request
+    """
+    if not hasattr(request, 'cached_newsfeeds_page'):
+        cached_newsfeeds = NewsFeedService.get_cached_newsfeeds(request.user.id)
+        request.cached_newsfeeds_page = view.paginator.paginate_cached_list(
+            cached_newsfeeds,
+            request,
+        )
+    return request.cached_newsfeeds_page
+
+
+def newsfeeds_etag(view, request):
+    """
+    Version of the newsfeeds of the user and of the tweets in the page, so
+    a new newsfeed, a purged one, or a liked / commented / deleted tweet in
+    the page changes the ETag. Only pages served by cache are supported.
+    Tweets pulled from users in pull mode are not in the newsfeeds, not
+    supported for them
+    """
+    if get_pull_mode_following_ids(request):
+        return None
+    # Read the version before the page, a change in between gives an older
+    # version which does not match the next request
+    version = NewsFeedService.get_newsfeed_version(request.user.id)
+    page = get_cached_newsfeeds_page(view, request)
+    if page is None:
+        return None
+    tweet_versions = TweetService.get_tweet_versions(
+        [newsfeed.tweet_id for newsfeed in page],
+    )
+    return '{}:{}:{}'.format(
+        request.user.id,
+        version,
+        ','.join(
+            '{}-{}'.format(newsfeed.tweet_id, tweet_versions[newsfeed.tweet_id])
+            for newsfeed in page
+        ),
+    )
+
+
+class NewsFeedViewSet(ReadReplicaViewSetMixin, viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = EndlessPagination
 
     def get_queryset(self):
         # Define queryset, user can only see their own newsfeeds
-        return NewsFeed.objects.filter(user=self.request.user)
+        return NewsFeedService.get_newsfeeds(self.request.user.id)
 
+    @conditional_response(etag_func=newsfeeds_etag)
     def list(self, request):
+        page = get_cached_newsfeeds_page(self, request)
+        # The page is older than the cached newsfeeds, read from DB
+        if page is None:
+            page = self.paginate_queryset(self.get_queryset())
+        # Tweets from users in pull mode are not pushed, merge them at reading time
+        author_ids = get_pull_mode_following_ids(request)
+        if author_ids:
+            page = self.merge_pulled_newsfeeds(page, author_ids)
+        page = NewsFeedService.load_tweets(page)
         serializer = NewsFeedSerializer(
-            self.get_queryset(),
+            page,
             context={'request': request},
             many=True
         )
-        return Response({
-            'newsfeeds': serializer.data,
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        return self.get_paginated_response(serializer.data)
+
+    def merge_pulled_newsfeeds(self, page, author_ids):
+        # page has the first page_size pushed newsfeeds after the cursor, read at most
+        # page_size + 1 tweets from each author with the same cursor, the first
+        # page_size of the merged list is the page we want
+        pushed_has_next_page = self.paginator.has_next_page
+        pulled_newsfeeds = NewsFeedService.get_pulled_newsfeeds(
+            self.request.user,
+            author_ids,
+            limit=self.paginator.page_size + 1,
+            **self.paginator.get_cursor(self.request)
+        )
+        newsfeeds = NewsFeedService.merge_newsfeeds(page, pulled_newsfeeds)
+        page = self.paginator.paginate_ordered_list(newsfeeds, self.request)
+        self.paginator.has_next_page = self.paginator.has_next_page or pushed_has_next_page
+        return page
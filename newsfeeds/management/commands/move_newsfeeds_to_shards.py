@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.core.management.base import BaseCommand
+from newsfeeds.models import NewsFeed
+from newsfeeds.routers import get_newsfeed_database
+from newsfeeds.services import NewsFeedService
+
+
+class Command(BaseCommand):
+    help = (
+        'Move NewsFeed rows written before sharding from the default database '
+        'to their shard in NEWSFEED_DATABASES, keeping created_at'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--source',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to move newsfeeds from',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Copy without deleting the rows from the source database',
+        )
+
+    def handle(self, *args, **options):
+        source = options['source']
+        batch_size = options['batch_size']
+        moved, last_id = 0, 0
+        while True:
+            # Scan by primary key, each batch reads at most batch_size rows
+            newsfeeds = list(
+                NewsFeed.objects.using(source)
+                .filter(id__gt=last_id)
+                .order_by('id')[:batch_size]
+            )
+            if not newsfeeds:
+                break
+            last_id = newsfeeds[-1].id
+
+            newsfeeds_by_database = defaultdict(list)
+            for newsfeed in newsfeeds:
+                database = get_newsfeed_database(newsfeed.user_id)
+                # Already on its shard, e.g. --source is a shard
+                if database == source:
+                    continue
+                newsfeeds_by_database[database].append(newsfeed)
+
+            for database, shard_newsfeeds in newsfeeds_by_database.items():
+                # The job is safe to run again, unique (user, tweet) skips
+                # the rows already copied
+                with transaction.atomic(using=database):
+                    NewsFeedService.bulk_create_newsfeeds(database, [
+                        NewsFeed(
+                            user_id=newsfeed.user_id,
+                            tweet_id=newsfeed.tweet_id,
+                            created_at=newsfeed.created_at,
+                        )
+                        for newsfeed in shard_newsfeeds
+                    ])
+                if not options['keep']:
+                    NewsFeed.objects.using(source).filter(
+                        id__in=[newsfeed.id for newsfeed in shard_newsfeeds],
+                    ).delete()
+                moved += len(shard_newsfeeds)
+
+            # Cached lists were built from the shards without these rows
+            user_ids = {
+                newsfeed.user_id
+                for shard_newsfeeds in newsfeeds_by_database.values()
+                for newsfeed in shard_newsfeeds
+            }
+            for user_id in user_ids:
+                NewsFeedService.invalidate_cached_newsfeeds(user_id)
+        self.stdout.write('Moved {} newsfeeds from {}'.format(moved, source))
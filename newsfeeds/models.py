@@ -4,9 +4,22 @@ from tweets.models import Tweet
 
 
 class NewsFeed(models.Model):
+    # NewsFeed is stored on shards (see newsfeeds/routers.py), users and tweets
+    # are in another database, so there is no foreign key constraint and
+    # deleting a user or tweet does not touch newsfeeds
     # User that can see this tweet
-    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
-    tweet = models.ForeignKey(Tweet, on_delete=models.SET_NULL, null=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        db_constraint=False,
+    )
+    tweet = models.ForeignKey(
+        Tweet,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        db_constraint=False,
+    )
     # Use for ordering, DB not support sorting with created_at in tweet, it would be slow
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from newsfeeds.models import NewsFeed
+
+NEWSFEEDS_APP_LABEL = 'newsfeeds'
+
+
+def get_newsfeed_database(user_id):
+    # All newsfeeds of a user are on the same shard, reading a user's
+    # newsfeeds only hits one database
+    shards = settings.NEWSFEED_DATABASES
+    return shards[user_id % len(shards)]
+
+
+class NewsFeedRouter(object):
+    """
+    Place NewsFeed rows on the databases in settings.NEWSFEED_DATABASES by
+    user_id, all other models stay in the default database.
+
+    Router only knows the shard when a NewsFeed instance is given, e.g. save()
+    and delete() of an instance. Queries must pick the shard explicitly:
+        NewsFeed.objects.using(get_newsfeed_database(user_id))
+    """
+
+    def _get_database(self, model, **hints):
+        instance = hints.get('instance')
+        if model._meta.app_label != NEWSFEEDS_APP_LABEL:
+            # e.g. newsfeed.user, Django falls back to the database of the
+            # newsfeed without this
+            if isinstance(instance, NewsFeed):
+                return DEFAULT_DB_ALIAS
+            return None
+        if isinstance(instance, NewsFeed) and instance.user_id is not None:
+            return get_newsfeed_database(instance.user_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._get_database(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        return self._get_database(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # NewsFeed refers to users and tweets in the default database by id
+        app_labels = {obj1._meta.app_label, obj2._meta.app_label}
+        if NEWSFEEDS_APP_LABEL in app_labels:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == NEWSFEEDS_APP_LABEL:
+            return db in settings.NEWSFEED_DATABASES
+        # Shards only have newsfeeds tables
+        if db in settings.NEWSFEED_DATABASES:
+            return False
+        return None
@@ -1,11 +1,28 @@
-from newsfeeds.models import NewsFeed
+import heapq
+
+from django.conf import settings
 from friendships.services import FriendshipService
+from newsfeeds.models import NewsFeed
+from newsfeeds.routers import get_newsfeed_database
+from tweets.models import Tweet
+from tweets.services import TweetService
+from twitter.cache import (
+    NEWSFEED_VERSION_PATTERN,
+    PULL_MODE_USER_PATTERN,
+    USER_NEWSFEEDS_PATTERN,
+)
+from utils.cache_versions import bump_version, bump_versions, get_version
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
 
 
 class NewsFeedService(object):
 
     @classmethod
     def fanout_to_followers(cls, tweet):
+        # Import here to avoid circular import, tasks.py also uses NewsFeedService
+        from newsfeeds.tasks import fanout_newsfeeds_task
+
         # Wrong:
         # Cannot put DB access in for loop, to slow
         # for follower in FriendshipService.get_followers(tweet.user):
@@ -15,10 +32,212 @@ class NewsFeedService(object):
         #     )
 
         # Correct: user bulk_create, it will merge insert to one
-        newsfeeds = [
-            NewsFeed(user=follower, tweet=tweet)
-            for follower in FriendshipService.get_followers(tweet.user)
+        # But one bulk_create for all followers still blocks the request when
+        # the user has lots of followers, so it is moved to fanout_newsfeeds_task
+
+        # See user's own tweet right away, only one row
+        newsfeed = cls.get_newsfeeds(tweet.user_id).create(
+            user=tweet.user,
+            tweet=tweet,
+        )
+        cls.push_newsfeed_to_cache(newsfeed)
+        # Users with lots of followers are in pull mode, their followers read
+        # the tweets at loading time, see NewsFeedViewSet.list()
+        if cls.is_pull_mode_user(tweet.user_id):
+            cls.mark_pull_mode_user(tweet.user_id)
+            return
+        # Fanout to followers asynchronously, tweet creation returns in constant time
+        fanout_newsfeeds_task.delay(tweet.id)
+
+    @classmethod
+    def get_newsfeeds(cls, user_id):
+        # Newsfeeds of a user are all on one shard, see newsfeeds/routers.py
+        return NewsFeed.objects.using(get_newsfeed_database(user_id)).filter(
+            user_id=user_id,
+        )
+
+    @classmethod
+    def bulk_create_newsfeeds(cls, database, newsfeeds):
+        """
+        Write newsfeeds to database keeping their created_at, e.g. newsfeeds of
+        old tweets. created_at is auto_now_add, which overwrites it in
+        bulk_create, so it is set again by bulk_update on the rows read back.
+        ignore_conflicts: unique (user, tweet), rows already there are updated
+        """
+        created_at_by_key = {
+            (newsfeed.user_id, newsfeed.tweet_id): newsfeed.created_at
+            for newsfeed in newsfeeds
+        }
+        NewsFeed.objects.using(database).bulk_create(newsfeeds, ignore_conflicts=True)
+        saved_newsfeeds = NewsFeed.objects.using(database).filter(
+            user_id__in={user_id for user_id, _ in created_at_by_key},
+            tweet_id__in={tweet_id for _, tweet_id in created_at_by_key},
+        )
+        saved_newsfeeds = [
+            newsfeed for newsfeed in saved_newsfeeds
+            if (newsfeed.user_id, newsfeed.tweet_id) in created_at_by_key
+        ]
+        for newsfeed in saved_newsfeeds:
+            newsfeed.created_at = created_at_by_key[(newsfeed.user_id, newsfeed.tweet_id)]
+        NewsFeed.objects.using(database).bulk_update(saved_newsfeeds, ['created_at'])
+
+    @classmethod
+    def backfill_newsfeeds(cls, follower_id, followee_id):
+        from newsfeeds.tasks import backfill_newsfeeds_task
+        backfill_newsfeeds_task.delay(follower_id, followee_id)
+
+    @classmethod
+    def purge_newsfeeds(cls, follower_id, followee_id):
+        from newsfeeds.tasks import purge_newsfeeds_task
+        purge_newsfeeds_task.delay(follower_id, followee_id)
+
+    @classmethod
+    def is_pull_mode_user(cls, user_id):
+        threshold = settings.NEWSFEED_PULL_MODE_FOLLOWERS_THRESHOLD
+        if threshold is None:
+            return False
+        return FriendshipService.get_followers_count(user_id) >= threshold
+
+    @classmethod
+    def mark_pull_mode_user(cls, user_id):
+        # Tweets of the user are missing in some newsfeeds from now on
+        RedisClient.get_connection().set(PULL_MODE_USER_PATTERN.format(user_id=user_id), 1)
+
+    @classmethod
+    def leave_pull_mode(cls, user_id):
+        """
+        Called after the user loses followers. Followers pull tweets of a user
+        only while the user is in pull mode, tweets not pushed in pull mode
+        (new tweets and backfill after following) would disappear from their
+        newsfeeds, so push them once the user drops below the threshold
+        """
+        from newsfeeds.tasks import backfill_followers_newsfeeds_task
+        if cls.is_pull_mode_user(user_id):
+            return
+        # Only one caller gets the marker when several unfollows happen together
+        key = PULL_MODE_USER_PATTERN.format(user_id=user_id)
+        if not RedisClient.get_connection().delete(key):
+            return
+        backfill_followers_newsfeeds_task.delay(user_id)
+
+    @classmethod
+    def get_pull_mode_following_ids(cls, user_id):
+        threshold = settings.NEWSFEED_PULL_MODE_FOLLOWERS_THRESHOLD
+        if threshold is None:
+            return []
+        # Followings and their followers counts are both read from cache
+        following_ids = sorted(FriendshipService.get_following_user_id_set(user_id))
+        return FriendshipService.filter_user_ids_by_followers_count(
+            following_ids,
+            threshold,
+        )
+
+    @classmethod
+    def get_pulled_newsfeeds(
+        cls,
+        user,
+        author_ids,
+        limit,
+        created_at__gt=None,
+        created_at__lt=None,
+    ):
+        """
+        Build newsfeeds from the latest tweets of authors in pull mode, filtered by
+        the same created_at cursor as the pushed newsfeeds.
+        They are not saved, so id of these newsfeeds is None
+        """
+        tweet_lists = []
+        for author_id in author_ids:
+            # One query per author, each query is served by index (user, created_at)
+            tweets = Tweet.objects.filter(user_id=author_id)
+            if created_at__gt is not None:
+                tweets = tweets.filter(created_at__gt=created_at__gt)
+            if created_at__lt is not None:
+                tweets = tweets.filter(created_at__lt=created_at__lt)
+            tweet_lists.append(list(tweets.order_by('-created_at')[:limit]))
+        tweets = heapq.merge(
+            *tweet_lists,
+            key=lambda tweet: tweet.created_at,
+            reverse=True,
+        )
+        return [
+            NewsFeed(user=user, tweet=tweet, created_at=tweet.created_at)
+            for tweet in tweets
         ]
-        # See user's own tweet
-        newsfeeds.append(NewsFeed(user=tweet.user, tweet=tweet))
-        NewsFeed.objects.bulk_create(newsfeeds)
\ No newline at end of file
+
+    @classmethod
+    def merge_newsfeeds(cls, pushed_newsfeeds, pulled_newsfeeds):
+        # Both lists are ordered by created_at desc
+        merged = heapq.merge(
+            pushed_newsfeeds,
+            pulled_newsfeeds,
+            key=lambda newsfeed: newsfeed.created_at,
+            reverse=True,
+        )
+        # A tweet can be in both lists if the author reached the threshold
+        # after it was fanned out
+        newsfeeds, seen_tweet_ids = [], set()
+        for newsfeed in merged:
+            if newsfeed.tweet_id in seen_tweet_ids:
+                continue
+            seen_tweet_ids.add(newsfeed.tweet_id)
+            newsfeeds.append(newsfeed)
+        return newsfeeds
+
+    @classmethod
+    def get_cached_newsfeeds(cls, user_id):
+        # Latest REDIS_LIST_LENGTH_LIMIT newsfeeds of the user, loaded from
+        # NewsFeed table when not cached
+        queryset = cls.get_newsfeeds(user_id).order_by('-created_at')
+        key = USER_NEWSFEEDS_PATTERN.format(user_id=user_id)
+        return RedisHelper.load_objects(key, queryset)
+
+    @classmethod
+    def get_newsfeed_version(cls, user_id):
+        """
+        A number changed whenever newsfeeds of the user are added or removed,
+        used as validator of newsfeeds list
+        """
+        return get_version(NEWSFEED_VERSION_PATTERN.format(user_id=user_id))
+
+    @classmethod
+    def bump_newsfeed_version(cls, user_id):
+        bump_version(NEWSFEED_VERSION_PATTERN.format(user_id=user_id))
+
+    @classmethod
+    def invalidate_cached_newsfeeds(cls, user_id):
+        # Rebuilt from DB on next read, used after backfill, purge and moving
+        # newsfeeds between databases
+        RedisHelper.delete(USER_NEWSFEEDS_PATTERN.format(user_id=user_id))
+        cls.bump_newsfeed_version(user_id)
+
+    @classmethod
+    def push_newsfeed_to_cache(cls, newsfeed):
+        cls.push_newsfeeds_to_cache([newsfeed])
+
+    @classmethod
+    def push_newsfeeds_to_cache(cls, newsfeeds):
+        # Called for the newsfeeds created by fanout, a round trip to redis and
+        # one to cache for a whole batch
+        RedisHelper.push_objects([
+            (USER_NEWSFEEDS_PATTERN.format(user_id=newsfeed.user_id), newsfeed)
+            for newsfeed in newsfeeds
+        ])
+        bump_versions([
+            NEWSFEED_VERSION_PATTERN.format(user_id=newsfeed.user_id)
+            for newsfeed in newsfeeds
+        ])
+
+    @classmethod
+    def load_tweets(cls, newsfeeds):
+        """
+        Attach tweets to a page of newsfeeds with one query, instead of one
+        query per newsfeed when NewsFeedSerializer reads newsfeed.tweet
+        """
+        tweets = TweetService.get_tweets_for_serialization(
+            [newsfeed.tweet_id for newsfeed in newsfeeds],
+        )
+        for newsfeed in newsfeeds:
+            # None if the tweet is deleted
+            newsfeed.tweet = tweets.get(newsfeed.tweet_id)
+        return newsfeeds
@@ -0,0 +1,156 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from friendships.services import FriendshipService
+from jobs.decorators import job
+from newsfeeds.models import NewsFeed
+from newsfeeds.routers import get_newsfeed_database
+from newsfeeds.services import NewsFeedService
+from tweets.models import Tweet
+
+
+@job
+def fanout_newsfeeds_task(tweet_id):
+    # Only pass tweet_id to a job, tweet object cannot be stored in the queue
+    tweet = Tweet.objects.filter(id=tweet_id).first()
+    if tweet is None:
+        return
+
+    # Follower ids are cached as a compact array, repeated tweets of the same
+    # author do not scan Friendship table. Newsfeeds are written batch by
+    # batch, so no huge list of NewsFeed objects is built
+    batch_size = settings.NEWSFEED_FANOUT_BATCH_SIZE
+    follower_ids = iter(FriendshipService.get_follower_ids_through_cache(tweet.user_id))
+    while True:
+        batch_ids = list(islice(follower_ids, batch_size))
+        if not batch_ids:
+            break
+        # Newsfeeds are sharded by user_id, write each shard with its own bulk_create
+        follower_ids_by_database = defaultdict(list)
+        for follower_id in batch_ids:
+            database = get_newsfeed_database(follower_id)
+            follower_ids_by_database[database].append(follower_id)
+        for database, follower_ids_of_database in follower_ids_by_database.items():
+            write_newsfeeds_to_database(database, tweet.id, follower_ids_of_database)
+
+
+def write_newsfeeds_to_database(database, tweet_id, follower_ids):
+    # A retried job writes the batches already written again, only push the
+    # newsfeeds inserted by this call, otherwise they are twice in the cached
+    # lists. Use unique index (user, tweet)
+    existing_user_ids = set(NewsFeed.objects.using(database).filter(
+        tweet_id=tweet_id,
+        user_id__in=follower_ids,
+    ).values_list('user_id', flat=True))
+    follower_ids = [
+        follower_id for follower_id in follower_ids
+        if follower_id not in existing_user_ids
+    ]
+    if not follower_ids:
+        return
+    newsfeeds = [
+        NewsFeed(user_id=follower_id, tweet_id=tweet_id)
+        for follower_id in follower_ids
+    ]
+    # One transaction per shard in a batch, a failed batch does not roll back
+    # the batches already written.
+    # ignore_conflicts: skip the rows created by a concurrent run
+    with transaction.atomic(using=database):
+        NewsFeed.objects.using(database).bulk_create(newsfeeds, ignore_conflicts=True)
+    # bulk_create does not set ids on MySQL, read the rows back with one
+    # query on the unique index (user, tweet) before pushing them to cache
+    newsfeeds = NewsFeed.objects.using(database).filter(
+        tweet_id=tweet_id,
+        user_id__in=follower_ids,
+    )
+    NewsFeedService.push_newsfeeds_to_cache(list(newsfeeds))
+
+
+def get_backfill_tweets(followee_id):
+    # [(tweet_id, created_at)] of the latest tweets to add to newsfeeds
+    return list(
+        Tweet.objects.filter(user_id=followee_id)
+        .order_by('-created_at')
+        .values_list('id', 'created_at')[:settings.NEWSFEED_BACKFILL_TWEETS_LIMIT]
+    )
+
+
+@job
+def backfill_newsfeeds_task(follower_id, followee_id):
+    """
+    Add the latest tweets of followee to follower's newsfeeds after following
+    """
+    # Unfollowed before the job runs
+    if not FriendshipService.has_followed(follower_id, followee_id):
+        return
+    # Tweets of users in pull mode are merged at reading time
+    if NewsFeedService.is_pull_mode_user(followee_id):
+        NewsFeedService.mark_pull_mode_user(followee_id)
+        return
+    tweets = get_backfill_tweets(followee_id)
+    if not tweets:
+        return
+    # Backfilled newsfeeds are placed at the time of their tweets, not at the
+    # time of following. Idempotent, unique (user, tweet) skips existing rows
+    NewsFeedService.bulk_create_newsfeeds(
+        get_newsfeed_database(follower_id),
+        [
+            NewsFeed(user_id=follower_id, tweet_id=tweet_id, created_at=created_at)
+            for tweet_id, created_at in tweets
+        ],
+    )
+    NewsFeedService.invalidate_cached_newsfeeds(follower_id)
+
+
+@job
+def backfill_followers_newsfeeds_task(followee_id):
+    """
+    Add the latest tweets of followee to the newsfeeds of all followers, after
+    followee leaves pull mode, see NewsFeedService.leave_pull_mode()
+    """
+    tweets = get_backfill_tweets(followee_id)
+    if not tweets:
+        return
+    batch_size = settings.NEWSFEED_FANOUT_BATCH_SIZE
+    follower_ids = iter(FriendshipService.get_follower_ids_through_cache(followee_id))
+    while True:
+        batch_ids = list(islice(follower_ids, batch_size))
+        if not batch_ids:
+            break
+        # Each batch writes at most batch_size * NEWSFEED_BACKFILL_TWEETS_LIMIT rows
+        follower_ids_by_database = defaultdict(list)
+        for follower_id in batch_ids:
+            follower_ids_by_database[get_newsfeed_database(follower_id)].append(follower_id)
+        for database, follower_ids_of_database in follower_ids_by_database.items():
+            NewsFeedService.bulk_create_newsfeeds(database, [
+                NewsFeed(user_id=follower_id, tweet_id=tweet_id, created_at=created_at)
+                for follower_id in follower_ids_of_database
+                for tweet_id, created_at in tweets
+            ])
+        for follower_id in batch_ids:
+            NewsFeedService.invalidate_cached_newsfeeds(follower_id)
+
+
+@job
+def purge_newsfeeds_task(follower_id, followee_id):
+    """
+    Remove tweets of followee from follower's newsfeeds after unfollowing
+    """
+    # Followed again before the job runs
+    if FriendshipService.has_followed(follower_id, followee_id):
+        return
+    batch_size = settings.NEWSFEED_FANOUT_BATCH_SIZE
+    tweet_ids = Tweet.objects.filter(
+        user_id=followee_id,
+    ).values_list('id', flat=True).iterator(chunk_size=batch_size)
+    while True:
+        batch_ids = list(islice(tweet_ids, batch_size))
+        if not batch_ids:
+            break
+        # Use unique index (user, tweet), each batch deletes at most batch_size rows
+        NewsFeedService.get_newsfeeds(follower_id).filter(
+            tweet_id__in=batch_ids,
+        ).delete()
+    NewsFeedService.invalidate_cached_newsfeeds(follower_id)
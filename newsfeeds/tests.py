@@ -0,0 +1,317 @@
+from contextlib import ExitStack
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from friendships.models import Friendship
+from jobs.models import Job
+from jobs.services import JobService
+from newsfeeds.models import NewsFeed
+from newsfeeds.routers import get_newsfeed_database
+from newsfeeds.services import NewsFeedService
+from newsfeeds.tasks import (
+    backfill_newsfeeds_task,
+    fanout_newsfeeds_task,
+    purge_newsfeeds_task,
+)
+from testing.testcases import TestCase
+from twitter.cache import USER_NEWSFEEDS_PATTERN
+from utils.redis_client import RedisClient
+
+
+class NewsFeedServiceTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.user1 = self.create_user('user1')
+        self.user2 = self.create_user('user2')
+        for i in range(3):
+            follower = self.create_user('user1_follower{}'.format(i))
+            Friendship.objects.create(from_user=follower, to_user=self.user1)
+
+    def get_merged_newsfeeds(self, user):
+        author_ids = NewsFeedService.get_pull_mode_following_ids(user.id)
+        return NewsFeedService.merge_newsfeeds(
+            NewsFeedService.get_cached_newsfeeds(user.id),
+            NewsFeedService.get_pulled_newsfeeds(user, author_ids, limit=10),
+        )
+
+    def test_fanout_to_followers(self):
+        tweet = self.create_tweet(self.user1)
+        NewsFeedService.fanout_to_followers(tweet)
+        # 3 followers + user1 self
+        self.assertEqual(self.count_newsfeeds(tweet=tweet), 4)
+        self.assertEqual(NewsFeedService.get_newsfeeds(self.user2.id).count(), 0)
+
+    @override_settings(JOB_BACKEND='jobs.backends.DatabaseBackend')
+    def test_fanout_to_followers_in_queue(self):
+        tweet = self.create_tweet(self.user1)
+        NewsFeedService.fanout_to_followers(tweet)
+        # Only the author's newsfeed is created in the request
+        self.assertEqual(self.count_newsfeeds(tweet=tweet), 1)
+        self.assertEqual(
+            NewsFeedService.get_newsfeeds(self.user1.id).get(tweet=tweet).user,
+            self.user1,
+        )
+        self.assertEqual(Job.objects.count(), 1)
+
+        JobService.run_pending_jobs()
+        self.assertEqual(self.count_newsfeeds(tweet=tweet), 4)
+        # Retrying the job does not duplicate newsfeeds
+        fanout_newsfeeds_task.delay(tweet.id)
+        JobService.run_pending_jobs()
+        self.assertEqual(self.count_newsfeeds(tweet=tweet), 4)
+
+    def test_fanout_with_cached_follower_ids(self):
+        NewsFeedService.fanout_to_followers(self.create_tweet(self.user1))
+        tweet = self.create_tweet(self.user1)
+        with CaptureQueriesContext(connections['default']) as captured:
+            NewsFeedService.fanout_to_followers(tweet)
+        # Follower ids are read from cache
+        self.assertEqual(
+            [
+                query for query in captured.captured_queries
+                if 'friendships_friendship' in query['sql']
+            ],
+            [],
+        )
+        self.assertEqual(self.count_newsfeeds(tweet=tweet), 4)
+
+    @override_settings(
+        NEWSFEED_FANOUT_BATCH_SIZE=2,
+        NEWSFEED_DATABASES=['newsfeeds_0'],
+    )
+    def test_fanout_in_batches(self):
+        for i in range(2):
+            follower = self.create_user('more_follower{}'.format(i))
+            Friendship.objects.create(from_user=follower, to_user=self.user1)
+        tweet = self.create_tweet(self.user1)
+        with CaptureQueriesContext(connections['newsfeeds_0']) as captured:
+            fanout_newsfeeds_task(tweet.id)
+        # 5 followers with batch size 2 are written by 3 bulk inserts
+        inserts = [
+            query for query in captured.captured_queries
+            if query['sql'].startswith('INSERT')
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(self.count_newsfeeds(tweet=tweet), 5)
+
+    def test_fanout_to_shards(self):
+        followers = [self.create_user('follower{}'.format(i)) for i in range(4)]
+        for follower in followers:
+            Friendship.objects.create(from_user=follower, to_user=self.user2)
+        tweet = self.create_tweet(self.user2)
+        with ExitStack() as stack:
+            captured = {
+                database: stack.enter_context(
+                    CaptureQueriesContext(connections[database]),
+                )
+                for database in settings.NEWSFEED_DATABASES
+            }
+            fanout_newsfeeds_task(tweet.id)
+
+        # Followers are on both shards, one bulk insert per shard
+        for database, context in captured.items():
+            inserts = [
+                query for query in context.captured_queries
+                if query['sql'].startswith('INSERT')
+            ]
+            self.assertEqual(len(inserts), 1)
+        for follower in followers:
+            database = get_newsfeed_database(follower.id)
+            self.assertEqual(
+                NewsFeed.objects.using(database).filter(user=follower).count(),
+                1,
+            )
+        self.assertEqual(self.count_newsfeeds(tweet=tweet), 4)
+
+    def test_move_newsfeeds_to_shards(self):
+        tweets = [self.create_tweet(self.user2) for i in range(2)]
+        users = [self.create_user('reader{}'.format(i)) for i in range(2)]
+        # Rows written to one database before sharding, created_at is
+        # changed by update() since auto_now_add ignores it on create
+        source = settings.NEWSFEED_DATABASES[0]
+        for user in users:
+            for tweet in tweets:
+                NewsFeed.objects.using(source).create(user=user, tweet=tweet)
+                NewsFeed.objects.using(source).filter(user=user, tweet=tweet).update(
+                    created_at=tweet.created_at,
+                )
+
+        out = StringIO()
+        call_command('move_newsfeeds_to_shards', source=source, stdout=out)
+        # Rows already on their shard stay where they are
+        moved = sum(get_newsfeed_database(user.id) != source for user in users) * 2
+        self.assertIn('Moved {} newsfeeds'.format(moved), out.getvalue())
+        for user in users:
+            newsfeeds = NewsFeedService.get_newsfeeds(user.id).order_by('created_at')
+            self.assertEqual([f.tweet_id for f in newsfeeds], [t.id for t in tweets])
+            self.assertEqual(
+                [f.created_at for f in newsfeeds],
+                [t.created_at for t in tweets],
+            )
+        self.assertEqual(self.count_newsfeeds(tweet__in=tweets), 4)
+
+        # Safe to run again
+        call_command('move_newsfeeds_to_shards', source=source, stdout=StringIO())
+        self.assertEqual(self.count_newsfeeds(tweet__in=tweets), 4)
+
+    @override_settings(NEWSFEED_PULL_MODE_FOLLOWERS_THRESHOLD=3)
+    def test_pull_mode(self):
+        # user1 has 3 followers, tweets are not fanned out
+        follower = self.user1.follower_friendship_set.first().from_user
+        tweet1 = self.create_tweet(self.user1)
+        NewsFeedService.fanout_to_followers(tweet1)
+        self.assertEqual(self.count_newsfeeds(tweet=tweet1), 1)
+
+        # user2 has 1 follower, still in push mode
+        Friendship.objects.create(from_user=follower, to_user=self.user2)
+        tweet2 = self.create_tweet(self.user2)
+        NewsFeedService.fanout_to_followers(tweet2)
+        tweet3 = self.create_tweet(self.user1)
+        NewsFeedService.fanout_to_followers(tweet3)
+        self.assertEqual(NewsFeedService.get_newsfeeds(follower.id).count(), 1)
+
+        # Merged at reading time, ordered by created_at desc
+        newsfeeds = self.get_merged_newsfeeds(follower)
+        self.assertEqual(
+            [newsfeed.tweet_id for newsfeed in newsfeeds],
+            [tweet3.id, tweet2.id, tweet1.id],
+        )
+
+        # A tweet pushed before the author reached the threshold is not duplicated
+        newsfeed = self.create_newsfeed(follower, tweet1)
+        NewsFeedService.get_newsfeeds(follower.id).filter(id=newsfeed.id).update(
+            created_at=tweet1.created_at,
+        )
+        newsfeeds = self.get_merged_newsfeeds(follower)
+        self.assertEqual(
+            [newsfeed.tweet_id for newsfeed in newsfeeds],
+            [tweet3.id, tweet2.id, tweet1.id],
+        )
+
+    def test_get_cached_newsfeeds(self):
+        newsfeed_ids = []
+        for i in range(3):
+            tweet = self.create_tweet(self.user2)
+            newsfeed_ids.append(self.create_newsfeed(self.user1, tweet).id)
+        newsfeed_ids = newsfeed_ids[::-1]
+
+        # Cache miss, load from DB
+        conn = RedisClient.get_connection()
+        key = USER_NEWSFEEDS_PATTERN.format(user_id=self.user1.id)
+        self.assertEqual(conn.exists(key), 0)
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(self.user1.id)
+        self.assertEqual([f.id for f in newsfeeds], newsfeed_ids)
+        self.assertEqual(conn.exists(key), 1)
+
+        # Cache hit, newsfeeds created by ORM directly are not in cache
+        self.create_newsfeed(self.user1, self.create_tweet(self.user2))
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(self.user1.id)
+        self.assertEqual([f.id for f in newsfeeds], newsfeed_ids)
+
+        # Fanout pushes into the cached list
+        tweet = self.create_tweet(self.user1)
+        NewsFeedService.fanout_to_followers(tweet)
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(self.user1.id)
+        self.assertEqual(len(newsfeeds), 4)
+        self.assertEqual(newsfeeds[0].tweet_id, tweet.id)
+
+        # Followers without cached list are loaded lazily with the new tweet
+        follower = self.user1.follower_friendship_set.first().from_user
+        key = USER_NEWSFEEDS_PATTERN.format(user_id=follower.id)
+        self.assertEqual(conn.exists(key), 0)
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(follower.id)
+        self.assertEqual([f.tweet_id for f in newsfeeds], [tweet.id])
+
+    def test_retried_fanout_does_not_duplicate_cached_newsfeeds(self):
+        follower = self.user1.follower_friendship_set.first().from_user
+        NewsFeedService.get_cached_newsfeeds(follower.id)
+        tweet = self.create_tweet(self.user1)
+        fanout_newsfeeds_task(tweet.id)
+        # Retried job, newsfeeds already in DB are not pushed again
+        fanout_newsfeeds_task(tweet.id)
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(follower.id)
+        self.assertEqual([f.tweet_id for f in newsfeeds], [tweet.id])
+
+    def test_push_older_newsfeed_to_cache(self):
+        newsfeeds = [
+            self.create_newsfeed(self.user1, self.create_tweet(self.user2))
+            for i in range(2)
+        ]
+        NewsFeedService.get_cached_newsfeeds(self.user1.id)
+        # A delayed newsfeed, older than the head of the cached list
+        newsfeed = self.create_newsfeed(self.user1, self.create_tweet(self.user2))
+        database = get_newsfeed_database(self.user1.id)
+        NewsFeed.objects.using(database).filter(id=newsfeed.id).update(
+            created_at=newsfeeds[0].created_at,
+        )
+        newsfeed.refresh_from_db(using=database)
+
+        NewsFeedService.push_newsfeed_to_cache(newsfeed)
+        conn = RedisClient.get_connection()
+        key = USER_NEWSFEEDS_PATTERN.format(user_id=self.user1.id)
+        self.assertEqual(conn.exists(key), 0)
+        # Reloaded from DB in order
+        self.assertEqual(
+            [f.id for f in NewsFeedService.get_cached_newsfeeds(self.user1.id)],
+            [newsfeeds[1].id, newsfeed.id, newsfeeds[0].id],
+        )
+
+    @override_settings(REDIS_LIST_LENGTH_LIMIT=3)
+    def test_cached_newsfeeds_length_limit(self):
+        tweets = [self.create_tweet(self.user1) for i in range(4)]
+        for tweet in tweets[:2]:
+            NewsFeedService.fanout_to_followers(tweet)
+        # Load 2 newsfeeds of user1 to cache
+        NewsFeedService.get_cached_newsfeeds(self.user1.id)
+        for tweet in tweets[2:]:
+            NewsFeedService.fanout_to_followers(tweet)
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(self.user1.id)
+        self.assertEqual(
+            [f.tweet_id for f in newsfeeds],
+            [tweets[3].id, tweets[2].id, tweets[1].id],
+        )
+
+    @override_settings(NEWSFEED_BACKFILL_TWEETS_LIMIT=2)
+    def test_backfill_and_purge_newsfeeds(self):
+        tweets = [self.create_tweet(self.user2) for i in range(3)]
+        other_tweet = self.create_tweet(self.user1)
+        self.create_newsfeed(self.user1, other_tweet)
+        # Load user1's newsfeeds into cache
+        NewsFeedService.get_cached_newsfeeds(self.user1.id)
+
+        # Not followed, nothing to backfill
+        backfill_newsfeeds_task(self.user1.id, self.user2.id)
+        self.assertEqual(NewsFeedService.get_newsfeeds(self.user1.id).count(), 1)
+
+        Friendship.objects.create(from_user=self.user1, to_user=self.user2)
+        backfill_newsfeeds_task(self.user1.id, self.user2.id)
+        # Idempotent
+        backfill_newsfeeds_task(self.user1.id, self.user2.id)
+        # Placed at the time of the tweets, older than other_tweet
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(self.user1.id)
+        self.assertEqual(
+            [newsfeed.tweet_id for newsfeed in newsfeeds],
+            [other_tweet.id, tweets[2].id, tweets[1].id],
+        )
+        self.assertEqual(
+            [newsfeed.created_at for newsfeed in newsfeeds[1:]],
+            [tweets[2].created_at, tweets[1].created_at],
+        )
+
+        # Still followed, nothing to purge
+        purge_newsfeeds_task(self.user1.id, self.user2.id)
+        self.assertEqual(NewsFeedService.get_newsfeeds(self.user1.id).count(), 3)
+
+        Friendship.objects.filter(from_user=self.user1, to_user=self.user2).delete()
+        purge_newsfeeds_task(self.user1.id, self.user2.id)
+        newsfeeds = NewsFeedService.get_cached_newsfeeds(self.user1.id)
+        self.assertEqual(
+            [newsfeed.tweet_id for newsfeed in newsfeeds],
+            [other_tweet.id],
+        )
+        self.assertEqual(self.count_newsfeeds(tweet__in=tweets), 0)
@@ -18,6 +18,12 @@ sudo dpkg -i mysql-apt-config_0.8.15-1_all.deb
 sudo DEBIAN_FRONTEND=noninteractivate apt-get install -y mysql-server
 sudo apt-get install -y libmysqlclient-dev
 
+# 安装redis
+sudo apt-get install -y redis
+
+# 安装memcached
+sudo apt-get install -y memcached
+
 if [ ! -f "/usr/bin/pip" ]; then
   sudo apt-get install -y python3-pip
   sudo apt-get install -y python-setuptools
@@ -1,14 +1,43 @@
 from comments.models import Comment
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
 from django.test import TestCase as DjangoTestCase
 from likes.models import Like
 from newsfeeds.models import NewsFeed
+from newsfeeds.services import NewsFeedService
 from tweets.models import Tweet
 from rest_framework.test import APIClient
+from unittest import mock
+from utils.multi_level_cache import MultiLevelCache
+from utils.redis_client import RedisClient
 
 
 class TestCase(DjangoTestCase):
+    # NewsFeed is stored on shards, see newsfeeds/routers.py
+    databases = '__all__'
+
+    def _pre_setup(self):
+        super(TestCase, self)._pre_setup()
+        # Each test runs in a transaction which is never committed, so
+        # transaction.on_commit() callbacks (e.g. cache updates in listeners)
+        # run right away, as in autocommit mode
+        self._on_commit_patcher = mock.patch(
+            'django.db.transaction.on_commit',
+            lambda func, using=None: func(),
+        )
+        self._on_commit_patcher.start()
+
+    def _post_teardown(self):
+        self._on_commit_patcher.stop()
+        super(TestCase, self)._post_teardown()
+
+    def clear_cache(self):
+        # Cache is not rolled back with the test DB, clear it before each test
+        RedisClient.clear()
+        caches['default'].clear()
+        MultiLevelCache.clear_all_local()
 
     @property
     def anonymous_client(self):
@@ -34,7 +63,14 @@ class TestCase(DjangoTestCase):
         return Tweet.objects.create(user=user, content=content)
 
     def create_newsfeed(self, user, tweet):
-        return NewsFeed.objects.create(user=user, tweet=tweet)
+        return NewsFeedService.get_newsfeeds(user.id).create(user=user, tweet=tweet)
+
+    def count_newsfeeds(self, **filters):
+        # Count newsfeeds on all shards
+        return sum(
+            NewsFeed.objects.using(database).filter(**filters).count()
+            for database in settings.NEWSFEED_DATABASES
+        )
 
     def create_comment(self, user, tweet, content=None):
         if content is None:
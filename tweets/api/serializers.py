@@ -1,23 +1,46 @@
+from collections import OrderedDict
+
 from accounts.api.serializers import UserSerializerForTweet
+from django.db import models
 from rest_framework import serializers
 from tweets.models import Tweet
 from accounts.api.serializers import UserSerializer
+from accounts.services import UserService
 from comments.api.serializers import CommentSerializer
-from likes.api.serializers import LikeSerializer
+from comments.models import Comment
+from likes.api.serializers import HasLikedListSerializer, LikeSerializer
 from likes.services import LikeService
+from tweets.services import TweetService
+from utils.paginations import BidirectionalEndlessPagination, EndlessPagination
+
+
+class TweetListSerializer(HasLikedListSerializer):
+    """
+    Rendered tweets (except has_liked) of the whole list are read from cache
+    before rendering, only tweets not in cache are rendered by DRF fields
+    """
+
+    def get_tweets(self, objects):
+        return objects
+
+    def to_representation(self, data):
+        objects = list(data.all() if isinstance(data, models.Manager) else data)
+        TweetService.prefetch_tweet_fragments(self.context, self.get_tweets(objects))
+        result = super(TweetListSerializer, self).to_representation(objects)
+        TweetService.save_tweet_fragments(self.context)
+        return result
 
 
 class TweetSerializer(serializers.ModelSerializer):
     # Need to declare user serializer here to show full user info, otherwise return an int type id
     # Other fields is taken care of by ModelSerializer
-    user = UserSerializerForTweet()
+    user = UserSerializerForTweet(source='cached_user')
     # Self defined method, implemented by get_<name>
-    comments_count = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
     has_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Tweet
+        list_serializer_class = TweetListSerializer
         fields = (
             'id',
             'user',
@@ -28,16 +51,34 @@ class TweetSerializer(serializers.ModelSerializer):
             'has_liked',
         )
 
-    def get_likes_count(self, obj):
-        return obj.like_set.count()
+    # likes_count and comments_count are columns of Tweet, no COUNT(*) needed
 
-    def get_comments_count(self, obj):
-        # comment_set is defined by django, because there is tweet foreign key in comment
-        return obj.comment_set.count()
+    def to_representation(self, instance):
+        fragments = self.context.get(TweetService.TWEET_FRAGMENTS_CONTEXT_KEY, {})
+        # Not prefetched, e.g. rendering a single tweet
+        if instance.id not in fragments:
+            return super(TweetSerializer, self).to_representation(instance)
+        # Fragment only has fields of the tweet, which change with its version.
+        # user is rendered from the user cache, a change of the author is not
+        # in the version of the tweet. has_liked is different for each user
+        fragment = fragments[instance.id]
+        if fragment is None:
+            fragment = super(TweetSerializer, self).to_representation(instance)
+            fragment.pop('user')
+            fragment.pop('has_liked')
+            TweetService.add_tweet_fragment_to_context(self.context, instance, fragment)
+        user_field = self.fields['user']
+        data = dict(fragment)
+        user = user_field.get_attribute(instance)
+        data['user'] = None if user is None else user_field.to_representation(user)
+        data['has_liked'] = LikeService.has_liked_in_context(self.context, instance)
+        # Same order as rendered by the fields
+        return OrderedDict((name, data[name]) for name in self.fields)
 
     def get_has_liked(self, obj):
-        # self.context['request'].user: get current user
-        return LikeService.has_liked(self.context['request'].user, obj)
+        # Prefetched for the whole list by HasLikedListSerializer,
+        # query one by one only when rendering a single tweet
+        return LikeService.has_liked_in_context(self.context, obj)
 
 
 class TweetSerializerForCreate(serializers.ModelSerializer):
@@ -54,22 +95,75 @@ class TweetSerializerForCreate(serializers.ModelSerializer):
         return tweet
 
 class TweetSerializerForDetail(TweetSerializer):
-    user = UserSerializer()
-    # <HOMEWORK> use serialziers.SerializerMethodField to implement comments
-    comments = CommentSerializer(source='comment_set', many=True)
-    likes = LikeSerializer(source='like_set', many=True)
+    """
+    Only the first page of comments (oldest first) and likes (newest first)
+    is embedded, the cost of the detail page does not grow with the number of
+    comments and likes. comments_count and likes_count are the totals.
+    Read more with the cursors, None if there is no more:
+        GET /api/comments/?tweet_id=<id>&created_at__gt=<comments_cursor>
+        GET /api/tweets/<id>/likes/?created_at__lt=<likes_cursor>
+    """
+    user = UserSerializer(source='cached_user')
+    comments = serializers.SerializerMethodField()
+    comments_cursor = serializers.SerializerMethodField()
+    likes = serializers.SerializerMethodField()
+    likes_cursor = serializers.SerializerMethodField()
 
     class Meta:
         model = Tweet
         fields = (
             'id',
             'user',
-            'comments',
             'created_at',
             'content',
-            'likes',
             'comments',
+            'comments_cursor',
+            'likes',
+            'likes_cursor',
             'likes_count',
             'comments_count',
             'has_liked',
         )
+
+    def to_representation(self, instance):
+        # Same page sizes as the comments and likes list apis, so the cursors
+        # continue from here
+        comments_limit = BidirectionalEndlessPagination.page_size
+        likes_limit = EndlessPagination.page_size
+        # One more row to know whether there are more
+        comments = list(
+            Comment.objects.filter(tweet_id=instance.id)
+            .order_by('created_at')[:comments_limit + 1]
+        )
+        likes = list(instance.like_set[:likes_limit + 1])
+        self._has_more_comments = len(comments) > comments_limit
+        self._has_more_likes = len(likes) > likes_limit
+        self._comments = comments[:comments_limit]
+        self._likes = likes[:likes_limit]
+        # Users of the tweet, comments and likes in one batch, the list
+        # serializers below find them in cache
+        UserService.load_users_through_cache([instance] + self._comments + self._likes)
+        return super(TweetSerializerForDetail, self).to_representation(instance)
+
+    def _get_cursor(self, has_more, items):
+        if not has_more:
+            return None
+        # Same format as created_at in the response
+        return serializers.DateTimeField().to_representation(items[-1].created_at)
+
+    def get_comments(self, obj):
+        # has_liked of all comments is one query in HasLikedListSerializer
+        return CommentSerializer(
+            self._comments,
+            context=self.context,
+            many=True,
+        ).data
+
+    def get_comments_cursor(self, obj):
+        return self._get_cursor(self._has_more_comments, self._comments)
+
+    def get_likes(self, obj):
+        return LikeSerializer(self._likes, many=True).data
+
+    def get_likes_cursor(self, obj):
+        return self._get_cursor(self._has_more_likes, self._likes)
@@ -1,17 +1,27 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from testing.testcases import TestCase
 from tweets.models import Tweet
+from twitter.cache import USER_TWEETS_PATTERN
+from utils.paginations import BidirectionalEndlessPagination, EndlessPagination
+from utils.redis_client import RedisClient
 
 
 # Remember to end with '/'
 TWEET_LIST_API = '/api/tweets/'
 TWEET_CREATE_API = '/api/tweets/'
 TWEET_RETRIEVE_API = '/api/tweets/{}/'
+TWEET_LIKES_API = '/api/tweets/{}/likes/'
+COMMENT_LIST_API = '/api/comments/'
 
 
 class TweetApiTests(TestCase):
 
     def setUp(self):
+        self.clear_cache()
         self.user1 = self.create_user('user1', 'user1@twitter.com')
         self.tweets1 = [
             self.create_tweet(self.user1)
@@ -35,12 +45,223 @@ class TweetApiTests(TestCase):
         # Success: Correct request
         response = self.anonymous_client.get(TWEET_LIST_API, {'user_id': self.user1.id})
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data['tweets']), 3)
+        self.assertEqual(len(response.data['results']), 3)
         response = self.anonymous_client.get(TWEET_LIST_API, {'user_id': self.user2.id})
-        self.assertEqual(len(response.data['tweets']), 2)
+        self.assertEqual(len(response.data['results']), 2)
         # Check order
-        self.assertEqual(response.data['tweets'][0]['id'], self.tweets2[1].id)
-        self.assertEqual(response.data['tweets'][1]['id'], self.tweets2[0].id)
+        self.assertEqual(response.data['results'][0]['id'], self.tweets2[1].id)
+
+        # Leading zeros are the same user, and read the same cached list
+        padded_user_id = '0{}'.format(self.user2.id)
+        response = self.anonymous_client.get(TWEET_LIST_API, {'user_id': padded_user_id})
+        self.assertEqual(len(response.data['results']), 2)
+        key = USER_TWEETS_PATTERN.format(user_id=padded_user_id)
+        self.assertEqual(RedisClient.get_connection().exists(key), 0)
+        self.assertEqual(response.data['results'][1]['id'], self.tweets2[0].id)
+
+    @override_settings(REDIS_LIST_LENGTH_LIMIT=25)
+    def test_list_api_pagination(self):
+        page_size = EndlessPagination.page_size
+        user3 = self.create_user('user3')
+        tweets = [self.create_tweet(user3) for i in range(page_size * 2)]
+        tweets = tweets[::-1]
+
+        # First page is served by the cached tweets, only the latest 25 are cached
+        response = self.anonymous_client.get(TWEET_LIST_API, {'user_id': user3.id})
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [tweet.id for tweet in tweets[:page_size]],
+        )
+
+        # Older than the cached tweets, read from DB
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': user3.id,
+            'created_at__lt': tweets[page_size - 1].created_at,
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [tweet.id for tweet in tweets[page_size:]],
+        )
+
+        # New tweet is pushed to the cached tweets
+        new_tweet = self.create_tweet(user3)
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': user3.id,
+            'created_at__gt': tweets[0].created_at,
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [new_tweet.id],
+        )
+
+    @override_settings(REDIS_LIST_LENGTH_LIMIT=25)
+    def test_list_api_queries(self):
+        page_size = EndlessPagination.page_size
+        user3 = self.create_user('user3')
+
+        def post_tweets(count):
+            for i in range(count):
+                tweet = self.create_tweet(user3)
+                liker = self.create_user('liker{}'.format(Tweet.objects.count()))
+                self.create_like(liker, tweet)
+                self.create_like(self.user1, tweet)
+
+        def count_queries(params):
+            self.clear_cache()
+            params = dict(params, user_id=user3.id)
+            with CaptureQueriesContext(connection) as captured:
+                response = self.user1_client.get(TWEET_LIST_API, params)
+            self.assertEqual(response.status_code, 200)
+            return len(response.data['results']), len(captured)
+
+        post_tweets(2)
+        results_count, queries_count = count_queries({})
+        self.assertEqual(results_count, 2)
+
+        # Same number of queries for a full page
+        post_tweets(page_size * 2 - 2)
+        results_count, full_page_queries_count = count_queries({})
+        self.assertEqual(results_count, page_size)
+        self.assertEqual(full_page_queries_count, queries_count)
+
+        # Older page is read from DB instead of the cached tweets, only ids of
+        # the page and has_liked once tweets and users are in cache
+        oldest = Tweet.objects.filter(user_id=user3.id).order_by('created_at')
+        params = {'created_at__lt': oldest[page_size - 1].created_at}
+        results_count, older_page_queries_count = count_queries(params)
+        self.assertEqual(results_count, page_size - 1)
+        self.assertEqual(older_page_queries_count, queries_count + 1)
+        with self.assertNumQueries(2):
+            response = self.user1_client.get(
+                TWEET_LIST_API,
+                dict(params, user_id=user3.id),
+            )
+        self.assertEqual(len(response.data['results']), page_size - 1)
+        self.assertEqual(response.data['results'][0]['has_liked'], True)
+        self.assertEqual(response.data['results'][0]['likes_count'], 2)
+
+        # Error: user_id is not an integer
+        response = self.anonymous_client.get(TWEET_LIST_API, {'user_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_api_with_cached_fragments(self):
+        tweet = self.tweets1[0]
+        params = {'user_id': self.user1.id}
+        self.anonymous_client.get(TWEET_LIST_API, params)
+
+        # Rendered tweets are read from cache, a change without version bump
+        # is not rendered
+        Tweet.objects.filter(id=tweet.id).update(content='Updated content')
+        response = self.anonymous_client.get(TWEET_LIST_API, params)
+        self.assertEqual(response.data['results'][2]['content'], tweet.content)
+
+        # has_liked is rendered for each user
+        self.create_like(self.user1, tweet)
+        response = self.user1_client.get(TWEET_LIST_API, params)
+        self.assertEqual(response.data['results'][2]['has_liked'], True)
+        # Like bumps the version, new content and count are rendered
+        self.assertEqual(response.data['results'][2]['content'], 'Updated content')
+        self.assertEqual(response.data['results'][2]['likes_count'], 1)
+        response = self.anonymous_client.get(TWEET_LIST_API, params)
+        self.assertEqual(response.data['results'][2]['has_liked'], False)
+        self.assertEqual(response.data['results'][2]['likes_count'], 1)
+
+        # Author is not in the cached fragment, a renamed user is rendered
+        # without bumping the version of the tweets
+        self.user1.username = 'user1_renamed'
+        self.user1.save()
+        response = self.anonymous_client.get(TWEET_LIST_API, params)
+        self.assertEqual(response.data['results'][2]['user']['username'], 'user1_renamed')
+        self.assertEqual(response.data['results'][2]['content'], 'Updated content')
+        self.assertEqual(
+            list(response.data['results'][2].keys()),
+            ['id', 'user', 'created_at', 'content', 'comments_count', 'likes_count', 'has_liked'],
+        )
+
+    def test_retrieve_not_modified(self):
+        tweet = self.tweets1[0]
+        url = TWEET_RETRIEVE_API.format(tweet.id)
+        response = self.user1_client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.user1_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # has_liked is different for other users
+        response = self.anonymous_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # Like, comment and like of comment change the version of the tweet
+        self.create_like(self.user2, tweet)
+        response = self.user1_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['likes_count'], 1)
+        etag = response['ETag']
+        comment = self.create_comment(self.user2, tweet)
+        response = self.user1_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.create_like(self.user2, comment)
+        response = self.user1_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['comments'][0]['likes_count'], 1)
+
+    def test_retrieve_bounded_comments_and_likes(self):
+        comments_limit = BidirectionalEndlessPagination.page_size
+        likes_limit = EndlessPagination.page_size
+        tweet = self.create_tweet(self.user1)
+        url = TWEET_RETRIEVE_API.format(tweet.id)
+
+        def count_queries():
+            self.clear_cache()
+            with CaptureQueriesContext(connection) as captured:
+                response = self.user1_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return response.data, len(captured)
+
+        def add_comments_and_likes(count):
+            for i in range(count):
+                user = self.create_user('fan{}'.format(User.objects.count()))
+                comment = self.create_comment(user, tweet)
+                self.create_like(user, tweet)
+                self.create_like(self.user1, comment)
+
+        add_comments_and_likes(2)
+        data, queries_count = count_queries()
+        self.assertEqual(len(data['comments']), 2)
+        self.assertEqual(len(data['likes']), 2)
+        self.assertEqual(data['comments_cursor'], None)
+        self.assertEqual(data['likes_cursor'], None)
+        self.assertEqual(data['comments'][0]['has_liked'], True)
+
+        add_comments_and_likes(max(comments_limit, likes_limit))
+        data, more_queries_count = count_queries()
+        self.assertEqual(more_queries_count, queries_count)
+        self.assertEqual(len(data['comments']), comments_limit)
+        self.assertEqual(len(data['likes']), likes_limit)
+        self.assertEqual(data['comments_count'], comments_limit + 2)
+        self.assertEqual(data['likes_count'], likes_limit + 2)
+
+        # Read the rest with the cursors
+        response = self.anonymous_client.get(COMMENT_LIST_API, {
+            'tweet_id': tweet.id,
+            'created_at__gt': data['comments_cursor'],
+        })
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['has_next_page'], False)
+        response = self.anonymous_client.get(
+            TWEET_LIKES_API.format(tweet.id),
+            {'created_at__lt': data['likes_cursor']},
+        )
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['has_next_page'], False)
+        all_like_ids = {
+            item['user']['id']
+            for item in data['likes'] + response.data['results']
+        }
+        self.assertEqual(len(all_like_ids), likes_limit + 2)
 
     def test_create_api(self):
         # Error: Need to logged in
@@ -1,4 +1,6 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from tweets.api.serializers import (
@@ -6,14 +8,30 @@ from tweets.api.serializers import (
     TweetSerializerForCreate,
     TweetSerializerForDetail,
 )
+from likes.api.serializers import LikeSerializer
 from tweets.models import Tweet
+from tweets.services import TweetService
 from newsfeeds.services import NewsFeedService
-from utils.decorators import required_params
+from utils.decorators import conditional_response, required_params
+from utils.paginations import EndlessPagination
+from utils.read_replicas import ReadReplicaViewSetMixin
+
+def tweet_etag(view, request, *args, **kwargs):
+    if not str(kwargs['pk']).isdigit():
+        return None
+    # has_liked is different for each user
+    return '{}:{}:{}'.format(
+        kwargs['pk'],
+        TweetService.get_tweet_version(int(kwargs['pk'])),
+        request.user.id,
+    )
+
 
 # Avoid using ModelViewSet, ModelViewSet allows all actions: Create, Read, Update, Delete
 # Use other viewset to limit user action
 # No need for CreateModelMixin and ListModelMixin, we need to implement them ourselves
-class TweetViewSet(viewsets.GenericViewSet,
+class TweetViewSet(ReadReplicaViewSetMixin,
+                   viewsets.GenericViewSet,
                    viewsets.mixins.CreateModelMixin,
                    viewsets.mixins.ListModelMixin):
     """
@@ -22,6 +40,8 @@ class TweetViewSet(viewsets.GenericViewSet,
     # queryset: used by self.get_object(), as Tweet.objects.all().get(id=?)
     queryset = Tweet.objects.all()
     serializer_class = TweetSerializerForCreate
+    pagination_class = EndlessPagination
+    read_replica_actions = ('list', 'retrieve', 'likes')
 
     # Pre-defined functions
     # POST /api/tweets/ -> create()
@@ -33,20 +53,39 @@ class TweetViewSet(viewsets.GenericViewSet,
 
     def get_permissions(self):
         # self.action is 'list' or 'create' functions below that has request
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'likes']:
             return [AllowAny()]
         return [IsAuthenticated()]
 
+    @conditional_response(etag_func=tweet_etag)
     def retrieve(self, request, *args, **kwargs):
         # <HOMEWORK 1> Use query argument with_all_comments to decide whether include comments
         # <HOMEWORK 2> Use query argument with_preview_comments to decide whether include first 3 comments
-        tweet = self.get_object()
+        # Tweet is read from cache instead of self.get_object()
+        if not str(kwargs['pk']).isdigit():
+            raise NotFound()
+        tweet = TweetService.get_tweet_through_cache(int(kwargs['pk']))
+        if tweet is None:
+            raise NotFound()
         serializer = TweetSerializerForDetail(
             tweet,
             context={'request': request},
         )
         return Response(serializer.data)
 
+    @action(methods=['GET'], detail=True)
+    def likes(self, request, *args, **kwargs):
+        # GET /api/tweets/1/likes/?created_at__lt=<likes_cursor of tweet detail>
+        # Newest likes first, read one page by index (content_type, object_id, created_at)
+        if not str(kwargs['pk']).isdigit():
+            raise NotFound()
+        tweet = TweetService.get_tweet_through_cache(int(kwargs['pk']))
+        if tweet is None:
+            raise NotFound()
+        page = self.paginate_queryset(tweet.like_set)
+        serializer = LikeSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @required_params(params=['user_id'])
     def list(self, request, *args, **kwargs):
         """
@@ -62,19 +101,40 @@ class TweetViewSet(viewsets.GenericViewSet,
         # where user_id = xxx
         # order by created_at desc
         # This is a composite index of user and created_at
-        tweets = Tweet.objects.filter(
-            user_id=request.query_params['user_id']
-        ).order_by('-created_at')
+        # tweets = Tweet.objects.filter(
+        #     user_id=request.query_params['user_id']
+        # ).order_by('-created_at')
+
+        user_id = request.query_params['user_id']
+        if not user_id.isdigit():
+            return Response({
+                'success': False,
+                'message': 'user_id should be an integer',
+            }, status=400)
+        user_id = int(user_id)
+
+        # Latest tweets of the user are cached in redis, only pages older
+        # than the cached tweets are read from DB
+        cached_tweets = TweetService.get_cached_tweets(user_id)
+        page = self.paginator.paginate_cached_list(cached_tweets, request)
+        if page is None:
+            # Only ids of the page are needed, tweets are loaded from cache
+            # below. The query only reads index (user, created_at), which
+            # also has id in it
+            page = self.paginate_queryset(
+                Tweet.objects.filter(user_id=user_id).only('id', 'created_at'),
+            )
+        # One query for tweets and one for users not in cache, counts are
+        # columns of Tweet, has_liked is one query in TweetListSerializer
+        page = TweetService.load_tweets(page)
 
         # many=True returns list of dict, each dict is one TweetSerializer
         serializer = TweetSerializer(
-            tweets,
+            page,
             context={'request': request},
             many=True
         )
-
-        # Response is using hash by default
-        return Response({'tweets': serializer.data})
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         """
@@ -0,0 +1,30 @@
+from django.db import transaction
+
+# Import TweetService in listeners, tweets.services imports tweets.models which
+# connects these listeners
+
+# Cache changes run after the commit. Before it, another request can still
+# read the old row from DB and cache it again for the new version or list.
+# Values are read from instance right away, instance.id is None after delete
+
+
+def invalidate_tweet_cache(sender, instance, **kwargs):
+    from tweets.services import TweetService
+    tweet_id = instance.id
+    transaction.on_commit(lambda: TweetService.invalidate_tweet(tweet_id))
+
+
+def push_tweet_to_cache(sender, instance, created, **kwargs):
+    from tweets.services import TweetService
+    if created:
+        transaction.on_commit(lambda: TweetService.push_tweet_to_cache(instance))
+    else:
+        # created_at may be changed, the order of cached tweets is not right
+        user_id = instance.user_id
+        transaction.on_commit(lambda: TweetService.invalidate_cached_tweets(user_id))
+
+
+def remove_tweet_from_cache(sender, instance, **kwargs):
+    from tweets.services import TweetService
+    user_id = instance.user_id
+    transaction.on_commit(lambda: TweetService.invalidate_cached_tweets(user_id))
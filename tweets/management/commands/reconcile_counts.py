@@ -0,0 +1,59 @@
+from comments.models import Comment
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef
+from likes.services import LikeService
+from tweets.models import Tweet
+from tweets.services import TweetService
+from utils.queries import count_subquery
+
+
+class Command(BaseCommand):
+    help = 'Fix likes_count and comments_count of tweets and comments by counting in DB'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def reconcile(self, queryset, counter_names, batch_size):
+        """
+        Scan queryset by id in batches, every batch is one query with the real
+        counts annotated as real_<counter_name>, only rows that drift are updated.
+        """
+        fixed, last_id = 0, 0
+        while True:
+            objects = list(
+                queryset.filter(id__gt=last_id).order_by('id')[:batch_size]
+            )
+            if not objects:
+                break
+            last_id = objects[-1].id
+            for obj in objects:
+                changes = {}
+                for name in counter_names:
+                    real_count = getattr(obj, 'real_' + name)
+                    if getattr(obj, name) != real_count:
+                        changes[name] = real_count
+                if changes:
+                    queryset.model.objects.filter(id=obj.id).update(**changes)
+                    # update() does not send post_save
+                    if queryset.model is Tweet:
+                        TweetService.invalidate_tweet(obj.id)
+                    fixed += 1
+        return fixed
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        tweets = Tweet.objects.annotate(
+            real_likes_count=LikeService.likes_count_subquery(Tweet),
+            real_comments_count=count_subquery(
+                Comment.objects.filter(tweet_id=OuterRef('id')),
+                'tweet_id',
+            ),
+        )
+        fixed = self.reconcile(tweets, ['likes_count', 'comments_count'], batch_size)
+        self.stdout.write('Fixed {} tweets'.format(fixed))
+
+        comments = Comment.objects.annotate(
+            real_likes_count=LikeService.likes_count_subquery(Comment),
+        )
+        fixed = self.reconcile(comments, ['likes_count'], batch_size)
+        self.stdout.write('Fixed {} comments'.format(fixed))
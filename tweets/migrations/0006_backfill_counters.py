@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.models import OuterRef
+from utils.queries import count_subquery
+
+BATCH_SIZE = 1000
+
+
+def backfill_counters(apps, schema_editor):
+    # likes_count and comments_count of existing tweets start at 0, count them
+    # in DB, one UPDATE per batch of ids so the table is not locked at once.
+    # Historical models, content type is matched by name instead of
+    # ContentType.objects.get_for_model()
+    Tweet = apps.get_model('tweets', 'Tweet')
+    Comment = apps.get_model('comments', 'Comment')
+    Like = apps.get_model('likes', 'Like')
+    tweets = Tweet.objects.using(schema_editor.connection.alias)
+    last_id = 0
+    while True:
+        ids = list(
+            tweets.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        tweets.filter(id__in=ids).update(
+            likes_count=count_subquery(
+                Like.objects.filter(
+                    content_type__app_label='tweets',
+                    content_type__model='tweet',
+                    object_id=OuterRef('id'),
+                ),
+                'object_id',
+            ),
+            comments_count=count_subquery(
+                Comment.objects.filter(tweet_id=OuterRef('id')),
+                'tweet_id',
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweets', '0005_counters_not_null'),
+        ('comments', '0001_initial'),
+        ('likes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,14 @@
+from accounts.services import UserService
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from likes.models import Like
+from tweets.listeners import (
+    invalidate_tweet_cache,
+    push_tweet_to_cache,
+    remove_tweet_from_cache,
+)
 from utils.time_helpers import utc_now
 
 
@@ -18,6 +25,12 @@ class Tweet(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     #updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized counters, kept in sync by likes/listeners.py and comments/listeners.py
+    # so rendering a tweet does not need COUNT(*) on likes and comments table.
+    # Fixed by `python manage.py reconcile_counts` if they drift
+    likes_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+
     class Meta:
         # Add composite index
         index_together = (('user', 'created_at'),)
@@ -29,6 +42,10 @@ class Tweet(models.Model):
         # return (datetime.now() - self.created_at).seconds // 3600
         return (utc_now() - self.created_at).total_seconds() // 3600
 
+    @property
+    def cached_user(self):
+        return UserService.get_related_user_through_cache(self)
+
     @property
     def like_set(self):
         return Like.objects.filter(
@@ -38,4 +55,11 @@ class Tweet(models.Model):
 
     def __str__(self):
         # For print(tweet instance)
-        return f'{self.created_at} {self.user}: {self.content}'
\ No newline at end of file
+        return f'{self.created_at} {self.user}: {self.content}'
+
+
+post_save.connect(invalidate_tweet_cache, sender=Tweet)
+post_delete.connect(invalidate_tweet_cache, sender=Tweet)
+# Latest tweets of each user are cached in redis
+post_save.connect(push_tweet_to_cache, sender=Tweet)
+post_delete.connect(remove_tweet_from_cache, sender=Tweet)
@@ -0,0 +1,186 @@
+from accounts.services import UserService
+from tweets.models import Tweet
+from twitter.cache import (
+    TWEET_CACHE_VERSION,
+    TWEET_FRAGMENT_PATTERN,
+    TWEET_PATTERN,
+    TWEET_VERSION_PATTERN,
+    USER_TWEETS_PATTERN,
+)
+from utils.cache_versions import bump_version, get_version, get_versions
+from utils.multi_level_cache import MultiLevelCache
+from utils.read_replicas import read_from_primary
+from utils.redis_helper import RedisHelper
+
+# A tweet is cached with its version in the key, a changed tweet gets a new key
+# instead of being deleted, so the copies in the local caches of all processes
+# are never out of date
+tweet_cache = MultiLevelCache('tweet', version=TWEET_CACHE_VERSION)
+# Rendered tweets never change for a version, same as tweets
+tweet_fragment_cache = MultiLevelCache('tweet_fragment')
+
+
+class TweetService(object):
+    TWEET_FRAGMENTS_CONTEXT_KEY = 'tweet_fragments'
+    NEW_TWEET_FRAGMENTS_CONTEXT_KEY = 'new_tweet_fragments'
+
+    @classmethod
+    def get_tweet_through_cache(cls, tweet_id):
+        # Return None if the tweet does not exist
+        key = TWEET_PATTERN.format(
+            tweet_id=tweet_id,
+            version=cls.get_tweet_version(tweet_id),
+        )
+        # Only one process reads the DB when a popular tweet is changed
+        return tweet_cache.get_or_set(
+            key,
+            lambda: Tweet.objects.filter(id=tweet_id).first(),
+        )
+
+    @classmethod
+    def get_tweets_through_cache(cls, tweet_ids, versions=None):
+        """
+        Return {tweet_id: tweet}, one cache get_many for all tweets and one
+        query for the tweets not in cache. Deleted tweets are not in the dict.
+        versions is {tweet_id: version}, read from cache if not given
+        """
+        if versions is None:
+            versions = cls.get_tweet_versions(tweet_ids)
+        keys = {
+            tweet_id: TWEET_PATTERN.format(
+                tweet_id=tweet_id,
+                version=versions[tweet_id],
+            )
+            for tweet_id in set(tweet_ids)
+        }
+        cached_tweets = tweet_cache.get_many(keys.values())
+        tweets = {}
+        missing_tweet_ids = []
+        for tweet_id, key in keys.items():
+            if key in cached_tweets:
+                tweets[tweet_id] = cached_tweets[key]
+            else:
+                missing_tweet_ids.append(tweet_id)
+        if missing_tweet_ids:
+            with read_from_primary():
+                missing_tweets = list(Tweet.objects.filter(id__in=missing_tweet_ids))
+            tweet_cache.set_many({keys[tweet.id]: tweet for tweet in missing_tweets})
+            tweets.update({tweet.id: tweet for tweet in missing_tweets})
+        return tweets
+
+    @classmethod
+    def invalidate_tweet(cls, tweet_id):
+        # Called when a tweet is changed or deleted, and when likes_count or
+        # comments_count is updated by F(), which does not send post_save.
+        # The cached tweet of the old version is not read any more
+        cls.bump_tweet_version(tweet_id)
+
+    @classmethod
+    def get_tweet_version(cls, tweet_id):
+        """
+        A number changed whenever the tweet, its likes or comments change,
+        used as validator of responses containing the tweet
+        """
+        return get_version(TWEET_VERSION_PATTERN.format(tweet_id=tweet_id))
+
+    @classmethod
+    def get_tweet_versions(cls, tweet_ids):
+        # Return {tweet_id: version}, one get_many if all versions are cached
+        keys = {
+            tweet_id: TWEET_VERSION_PATTERN.format(tweet_id=tweet_id)
+            for tweet_id in set(tweet_ids)
+        }
+        versions = get_versions(list(keys.values()))
+        return {tweet_id: versions[key] for tweet_id, key in keys.items()}
+
+    @classmethod
+    def bump_tweet_version(cls, tweet_id):
+        bump_version(TWEET_VERSION_PATTERN.format(tweet_id=tweet_id))
+
+    @classmethod
+    def get_tweets_for_serialization(cls, tweet_ids):
+        """
+        Return {tweet_id: tweet} with tweets and users loaded from cache.
+        Counts are columns of Tweet and has_liked is prefetched by
+        HasLikedListSerializer, so TweetSerializer needs no more query
+        """
+        # Read versions before tweets, a tweet changed in between is not saved
+        # as a fragment of the new version
+        versions = cls.get_tweet_versions(tweet_ids)
+        tweets = cls.get_tweets_through_cache(tweet_ids, versions)
+        for tweet in tweets.values():
+            # Version of the data in this object, used by prefetch_tweet_fragments()
+            tweet.version = versions[tweet.id]
+        # Tweets are already put into cache, users loaded here are not cached
+        # together with the tweets
+        UserService.load_users_through_cache(list(tweets.values()))
+        return tweets
+
+    @classmethod
+    def prefetch_tweet_fragments(cls, context, tweets):
+        """
+        Read rendered tweets of a page with one get_many and save them in
+        serializer context, see TweetSerializer.to_representation().
+        Only tweets loaded by get_tweets_for_serialization() have versions
+        """
+        keys = {
+            tweet.id: TWEET_FRAGMENT_PATTERN.format(
+                tweet_id=tweet.id,
+                version=tweet.version,
+            )
+            for tweet in tweets
+            if getattr(tweet, 'version', None) is not None
+        }
+        cached_fragments = tweet_fragment_cache.get_many(keys.values())
+        fragments = context.setdefault(cls.TWEET_FRAGMENTS_CONTEXT_KEY, {})
+        for tweet_id, key in keys.items():
+            fragments[tweet_id] = cached_fragments.get(key)
+        context.setdefault(cls.NEW_TWEET_FRAGMENTS_CONTEXT_KEY, {})
+
+    @classmethod
+    def add_tweet_fragment_to_context(cls, context, tweet, fragment):
+        fragments = context.setdefault(cls.TWEET_FRAGMENTS_CONTEXT_KEY, {})
+        fragments[tweet.id] = fragment
+        key = TWEET_FRAGMENT_PATTERN.format(tweet_id=tweet.id, version=tweet.version)
+        context.setdefault(cls.NEW_TWEET_FRAGMENTS_CONTEXT_KEY, {})[key] = fragment
+
+    @classmethod
+    def save_tweet_fragments(cls, context):
+        # Save fragments rendered for cache misses, one set_many
+        new_fragments = context.pop(cls.NEW_TWEET_FRAGMENTS_CONTEXT_KEY, {})
+        tweet_fragment_cache.set_many(new_fragments)
+
+    @classmethod
+    def get_cached_tweets(cls, user_id):
+        # Latest REDIS_LIST_LENGTH_LIMIT tweets of the user, loaded from
+        # Tweet table when not cached.
+        # Only id and created_at of them are used, counters may be out of date,
+        # render tweets from load_tweets()
+        queryset = Tweet.objects.filter(user_id=user_id).order_by('-created_at')
+        key = USER_TWEETS_PATTERN.format(user_id=user_id)
+        return RedisHelper.load_objects(key, queryset)
+
+    @classmethod
+    def push_tweet_to_cache(cls, tweet):
+        key = USER_TWEETS_PATTERN.format(user_id=tweet.user_id)
+        RedisHelper.push_object(key, tweet)
+
+    @classmethod
+    def invalidate_cached_tweets(cls, user_id):
+        # Rebuilt from DB on next read
+        RedisHelper.delete(USER_TWEETS_PATTERN.format(user_id=user_id))
+
+    @classmethod
+    def load_tweets(cls, tweets):
+        """
+        Replace a page of tweets by the ones ready for serialization, keep the
+        order and skip deleted tweets
+        """
+        loaded_tweets = cls.get_tweets_for_serialization(
+            [tweet.id for tweet in tweets],
+        )
+        return [
+            loaded_tweets[tweet.id]
+            for tweet in tweets
+            if tweet.id in loaded_tweets
+        ]
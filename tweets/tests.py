@@ -1,10 +1,22 @@
+from comments.models import Comment
+from django.core.management import call_command
+from io import StringIO
 from testing.testcases import TestCase
+from twitter.cache import USER_TWEETS_PATTERN
+from utils.redis_client import RedisClient
+from utils.paginations import EndlessPagination
+from utils.redis_helper import RedisHelper, RedisObjectList
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from tweets.models import Tweet
+from tweets.services import TweetService
 from datetime import timedelta
 from utils.time_helpers import utc_now
 
 
 class TweetTests(TestCase):
     def setUp(self):
+        self.clear_cache()
         self.user1 = self.create_user('user1')
         self.tweet = self.create_tweet(self.user1, content='Tweet from user1')
 
@@ -23,3 +35,193 @@ class TweetTests(TestCase):
         user2 = self.create_user('user2')
         self.create_like(user2, self.tweet)
         self.assertEqual(self.tweet.like_set.count(), 2)
+
+    def test_likes_and_comments_count(self):
+        user2 = self.create_user('user2')
+        like = self.create_like(self.user1, self.tweet)
+        self.create_like(user2, self.tweet)
+        comment = self.create_comment(user2, self.tweet)
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 2)
+        self.assertEqual(self.tweet.comments_count, 1)
+
+        like.delete()
+        comment.delete()
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+        self.assertEqual(self.tweet.comments_count, 0)
+
+    def test_reconcile_counts(self):
+        comment = self.create_comment(self.user1, self.tweet)
+        self.create_like(self.user1, self.tweet)
+        self.create_like(self.user1, comment)
+        Tweet.objects.filter(id=self.tweet.id).update(likes_count=5, comments_count=0)
+        Comment.objects.filter(id=comment.id).update(likes_count=0)
+
+        out = StringIO()
+        call_command('reconcile_counts', stdout=out)
+        self.assertIn('Fixed 1 tweets', out.getvalue())
+        self.assertIn('Fixed 1 comments', out.getvalue())
+        self.tweet.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+        self.assertEqual(self.tweet.comments_count, 1)
+        self.assertEqual(comment.likes_count, 1)
+
+
+class TweetServiceTests(TestCase):
+
+    def setUp(self):
+        self.clear_cache()
+        self.user1 = self.create_user('user1')
+        self.tweets = [self.create_tweet(self.user1) for i in range(3)]
+
+    def test_get_tweet_through_cache(self):
+        tweet_id = self.tweets[0].id
+        with self.assertNumQueries(1):
+            tweet = TweetService.get_tweet_through_cache(tweet_id)
+        self.assertEqual(tweet.id, tweet_id)
+        with self.assertNumQueries(0):
+            tweet = TweetService.get_tweet_through_cache(tweet_id)
+        self.assertEqual(tweet.likes_count, 0)
+
+        # Counters are updated by F(), cached tweet is invalidated as well
+        self.create_like(self.user1, self.tweets[0])
+        self.create_comment(self.user1, self.tweets[0])
+        tweet = TweetService.get_tweet_through_cache(tweet_id)
+        self.assertEqual(tweet.likes_count, 1)
+        self.assertEqual(tweet.comments_count, 1)
+
+        self.tweets[0].delete()
+        self.assertEqual(TweetService.get_tweet_through_cache(tweet_id), None)
+
+    def test_get_tweets_through_cache(self):
+        tweet_ids = [tweet.id for tweet in self.tweets]
+        TweetService.get_tweet_through_cache(tweet_ids[0])
+        # One query for the tweets not in cache
+        with self.assertNumQueries(1):
+            tweets = TweetService.get_tweets_through_cache(tweet_ids + [0])
+        self.assertEqual(set(tweets.keys()), set(tweet_ids))
+        with self.assertNumQueries(0):
+            tweets = TweetService.get_tweets_through_cache(tweet_ids)
+        self.assertEqual(tweets[tweet_ids[1]].id, tweet_ids[1])
+
+        Tweet.objects.filter(id=tweet_ids[1]).delete()
+        tweets = TweetService.get_tweets_through_cache(tweet_ids)
+        self.assertEqual(set(tweets.keys()), {tweet_ids[0], tweet_ids[2]})
+
+    def test_get_cached_tweets(self):
+        conn = RedisClient.get_connection()
+        key = USER_TWEETS_PATTERN.format(user_id=self.user1.id)
+        tweet_ids = [tweet.id for tweet in self.tweets[::-1]]
+
+        # Cache miss, load from DB
+        self.assertEqual(conn.exists(key), 0)
+        tweets = TweetService.get_cached_tweets(self.user1.id)
+        self.assertEqual([tweet.id for tweet in tweets], tweet_ids)
+        self.assertEqual(conn.exists(key), 1)
+
+        # New tweet is pushed to the cached list
+        new_tweet = self.create_tweet(self.user1)
+        with self.assertNumQueries(0):
+            tweets = TweetService.get_cached_tweets(self.user1.id)
+        self.assertEqual([tweet.id for tweet in tweets], [new_tweet.id] + tweet_ids)
+
+        # Deleting a tweet drops the cached list
+        new_tweet.delete()
+        self.assertEqual(conn.exists(key), 0)
+        tweets = TweetService.get_cached_tweets(self.user1.id)
+        self.assertEqual([tweet.id for tweet in tweets], tweet_ids)
+
+    def test_cache_updated_after_commit(self):
+        tweet = self.tweets[0]
+        version = TweetService.get_tweet_version(tweet.id)
+        key = USER_TWEETS_PATTERN.format(user_id=self.user1.id)
+        TweetService.get_cached_tweets(self.user1.id)
+        # Use the real on_commit, callbacks wait for the test transaction
+        # which is never committed
+        self._on_commit_patcher.stop()
+        try:
+            tweet.content = 'changed'
+            tweet.save()
+            self.create_tweet(self.user1)
+        finally:
+            self._on_commit_patcher.start()
+        self.assertEqual(TweetService.get_tweet_version(tweet.id), version)
+        self.assertEqual(RedisClient.get_connection().llen(key), 3)
+
+    def test_rebuild_cached_tweets(self):
+        conn = RedisClient.get_connection()
+        key = USER_TWEETS_PATTERN.format(user_id=self.user1.id)
+        queryset = Tweet.objects.filter(user=self.user1).order_by('-created_at')
+        tweet_ids = [tweet.id for tweet in self.tweets[::-1]]
+
+        # Another worker is rebuilding the list, read from DB without caching
+        conn.set(RedisHelper._get_rebuild_lock_key(key), 'other')
+        tweets = RedisHelper.load_objects(key, queryset)
+        self.assertEqual([tweet.id for tweet in tweets], tweet_ids)
+        self.assertEqual(conn.exists(key), 0)
+        conn.delete(RedisHelper._get_rebuild_lock_key(key))
+
+        # A tweet pushed while the list is rebuilt is not lost, the rebuilt
+        # list is dropped and loaded again on next read
+        class PushWhileReading(object):
+            def __getitem__(self, item):
+                objects = list(queryset[item])
+                RedisHelper.push_object(key, self.new_tweet)
+                return objects
+
+        rebuild_queryset = PushWhileReading()
+        rebuild_queryset.new_tweet = self.create_tweet(self.user1)
+        RedisHelper.delete(key)
+        RedisHelper.load_objects(key, rebuild_queryset)
+        self.assertEqual(conn.exists(key), 0)
+        tweets = RedisHelper.load_objects(key, queryset)
+        self.assertEqual(
+            [tweet.id for tweet in tweets],
+            [rebuild_queryset.new_tweet.id] + tweet_ids,
+        )
+        self.assertEqual(len(conn.lrange(key, 0, -1)), len(tweet_ids) + 1)
+
+    def test_paginate_cached_tweets(self):
+        tweets = self.tweets[::-1] + [self.create_tweet(self.user1) for i in range(3)]
+        tweets = sorted(tweets, key=lambda tweet: tweet.created_at, reverse=True)
+        TweetService.get_cached_tweets(self.user1.id)
+        cached_tweets = TweetService.get_cached_tweets(self.user1.id)
+        self.assertIsInstance(cached_tweets, RedisObjectList)
+        self.assertEqual(len(cached_tweets), 6)
+
+        paginator = EndlessPagination()
+        paginator.page_size = 2
+        factory = APIRequestFactory()
+        page = paginator.paginate_cached_list(cached_tweets, Request(factory.get('/')))
+        self.assertEqual([t.id for t in page], [t.id for t in tweets[:2]])
+        self.assertTrue(paginator.has_next_page)
+
+        # Older page is found by binary search, only a window is read
+        request = Request(factory.get('/', {
+            'created_at__lt': tweets[3].created_at.isoformat(),
+        }))
+        page = paginator.paginate_cached_list(cached_tweets, request)
+        self.assertEqual([t.id for t in page], [t.id for t in tweets[4:]])
+        self.assertFalse(paginator.has_next_page)
+
+        # Newer items than the cursor
+        request = Request(factory.get('/', {
+            'created_at__gt': tweets[3].created_at.isoformat(),
+        }))
+        page = paginator.paginate_cached_list(cached_tweets, request)
+        self.assertEqual([t.id for t in page], [t.id for t in tweets[:2]])
+        self.assertTrue(paginator.has_next_page)
+
+    def test_load_tweets(self):
+        cached_tweets = TweetService.get_cached_tweets(self.user1.id)
+        self.create_like(self.user1, self.tweets[1])
+        self.tweets[0].delete()
+        tweets = TweetService.load_tweets(cached_tweets)
+        # Deleted tweet is skipped, counters are up to date
+        self.assertEqual(
+            [tweet.id for tweet in tweets],
+            [self.tweets[2].id, self.tweets[1].id],
+        )
+        self.assertEqual(tweets[1].likes_count, 1)
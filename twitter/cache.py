@@ -0,0 +1,31 @@
+# Keys cached in redis
+USER_NEWSFEEDS_PATTERN = 'user_newsfeeds:{user_id}'
+USER_TWEETS_PATTERN = 'user_tweets:{user_id}'
+# Packed follower ids, see FriendshipService.get_follower_ids_through_cache
+USER_FOLLOWER_IDS_PATTERN = 'user_follower_ids:{user_id}'
+# Set when tweets of a user are not pushed because of pull mode, see
+# NewsFeedService.leave_pull_mode(). Not expired, it must not be lost
+PULL_MODE_USER_PATTERN = 'pull_mode_user:{user_id}'
+
+# Keys of objects cached in django cache
+USER_PATTERN = 'user:{user_id}'
+# Set after a user writes, see utils/read_replicas.py
+RECENT_WRITE_PATTERN = 'recent_write:{user_id}'
+# Denylist of auth tokens revoked before they expire, see AuthTokenService
+REVOKED_AUTH_TOKEN_PATTERN = 'revoked_auth_token:{token_id}'
+FOLLOWINGS_PATTERN = 'followings:{user_id}'
+# Number of followers of a user, used to tell users in pull mode
+FOLLOWERS_COUNT_PATTERN = 'followers_count:{user_id}'
+# Version of the tweet is in the key, see TweetService.get_tweet_through_cache
+TWEET_PATTERN = 'tweet:{tweet_id}:{version}'
+# Changed whenever a tweet, its likes or comments change, see TweetService
+TWEET_VERSION_PATTERN = 'tweet_version:{tweet_id}'
+# Rendered TweetSerializer data except user and has_liked
+TWEET_FRAGMENT_PATTERN = 'tweet_fragment:{tweet_id}:{version}'
+# Bump it when fields of Tweet are changed, tweets cached by the old code
+# are not read any more
+TWEET_CACHE_VERSION = 1
+# Changed whenever newsfeeds of a user are added or removed, see NewsFeedService
+NEWSFEED_VERSION_PATTERN = 'newsfeed_version:{user_id}'
+# Number of unread notifications of a user, see NotificationService
+UNREAD_NOTIFICATIONS_COUNT_PATTERN = 'unread_notifications_count:{user_id}'
@@ -10,11 +10,15 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Running by `python manage.py test`
+TESTING = ((" ".join(sys.argv)).find('manage.py test') != -1)
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.1/howto/deployment/checklist/
@@ -51,6 +55,7 @@ INSTALLED_APPS = [
     'comments',
     'likes',
     'inbox',
+    'jobs',
 ]
 
 REST_FRAMEWORK = {
@@ -59,8 +64,18 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    # SessionAuthentication stays first, anonymous requests still get 403
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+        'accounts.authentication.SignedTokenAuthentication',
+    ],
 }
 
+# Lifetime of the tokens returned by login / signup, a revoked token is kept
+# in the denylist in cache until it expires
+AUTH_TOKEN_MAX_AGE = 86400
+
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -68,6 +83,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'utils.read_replicas.ReadReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -107,6 +123,39 @@ DATABASES = {
     }
 }
 
+# NewsFeed table is sharded by user_id, see newsfeeds/routers.py
+# Create tables on each shard by `python manage.py migrate --database=newsfeeds_0`
+NEWSFEED_DATABASES = ['newsfeeds_0', 'newsfeeds_1']
+for alias in NEWSFEED_DATABASES:
+    if TESTING:
+        DATABASES[alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    else:
+        DATABASES[alias] = dict(DATABASES['default'], NAME='twitter_' + alias)
+
+# Aliases in DATABASES of read replicas of default, e.g.
+#   DATABASES['replica_0'] = dict(DATABASES['default'], HOST='<replica host>')
+#   DATABASE_REPLICAS = ['replica_0']
+# Reads of list / retrieve apis go to them, see utils/read_replicas.py
+DATABASE_REPLICAS = []
+if TESTING:
+    # Not used unless a test sets DATABASE_REPLICAS, it is a separate empty
+    # database, like a replica not having the writes yet
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+# Reads of a client stay on default for this time after it writes, replicas
+# may be behind
+REPLICA_STICKY_SECONDS = 10
+
+DATABASE_ROUTERS = [
+    'newsfeeds.routers.NewsFeedRouter',
+    'utils.read_replicas.ReadReplicaRouter',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -146,6 +195,67 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+
+# Django cache, used to cache single objects like users, see twitter/cache.py
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+        'TIMEOUT': 86400,
+    },
+}
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'TIMEOUT': 86400,
+        },
+    }
+
+# Process local LRU in front of django cache, see utils/multi_level_cache.py.
+# Keep LOCAL_CACHE_TIMEOUT short, deleting a key cannot reach other processes
+LOCAL_CACHE_MAX_SIZE = 1000
+LOCAL_CACHE_TIMEOUT = 5  # in seconds
+# Add up to 10% to timeouts, keys filled together do not expire together
+CACHE_TIMEOUT_JITTER = 0.1
+# Only one process loads a missing key, others wait for it up to this time
+CACHE_FILL_LOCK_TIMEOUT = 3  # in seconds
+CACHE_FILL_WAIT_INTERVAL = 0.02  # in seconds
+
+# Redis, used to cache lists like newsfeeds of a user
+REDIS_HOST = '127.0.0.1'
+REDIS_PORT = 6379
+REDIS_DB = 0
+REDIS_KEY_EXPIRE_TIME = 7 * 86400  # in seconds
+# Max number of objects cached in one list
+REDIS_LIST_LENGTH_LIMIT = 1000
+# Use utils.redis_client.InMemoryRedis instead of a redis server
+REDIS_IN_MEMORY = TESTING
+
+# Async jobs, see jobs/decorators.py
+# jobs.backends.DatabaseBackend: queue jobs in DB, run `python manage.py run_jobs` to consume
+# jobs.backends.ThreadPoolBackend: run jobs in a thread pool of the web process
+# jobs.backends.SyncBackend: run jobs right away, used for testing
+JOB_BACKEND = 'jobs.backends.DatabaseBackend'
+JOB_THREAD_POOL_SIZE = 4
+# Failed jobs are retried by the worker until reaching this number
+JOB_MAX_ATTEMPTS = 3
+# A job still running this long after it started (or after being claimed, if it
+# did not start) is re-queued by run_jobs, must be longer than the slowest job
+JOB_LEASE_SECONDS = 600
+if TESTING:
+    JOB_BACKEND = 'jobs.backends.SyncBackend'
+
+# Newsfeeds
+# Number of newsfeeds written by one bulk_create (and one transaction) in fanout
+NEWSFEED_FANOUT_BATCH_SIZE = 1000
+# Push / pull hybrid mode: tweets of users with at least this number of followers
+# are not fanned out, followers pull them when loading newsfeeds.
+# None means push to all followers
+NEWSFEED_PULL_MODE_FOLLOWERS_THRESHOLD = None
+# Number of latest tweets added to newsfeeds after following a user
+NEWSFEED_BACKFILL_TWEETS_LIMIT = 20
+
 try:
     from .local_settings import *
 except:
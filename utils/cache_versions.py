@@ -0,0 +1,50 @@
+import random
+import time
+
+from django.core.cache import caches
+
+cache = caches['default']
+
+
+def get_version(key):
+    """
+    Return the version number cached in `key`, used as validator of
+    responses, e.g. ETag. Changed by bump_version()
+    """
+    version = cache.get(key)
+    if version is not None:
+        return version
+    # Start from current time in ms instead of 1, a version evicted from
+    # cache is not reused
+    version = int(time.time() * 1000)
+    if cache.add(key, version):
+        return version
+    return cache.get(key, version)
+
+
+def get_versions(keys):
+    # Return {key: version}, one get_many if all versions are cached
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = get_version(key)
+    return versions
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Not cached, get_version() starts with a new one
+        pass
+
+
+def bump_versions(keys):
+    """
+    Change the versions of keys with one set_many instead of one incr per key.
+    New versions are random instead of version + 1, concurrent bumps of a
+    key never give a version used before
+    """
+    if not keys:
+        return
+    cache.set_many({key: random.getrandbits(62) for key in keys})
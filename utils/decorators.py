@@ -1,3 +1,8 @@
+import calendar
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from rest_framework.response import Response
 from rest_framework import status
 from functools import wraps
@@ -40,3 +45,51 @@ def required_params(method='GET', params=None):
             return view_func(instance, request, *args, **kwargs)
         return _wrapped_view
     return decorator
+
+
+def conditional_response(etag_func=None, last_modified_func=None):
+    """
+    Support ETag / Last-Modified for GET of a view function, e.g.
+        @conditional_response(etag_func=lambda view, request: ...)
+    etag_func and last_modified_func are called with the same arguments as
+    the view function, return a str / datetime, or None if not supported.
+    When the client already has the same version (If-None-Match or
+    If-Modified-Since), 304 is returned without calling the view function.
+    The validators must be much cheaper than the view, e.g. read from cache
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(instance, request, *args, **kwargs):
+            etag, last_modified = None, None
+            if etag_func is not None:
+                etag = etag_func(instance, request, *args, **kwargs)
+            if last_modified_func is not None:
+                last_modified = last_modified_func(instance, request, *args, **kwargs)
+            if etag is not None:
+                # Same validators with different query params are different pages
+                etag = quote_etag(hashlib.md5(
+                    '{}:{}'.format(etag, request.get_full_path()).encode('utf-8'),
+                ).hexdigest())
+            if last_modified is not None:
+                last_modified = calendar.timegm(last_modified.utctimetuple())
+
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=last_modified,
+            )
+            if response is None:
+                response = view_func(instance, request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                return response
+            if etag is not None:
+                response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Validators are computed for the current user, shared caches
+            # should not store the response
+            patch_cache_control(response, private=True)
+            return response
+        return _wrapped_view
+    return decorator
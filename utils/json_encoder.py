@@ -0,0 +1,19 @@
+import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class JSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder truncates microseconds of datetime to milliseconds,
+    keep the full precision so created_at read from cache can still be used
+    as an exact pagination cursor
+    """
+
+    def default(self, obj):
+        if isinstance(obj, datetime.datetime):
+            r = obj.isoformat()
+            if r.endswith('+00:00'):
+                r = r[:-6] + 'Z'
+            return r
+        return super(JSONEncoder, self).default(obj)
@@ -0,0 +1,220 @@
+import pickle
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from utils.read_replicas import read_from_primary
+
+FILL_LOCK_PREFIX = 'fill_lock:'
+
+
+class LocalLRUCache(object):
+    """
+    Bounded cache in the memory of the process, the least recently used key is
+    evicted when it is full. Values are pickled like LocMemCache, every get
+    returns a new object, so a cached object changed by one request (e.g.
+    tweet.user set by load_users_through_cache) is not seen by others
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Return the pickled value, None if not cached or expired
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expire_at, pickled = item
+            if expire_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return pickled
+
+    def set(self, key, pickled, timeout):
+        with self._lock:
+            self._data[key] = (time.time() + timeout, pickled)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class MultiLevelCache(object):
+    """
+    Process LRU in front of django cache (memcached).
+
+    A hot key, e.g. a celebrity user or a popular tweet, is read from the
+    memory of the process instead of a memcached round trip on each request.
+    Local values live for LOCAL_CACHE_TIMEOUT seconds only, delete() cannot
+    reach the LRU of other processes, they see the old value until then.
+
+    Usage:
+        user_cache = MultiLevelCache('user')
+        user = user_cache.get_or_set(key, lambda: User.objects.filter(...).first())
+
+    None is not cached, use get_or_set() only for loaders returning an object
+    or None when the object does not exist.
+    """
+    # All instances, so tests can clear the local caches
+    instances = []
+
+    def __init__(self, name, version=None, local_max_size=None, local_timeout=None):
+        self.name = name
+        # Passed to django cache, e.g. TWEET_CACHE_VERSION
+        self.version = version
+        self.cache = caches['default']
+        self.local = LocalLRUCache(
+            max_size=local_max_size or settings.LOCAL_CACHE_MAX_SIZE,
+            timeout=local_timeout or settings.LOCAL_CACHE_TIMEOUT,
+        )
+        self.counters = Counter()
+        self._counters_lock = threading.Lock()
+        MultiLevelCache.instances.append(self)
+
+    def _count(self, name, value=1):
+        with self._counters_lock:
+            self.counters[name] += value
+
+    def _jitter(self, timeout):
+        # Keys filled at the same time, e.g. after a deploy, do not expire at
+        # the same time and hit the DB together
+        jitter = int(timeout * settings.CACHE_TIMEOUT_JITTER)
+        return timeout + random.randint(0, jitter)
+
+    def _local_key(self, key):
+        return '{}:{}'.format(self.version, key)
+
+    def _set_local(self, key, value):
+        self.local.set(
+            self._local_key(key),
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self._jitter(self.local.timeout),
+        )
+
+    def get_stats(self):
+        """
+        Return hit and miss counters of this process, e.g.
+        {'local_hits': 10, 'hits': 2, 'misses': 1, 'fills': 1, 'fill_waits': 0}
+        """
+        with self._counters_lock:
+            stats = dict(self.counters)
+        for name in ('local_hits', 'hits', 'misses', 'fills', 'fill_waits'):
+            stats.setdefault(name, 0)
+        return stats
+
+    def get(self, key):
+        pickled = self.local.get(self._local_key(key))
+        if pickled is not None:
+            self._count('local_hits')
+            return pickle.loads(pickled)
+        value = self.cache.get(key, version=self.version)
+        if value is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        self._set_local(key, value)
+        return value
+
+    def get_many(self, keys):
+        # Return {key: value} of the cached keys, one cache get_many for the
+        # keys not in the local cache
+        values, remote_keys = {}, []
+        for key in keys:
+            pickled = self.local.get(self._local_key(key))
+            if pickled is not None:
+                values[key] = pickle.loads(pickled)
+            else:
+                remote_keys.append(key)
+        self._count('local_hits', len(values))
+        if not remote_keys:
+            return values
+        remote_values = self.cache.get_many(remote_keys, version=self.version)
+        self._count('hits', len(remote_values))
+        self._count('misses', len(remote_keys) - len(remote_values))
+        for key, value in remote_values.items():
+            self._set_local(key, value)
+        values.update(remote_values)
+        return values
+
+    def set(self, key, value, timeout=None):
+        timeout = self._jitter(timeout or settings.CACHES['default']['TIMEOUT'])
+        self.cache.set(key, value, timeout, version=self.version)
+        self._set_local(key, value)
+
+    def set_many(self, data, timeout=None):
+        if not data:
+            return
+        timeout = self._jitter(timeout or settings.CACHES['default']['TIMEOUT'])
+        self.cache.set_many(data, timeout, version=self.version)
+        for key, value in data.items():
+            self._set_local(key, value)
+
+    def delete(self, key):
+        self.cache.delete(key, version=self.version)
+        self.local.delete(self._local_key(key))
+
+    def get_or_set(self, key, loader):
+        """
+        Return the cached value, or load it with loader() and cache it.
+
+        Single flight: when the key is missing, only the worker getting the fill
+        lock calls loader(), others wait for the value to appear in the cache,
+        so a popular key expiring does not send every request to the DB
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        lock_key = FILL_LOCK_PREFIX + key
+        lock_timeout = settings.CACHE_FILL_LOCK_TIMEOUT
+        if self.cache.add(lock_key, 1, lock_timeout, version=self.version):
+            try:
+                return self._fill(key, loader)
+            finally:
+                self.cache.delete(lock_key, version=self.version)
+
+        # Another worker is loading it
+        self._count('fill_waits')
+        deadline = time.time() + lock_timeout
+        while time.time() < deadline:
+            time.sleep(settings.CACHE_FILL_WAIT_INTERVAL)
+            value = self.cache.get(key, version=self.version)
+            if value is not None:
+                self._set_local(key, value)
+                return value
+            # Released without a value, e.g. the object does not exist
+            if self.cache.get(lock_key, version=self.version) is None:
+                break
+        return self._fill(key, loader)
+
+    def _fill(self, key, loader):
+        self._count('fills')
+        with read_from_primary():
+            value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def clear_local(self):
+        self.local.clear()
+
+    @classmethod
+    def clear_all_local(cls):
+        # For testing, local caches are not cleared by caches['default'].clear()
+        for instance in cls.instances:
+            instance.clear_local()
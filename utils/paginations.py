@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class EndlessPagination(BasePagination):
+    """
+    Keyset pagination on created_at for lists ordered by created_at desc,
+    works on both QuerySet and python list (e.g. cached in redis).
+
+    GET ?                         -> first page
+    GET ?created_at__lt=<time>    -> next page, items older than <time>
+    GET ?created_at__gt=<time>    -> pull newer items for refresh. If has_next_page
+                                     is True, there are more newer items than one
+                                     page, client should reload from the first page
+
+    Query on a QuerySet only reads page_size + 1 rows by index (xxx, created_at),
+    no OFFSET is used, so the cost does not grow with the page number
+    """
+    page_size = 20
+
+    def __init__(self):
+        super(EndlessPagination, self).__init__()
+        self.has_next_page = False
+
+    def to_html(self):
+        pass
+
+    def _parse_datetime(self, request, param):
+        value = parse_datetime(request.query_params[param])
+        if value is None:
+            raise ValidationError({param: 'Invalid datetime format.'})
+        return value
+
+    def get_cursor(self, request):
+        """
+        Return the cursor as filter kwargs, e.g. {'created_at__lt': datetime}
+        """
+        if 'created_at__gt' in request.query_params:
+            return {'created_at__gt': self._parse_datetime(request, 'created_at__gt')}
+        if 'created_at__lt' in request.query_params:
+            return {'created_at__lt': self._parse_datetime(request, 'created_at__lt')}
+        return {}
+
+    def paginate_ordered_list(self, reverse_ordered_list, request):
+        # reverse_ordered_list is ordered by created_at desc
+        cursor = self.get_cursor(request)
+        if 'created_at__gt' in cursor:
+            items = [
+                item for item in reverse_ordered_list
+                if item.created_at > cursor['created_at__gt']
+            ]
+        elif 'created_at__lt' in cursor:
+            items = [
+                item for item in reverse_ordered_list
+                if item.created_at < cursor['created_at__lt']
+            ]
+        else:
+            items = list(reverse_ordered_list)
+        self.has_next_page = len(items) > self.page_size
+        return items[:self.page_size]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = queryset.filter(**self.get_cursor(request))
+        # Read one more to know whether there is next page
+        items = list(queryset.order_by('-created_at')[:self.page_size + 1])
+        self.has_next_page = len(items) > self.page_size
+        return items[:self.page_size]
+
+    def _find_older_index(self, reverse_ordered_list, created_at):
+        # Binary search the first item older than created_at, only reads
+        # log(n) items of a RedisObjectList
+        low, high = 0, len(reverse_ordered_list)
+        while low < high:
+            middle = (low + high) // 2
+            if reverse_ordered_list[middle].created_at < created_at:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def paginate_cached_list(self, cached_list, request):
+        """
+        Return None if the page cannot be served by cached_list.
+        cached_list only keeps the latest REDIS_LIST_LENGTH_LIMIT items, when it
+        is full, older items may only exist in DB.
+        Only a window of page_size + 2 items around the page is read, one more
+        for has_next_page and one more in case an item is pushed while paging
+        """
+        cursor = self.get_cursor(request)
+        start = 0
+        if 'created_at__lt' in cursor:
+            start = self._find_older_index(cached_list, cursor['created_at__lt'])
+        window = cached_list[start:start + self.page_size + 2]
+        page = self.paginate_ordered_list(window, request)
+        if self.has_next_page:
+            return page
+        # Items after the window are filtered out by the cursor
+        if start + len(window) < len(cached_list):
+            return page
+        if len(cached_list) < settings.REDIS_LIST_LENGTH_LIMIT:
+            return page
+        return None
+
+    def get_paginated_response(self, data):
+        return Response({
+            'has_next_page': self.has_next_page,
+            'results': data,
+        })
+
+
+class BidirectionalEndlessPagination(EndlessPagination):
+    """
+    Keyset pagination on created_at for lists shown in created_at asc order,
+    e.g. comments of a tweet, and can be read in both directions.
+
+    GET ?                         -> first page, the oldest items
+    GET ?created_at__gt=<time>    -> next page, items right after <time>
+    GET ?created_at__lt=<time>    -> previous page, items right before <time>
+
+    has_next_page tells whether there are more items in the direction read.
+    Both directions read page_size + 1 rows by index (xxx, created_at)
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor = self.get_cursor(request)
+        queryset = queryset.filter(**cursor)
+        if 'created_at__lt' in cursor:
+            # Read backwards from the cursor, then show them in asc order
+            items = list(queryset.order_by('-created_at')[:self.page_size + 1])
+            self.has_next_page = len(items) > self.page_size
+            return items[:self.page_size][::-1]
+        items = list(queryset.order_by('created_at')[:self.page_size + 1])
+        self.has_next_page = len(items) > self.page_size
+        return items[:self.page_size]
@@ -0,0 +1,24 @@
+from django.db.models import Count, IntegerField, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, group_by):
+    """
+    SELECT COUNT(*) ... GROUP BY <group_by>, correlated to the outer row by an
+    OuterRef in queryset, 0 when there is no row. e.g.
+        Tweet.objects.annotate(real_comments_count=count_subquery(
+            Comment.objects.filter(tweet_id=OuterRef('id')),
+            'tweet_id',
+        ))
+    """
+    # order_by() clears Meta.ordering, otherwise it is added to GROUP BY
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .values(group_by)
+            .annotate(count=Count('id'))
+            .values('count'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
@@ -0,0 +1,142 @@
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+from twitter.cache import RECENT_WRITE_PATTERN
+
+cache = caches['default']
+
+# Whether reads of the current request (thread) can go to a replica
+_state = threading.local()
+
+# Set after a write, reads of the client stick to the primary while it exists
+RECENT_WRITE_COOKIE = 'recent_write'
+
+
+def is_read_replica_enabled():
+    return getattr(_state, 'enabled', False)
+
+
+def set_read_replica_enabled(enabled):
+    _state.enabled = enabled
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Data loaded to cache must be read from the primary, an old row read from
+    a replica behind the primary would stay in cache after invalidation
+    """
+    enabled = is_read_replica_enabled()
+    set_read_replica_enabled(False)
+    try:
+        yield
+    finally:
+        set_read_replica_enabled(enabled)
+
+
+class ReadReplicaRouter(object):
+    """
+    Send reads to a random alias in settings.DATABASE_REPLICAS, only when
+    enabled by ReadReplicaViewSetMixin for the current request. Writes and
+    all other reads go to the primary (default).
+    Must be after NewsFeedRouter, newsfeeds are sharded and have no replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not is_read_replica_enabled():
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas have the same data as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+def _get_recent_write_key(user_id):
+    return RECENT_WRITE_PATTERN.format(user_id=user_id)
+
+
+def has_recent_write(request):
+    """
+    Whether the client wrote in the last REPLICA_STICKY_SECONDS. Replicas may
+    not have the write yet, read it from the primary so users see their own
+    tweets, comments and follows at once.
+    The cookie works for browsers, the cache for clients ignoring cookies
+    """
+    if RECENT_WRITE_COOKIE in request.COOKIES:
+        return True
+    if not request.user.is_authenticated:
+        return False
+    return cache.get(_get_recent_write_key(request.user.id)) is not None
+
+
+def mark_recent_write(request, response):
+    timeout = settings.REPLICA_STICKY_SECONDS
+    response.set_cookie(RECENT_WRITE_COOKIE, '1', max_age=timeout, httponly=True)
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        cache.set(_get_recent_write_key(user.id), True, timeout)
+
+
+class ReadReplicaViewSetMixin(object):
+    """
+    Put before the viewset class, e.g.
+        class TweetViewSet(ReadReplicaViewSetMixin, viewsets.GenericViewSet)
+    Reads of the actions in read_replica_actions go to the replicas
+    """
+    read_replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and permissions are checked on the primary
+        super(ReadReplicaViewSetMixin, self).initial(request, *args, **kwargs)
+        if not settings.DATABASE_REPLICAS:
+            return
+        if self.action not in self.read_replica_actions:
+            return
+        if has_recent_write(request):
+            return
+        set_read_replica_enabled(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        set_read_replica_enabled(False)
+        return super(ReadReplicaViewSetMixin, self).finalize_response(
+            request,
+            response,
+            *args,
+            **kwargs
+        )
+
+
+class ReadReplicaMiddleware(object):
+    """
+    Mark the client after a successful write, see has_recent_write(). Also make
+    sure the next request on this thread does not start with replicas enabled
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            set_read_replica_enabled(False)
+        if not settings.DATABASE_REPLICAS:
+            return response
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            mark_recent_write(request, response)
+        return response
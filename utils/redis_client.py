@@ -0,0 +1,186 @@
+import threading
+import time
+
+from django.conf import settings
+
+
+class InMemoryRedis(object):
+    """
+    In process stand-in of redis.Redis used for testing, only implements the
+    commands used in this project. Like redis-py, values are returned as bytes.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expire_at = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode('utf-8')
+
+    def _get(self, key):
+        expire_at = self._expire_at.get(key)
+        if expire_at is not None and expire_at <= time.time():
+            self._data.pop(key, None)
+            self._expire_at.pop(key, None)
+        return self._data.get(key)
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._get(key) is not None)
+
+    def delete(self, *keys):
+        with self._lock:
+            deleted = 0
+            for key in keys:
+                if self._get(key) is not None:
+                    deleted += 1
+                self._data.pop(key, None)
+                self._expire_at.pop(key, None)
+            return deleted
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._get(key) is None:
+                return False
+            self._expire_at[key] = time.time() + seconds
+            return True
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._get(key) is not None:
+                return None
+            self._data[key] = self._encode(value)
+            self._expire_at.pop(key, None)
+            if ex is not None:
+                self._expire_at[key] = time.time() + ex
+            return True
+
+    def rename(self, src, dst):
+        with self._lock:
+            if self._get(src) is None:
+                raise KeyError('no such key')
+            self._data[dst] = self._data.pop(src)
+            self._expire_at.pop(dst, None)
+            expire_at = self._expire_at.pop(src, None)
+            if expire_at is not None:
+                self._expire_at[dst] = expire_at
+            return True
+
+    def append(self, key, value):
+        # Create the key if it does not exist, return the new length
+        with self._lock:
+            data = (self._get(key) or b'') + self._encode(value)
+            self._data[key] = data
+            return len(data)
+
+    def lpush(self, key, *values):
+        with self._lock:
+            items = self._get(key)
+            if items is None:
+                items = self._data[key] = []
+            for value in values:
+                items.insert(0, self._encode(value))
+            return len(items)
+
+    def lpushx(self, key, *values):
+        with self._lock:
+            if self._get(key) is None:
+                return 0
+            return self.lpush(key, *values)
+
+    def rpush(self, key, *values):
+        with self._lock:
+            items = self._get(key)
+            if items is None:
+                items = self._data[key] = []
+            items.extend(self._encode(value) for value in values)
+            return len(items)
+
+    def llen(self, key):
+        with self._lock:
+            return len(self._get(key) or [])
+
+    def lrange(self, key, start, end):
+        with self._lock:
+            items = self._get(key) or []
+            # end is inclusive in redis, -1 means the last one
+            end = len(items) if end == -1 else end + 1
+            return list(items[start:end])
+
+    def ltrim(self, key, start, end):
+        with self._lock:
+            items = self._get(key)
+            if items is None:
+                return True
+            end = len(items) if end == -1 else end + 1
+            self._data[key] = items[start:end]
+            return True
+
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+            self._expire_at.clear()
+            return True
+
+
+class InMemoryPipeline(object):
+    """
+    Queue commands and run them on execute(), return the list of results,
+    like redis-py Pipeline
+    """
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        commands, self._commands = self._commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+class RedisClient(object):
+    conn = None
+
+    @classmethod
+    def get_connection(cls):
+        # Use singleton, only create one connection in a process
+        if cls.conn:
+            return cls.conn
+        if settings.REDIS_IN_MEMORY:
+            cls.conn = InMemoryRedis()
+            return cls.conn
+        # Only import redis when a real redis server is used
+        import redis
+        cls.conn = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+        )
+        return cls.conn
+
+    @classmethod
+    def clear(cls):
+        # Clear all keys in redis, for testing purpose
+        if not settings.TESTING:
+            raise Exception('You can not flush redis in production environment')
+        conn = cls.get_connection()
+        conn.flushdb()
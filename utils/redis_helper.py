@@ -0,0 +1,187 @@
+import uuid
+
+from django.conf import settings
+from utils.read_replicas import read_from_primary
+from utils.redis_client import RedisClient
+from utils.redis_serializers import DjangoModelSerializer
+
+
+class RedisObjectList(object):
+    """
+    Read only view of a cached list of objects, items are read by LRANGE when
+    accessed, so reading one page of a long list does not deserialize all
+    of it. Use a slice to read several items in one round trip
+    """
+
+    def __init__(self, key, length):
+        self.key = key
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def _lrange(self, start, end):
+        serialized_list = RedisClient.get_connection().lrange(self.key, start, end)
+        return [
+            DjangoModelSerializer.deserialize(serialized_data)
+            for serialized_data in serialized_list
+        ]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if start >= stop:
+                return []
+            return self._lrange(start, stop - 1)[::step]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('list index out of range')
+        items = self._lrange(index, index)
+        if not items:
+            # Expired or trimmed since the length was read
+            raise IndexError('list index out of range')
+        return items[0]
+
+    def __iter__(self):
+        return iter(self._lrange(0, -1))
+
+
+class RedisHelper(object):
+
+    @classmethod
+    def _get_rebuild_lock_key(cls, key):
+        return '{}:rebuild'.format(key)
+
+    @classmethod
+    def acquire_rebuild_lock(cls, key):
+        """
+        Take the lock to rebuild missing `key` from DB, before reading DB.
+        Return a token for release_rebuild_lock(), None if another worker is
+        rebuilding it, then only use what is read from DB without caching it
+        """
+        conn = RedisClient.get_connection()
+        token = uuid.uuid4().hex
+        locked = conn.set(
+            cls._get_rebuild_lock_key(key),
+            token,
+            ex=settings.CACHE_FILL_LOCK_TIMEOUT,
+            nx=True,
+        )
+        return token if locked else None
+
+    @classmethod
+    def release_rebuild_lock(cls, key, token):
+        """
+        Call after `key` is written. If the lock was dropped by
+        cancel_rebuild() meanwhile, DB may have changed after it was read, so
+        `key` is deleted instead of kept out of date. Return whether it is kept
+        """
+        conn = RedisClient.get_connection()
+        lock_key = cls._get_rebuild_lock_key(key)
+        if conn.get(lock_key) == token.encode('utf-8'):
+            conn.delete(lock_key)
+            return True
+        conn.delete(key)
+        return False
+
+    @classmethod
+    def cancel_rebuild(cls, key):
+        # Called by a change not applied to `key` because it is missing, a
+        # rebuild in progress may have read DB before the change
+        RedisClient.get_connection().delete(cls._get_rebuild_lock_key(key))
+
+    @classmethod
+    def _load_objects_to_cache(cls, key, queryset):
+        """
+        Read objects from DB and replace list `key` with them, return the objects.
+
+        Only the worker holding the rebuild lock writes the list, so concurrent
+        misses do not push the same objects twice. The list is built in a
+        temporary key and renamed, readers never see a half built list.
+        push_object() cancels the rebuild when the list is missing, so the
+        list is not kept without that object
+        """
+        conn = RedisClient.get_connection()
+        token = cls.acquire_rebuild_lock(key)
+        with read_from_primary():
+            objects = list(queryset[:settings.REDIS_LIST_LENGTH_LIMIT])
+        if token is None:
+            return objects
+
+        if objects:
+            temp_key = '{}:{}'.format(cls._get_rebuild_lock_key(key), token)
+            conn.rpush(temp_key, *[
+                DjangoModelSerializer.serialize(obj)
+                for obj in objects
+            ])
+            conn.expire(temp_key, settings.REDIS_KEY_EXPIRE_TIME)
+            conn.rename(temp_key, key)
+        cls.release_rebuild_lock(key, token)
+        return objects
+
+    @classmethod
+    def load_objects(cls, key, queryset):
+        """
+        Return objects cached in list `key`, as a RedisObjectList reading items
+        only when they are accessed.
+        The list is built lazily from queryset when it does not exist,
+        only the first REDIS_LIST_LENGTH_LIMIT objects are cached
+        """
+        conn = RedisClient.get_connection()
+
+        # Cache hit, an empty list is never cached
+        length = conn.llen(key)
+        if length:
+            return RedisObjectList(key, length)
+
+        # Cache miss
+        return cls._load_objects_to_cache(key, queryset)
+
+    @classmethod
+    def push_object(cls, key, obj):
+        cls.push_objects([(key, obj)])
+
+    @classmethod
+    def push_objects(cls, items):
+        """
+        Add each obj of items [(key, obj)] to the head of list `key` if the
+        list is cached, one pipeline for all of them, e.g. a fanout batch.
+        Use lpushx instead of exists + lpush, so a list expired in between
+        is not recreated with only this object.
+
+        Lists are ordered by created_at desc, pagination searches them by
+        created_at. An obj older than the previous head, e.g. a delayed
+        fanout, would break the order, the list is deleted and reloaded from
+        DB on next read
+        """
+        if not items:
+            return
+        conn = RedisClient.get_connection()
+        pipeline = conn.pipeline(transaction=False)
+        for key, obj in items:
+            pipeline.lpushx(key, DjangoModelSerializer.serialize(obj))
+            pipeline.ltrim(key, 0, settings.REDIS_LIST_LENGTH_LIMIT - 1)
+            # Previous head
+            pipeline.lrange(key, 1, 1)
+        results = pipeline.execute()
+
+        invalid_keys = []
+        for (key, obj), length, heads in zip(items, results[::3], results[2::3]):
+            if not length:
+                # Not cached, will be loaded from DB on next read. A rebuild
+                # in progress may have missed obj
+                invalid_keys.append(cls._get_rebuild_lock_key(key))
+                continue
+            if not heads:
+                continue
+            head = DjangoModelSerializer.deserialize(heads[0])
+            if obj.created_at < head.created_at:
+                invalid_keys.extend([key, cls._get_rebuild_lock_key(key)])
+        if invalid_keys:
+            conn.delete(*invalid_keys)
+
+    @classmethod
+    def delete(cls, key):
+        # Also stop a rebuild in progress from restoring the old list
+        RedisClient.get_connection().delete(key, cls._get_rebuild_lock_key(key))
@@ -0,0 +1,17 @@
+from django.core import serializers
+from utils.json_encoder import JSONEncoder
+
+
+class DjangoModelSerializer(object):
+    # Convert a model instance to a string stored in redis and back.
+    # Only fields of the model itself are kept, foreign keys are stored as ids
+
+    @classmethod
+    def serialize(cls, instance):
+        # Django serializers only accept QuerySet or list
+        return serializers.serialize('json', [instance], cls=JSONEncoder)
+
+    @classmethod
+    def deserialize(cls, serialized_data):
+        # DeserializedObject.object is the model instance
+        return list(serializers.deserialize('json', serialized_data))[0].object